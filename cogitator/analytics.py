@@ -0,0 +1,276 @@
+"""
+Statistics over the whole archive of lists.
+
+Every army is flattened into columns, with one row per item in each squad and
+one row per army, and the text in the columns is replaced with integer codes.
+Questions are then answered by grouping and summing whole columns, rather than
+by walking the nested lists again for each one. numpy is used to do that where
+it is installed; otherwise the same grouping is done in pure python.
+"""
+
+import array
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The kinds of item in the item columns.
+MODEL = "Model"
+WEAPON = "Weapon"
+WARGEAR = "Wargear"
+
+
+class Dictionary(object):
+    """ Maps the distinct values of a text column to small integer codes. """
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        """ Get the code of a value, giving it the next one if it is new. """
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[int(code)]
+
+
+class Columns(object):
+    """
+    A table stored as one integer array per column. Text columns hold codes
+    into a Dictionary shared by every column of the same name.
+    """
+
+    def __init__(self, names, dictionaries):
+        """
+        :param names: The column names.
+        :param dictionaries: Map of the name of each text column to its
+                             Dictionary.
+        """
+        self.names = names
+        self.dictionaries = dictionaries
+        self.columns = dict((name, array.array("l")) for name in names)
+
+    def __len__(self):
+        return len(self.columns[self.names[0]])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def append(self, **values):
+        """ Add a row, encoding the values of any text columns. """
+        for name in self.names:
+            value = values[name]
+            dictionary = self.dictionaries.get(name)
+            if dictionary is not None:
+                value = dictionary.code(value)
+            self.columns[name].append(value)
+
+    def arrays(self):
+        """ Get the columns as numpy arrays, or as they are without numpy. """
+        if numpy is None:
+            return self.columns
+        return dict((name, numpy.frombuffer(column, dtype=column.typecode)
+                     if len(column) > 0 else numpy.zeros(0, dtype=int))
+                    for name, column in self.columns.items())
+
+
+def group_by(keys, values=()):
+    """
+    Group the rows of some columns by their keys and total them.
+    :param keys: List of equal length columns of integers to group by.
+    :param values: List of columns of integers to total in each group.
+    :return: (keys, totals, counts) where keys is a column per key giving each
+             group's key, totals a column per value giving each group's
+             total, and counts the number of rows in each group. Groups are in
+             order of their keys.
+    """
+    if numpy is not None:
+        return numpy_group_by(keys, values)
+    groups = collections.defaultdict(lambda: [0] * (len(values) + 1))
+    for row in zip(*(list(keys) + list(values))):
+        group = groups[row[:len(keys)]]
+        for i, value in enumerate(row[len(keys):]):
+            group[i] += value
+        group[-1] += 1
+    ordered = sorted(groups)
+    key_columns = [[key[i] for key in ordered] for i in range(len(keys))]
+    totals = [[groups[key][i] for key in ordered] for i in range(len(values))]
+    return key_columns, totals, [groups[key][-1] for key in ordered]
+
+
+def numpy_group_by(keys, values):
+    """ group_by() for numpy arrays. """
+    if len(keys[0]) == 0:
+        return [[] for key in keys], [[] for value in values], []
+    unique, inverse = numpy.unique(numpy.stack(keys, axis=1), axis=0,
+                                   return_inverse=True)
+    inverse = inverse.reshape(-1)
+    size = len(unique)
+    totals = [numpy.bincount(inverse, weights=value, minlength=size).astype(
+        numpy.int64) for value in values]
+    counts = numpy.bincount(inverse, minlength=size)
+    return [unique[:, i] for i in range(len(keys))], totals, counts
+
+
+class Corpus(object):
+    """
+    The columns of every army in the archive.
+
+    'items' has a row per item in each squad: its army, game, points limit,
+    detachment, slot, item, kind, quantity and cost. 'armies' has a row per
+    army: its name, game, points limit, total, points to spare and CP.
+    """
+
+    def __init__(self):
+        dictionaries = dict((name, Dictionary()) for name in (
+            "Army", "Game", "Detachment", "Slot", "Item", "Kind"))
+        self.items = Columns(("Army", "Game", "Points", "Detachment", "Slot",
+                              "Item", "Kind", "Quantity", "Cost"),
+                             dictionaries)
+        self.armies = Columns(("Army", "Game", "Points", "Total", "Spare",
+                               "CP"), dictionaries)
+        self.dictionaries = dictionaries
+
+    def add_army(self, database, army):
+        """
+        Add the rows of an army.
+        :param database: Database for the army's game.
+        :param army: The army.
+        """
+        name = army["Basename"]
+        for detachment in army["Detachments"]:
+            for squad in detachment["Units"]:
+                included = database.squad_wargear_included(squad)
+                for item, quantity in squad["Items"].items():
+                    cost = database.lookup_item(item).cost * quantity
+                    if database.is_model(item):
+                        kind = MODEL
+                    else:
+                        kind = WEAPON if database.is_weapon(item) else WARGEAR
+                        if included:
+                            cost = 0
+                    self.items.append(
+                        Army=name, Game=army["Game"], Points=army["Points"],
+                        Detachment=detachment["Name"],
+                        Slot=squad.get("Slot", "-"), Item=item, Kind=kind,
+                        Quantity=quantity, Cost=cost)
+        total = database.army_points_cost(army)
+        self.armies.append(Army=name, Game=army["Game"],
+                           Points=army["Points"], Total=total,
+                           Spare=army["Points"] - total,
+                           CP=database.army_cp_total(army))
+
+    def text(self, name, code):
+        """ Get the value of a code in a text column. """
+        return self.dictionaries[name][code]
+
+
+class Report(object):
+    """ A table of statistics. """
+
+    def __init__(self, name, title, header):
+        """
+        :param name: Name for the report's file, e.g. 'slots'.
+        :param title: Heading for the report.
+        :param header: The column names.
+        """
+        self.name = name
+        self.title = title
+        self.header = header
+        self.rows = []
+
+
+def percentage(part, whole):
+    return "%.1f" % (100.0 * part / whole) if whole != 0 else "-"
+
+
+def average(total, count):
+    return "%.1f" % (float(total) / count)
+
+
+def slot_report(corpus):
+    """ Points spent on each battlefield role, by game and points limit. """
+    items = corpus.items.arrays()
+    (games, points, slots), (costs,), counts = group_by(
+        [items["Game"], items["Points"], items["Slot"]], [items["Cost"]])
+    (level_games, level_points), (level_costs,), _ = group_by(
+        [items["Game"], items["Points"]], [items["Cost"]])
+    level_totals = dict(((int(game), int(limit)), int(cost))
+                        for game, limit, cost in zip(level_games, level_points,
+                                                     level_costs))
+    report = Report("slots", "Points by role",
+                    ["Game", "Points", "Slot", "Cost", "Share %"])
+    for game, limit, slot, cost in zip(games, points, slots, costs):
+        report.rows.append([corpus.text("Game", game), int(limit),
+                            corpus.text("Slot", slot), int(cost),
+                            percentage(int(cost),
+                                       level_totals[(int(game), int(limit))])])
+    report.rows.sort()
+    return report
+
+
+def item_report(corpus):
+    """ How often each item is taken, most used first. """
+    items = corpus.items.arrays()
+    (games, names, kinds), (quantities, costs), _ = group_by(
+        [items["Game"], items["Item"], items["Kind"]],
+        [items["Quantity"], items["Cost"]])
+
+    # Group by army as well first, to count each list once.
+    (list_games, list_names, _), _, _ = group_by(
+        [items["Game"], items["Item"], items["Army"]])
+    (list_games, list_names), _, num_lists = group_by(
+        [list_games, list_names])
+    lists = dict(((int(game), int(name)), int(count)) for game, name, count
+                 in zip(list_games, list_names, num_lists))
+
+    report = Report("items", "Most used items",
+                    ["Game", "Item", "Kind", "Quantity", "Lists", "Cost"])
+    for game, name, kind, quantity, cost in zip(games, names, kinds,
+                                                quantities, costs):
+        report.rows.append([corpus.text("Game", game),
+                            corpus.text("Item", name),
+                            corpus.text("Kind", kind), int(quantity),
+                            lists[(int(game), int(name))], int(cost)])
+    report.rows.sort(key=lambda row: (row[0], -row[3], row[1]))
+    return report
+
+
+def spare_report(corpus):
+    """ The average total and points to spare, by game and points limit. """
+    armies = corpus.armies.arrays()
+    (games, points), (totals, spares), counts = group_by(
+        [armies["Game"], armies["Points"]], [armies["Total"], armies["Spare"]])
+    report = Report("spare", "Points to spare",
+                    ["Game", "Points", "Lists", "Average total",
+                     "Average spare"])
+    for game, limit, total, spare, count in zip(games, points, totals, spares,
+                                                counts):
+        report.rows.append([corpus.text("Game", game), int(limit), int(count),
+                            average(int(total), int(count)),
+                            average(int(spare), int(count))])
+    report.rows.sort()
+    return report
+
+
+def cp_report(corpus):
+    """ The number of lists with each number of CP, by game. """
+    armies = corpus.armies.arrays()
+    (games, cps), _, counts = group_by([armies["Game"], armies["CP"]])
+    report = Report("cp", "Command points", ["Game", "CP", "Lists"])
+    for game, cp, count in zip(games, cps, counts):
+        report.rows.append([corpus.text("Game", game), int(cp), int(count)])
+    report.rows.sort()
+    return report
+
+
+# The reports written by the analytics command.
+REPORTS = (slot_report, item_report, spare_report, cp_report)
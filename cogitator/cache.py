@@ -0,0 +1,186 @@
+"""
+Caches.
+"""
+
+import collections
+import hashlib
+import json
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# The newest pickle protocol which both python 2 and 3 can read.
+PICKLE_PROTOCOL = 2
+
+from cogitator.staging import replace_file, write_file_atomically
+
+
+def file_hash(filename):
+    """ Get a hash of the contents of a file. """
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class LRUCache(object):
+    """
+    A small in-process cache which forgets the least recently used entry when
+    it is full.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.__entries = collections.OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, default=None):
+        """ Get an entry, marking it as recently used. """
+        try:
+            value = self.__entries.pop(key)
+        except KeyError:
+            return default
+        self.__entries[key] = value
+        return value
+
+    def put(self, key, value):
+        """ Add an entry, evicting the oldest one if the cache is full. """
+        self.__entries.pop(key, None)
+        self.__entries[key] = value
+        if len(self.__entries) > self.size:
+            self.__entries.popitem(last=False)
+
+    def clear(self):
+        """ Forget everything. """
+        self.__entries.clear()
+
+
+class SignatureCache(object):
+    """
+    A map of keys to values which persists between runs in a JSON file.
+
+    Each value is stored along with a signature of whatever it was computed
+    from, e.g. a file hash, and is only returned while the signature matches.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.__entries = {}
+        self.__dirty = False
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                try:
+                    self.__entries = json.load(f)
+                except ValueError:
+                    # A corrupt cache is as good as an empty one.
+                    self.__entries = {}
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def keys(self):
+        """ List the keys in the cache. """
+        return list(self.__entries.keys())
+
+    def get(self, key, signature=None):
+        """
+        Get a value.
+        :param key: The key.
+        :param signature: If given, the signature the value must have.
+        :return: The value, or None if it is missing or out of date.
+        """
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        if signature is not None and entry["signature"] != signature:
+            return None
+        return entry["value"]
+
+    def put(self, key, signature, value):
+        """ Store a value. """
+        self.__entries[key] = {"signature": signature, "value": value}
+        self.__dirty = True
+
+    def prune(self, keys):
+        """ Forget every entry whose key is not in keys. """
+        keys = set(keys)
+        for key in self.keys():
+            if key not in keys:
+                del self.__entries[key]
+                self.__dirty = True
+
+    def save(self):
+        """ Write the cache back to its file if it has changed. """
+        if not self.__dirty:
+            return
+        directory = os.path.dirname(self.filename)
+        if len(directory) > 0 and not os.path.exists(directory):
+            os.makedirs(directory)
+        write_file_atomically(self.filename, json.dumps(self.__entries))
+        self.__dirty = False
+
+
+class PickleCache(object):
+    """
+    A map of keys to values which persists between runs in a binary pickle
+    file, for values which are slow to compute but quick to unpickle, e.g.
+    parsed YAML keyed by a hash of its text.
+
+    Values are kept pickled, so each get() returns a fresh copy which the
+    caller is free to modify.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.__entries = {}
+        self.__dirty = False
+        if os.path.exists(filename):
+            with open(filename, "rb") as f:
+                try:
+                    self.__entries = pickle.load(f)
+                except Exception:
+                    # A corrupt cache, or one written by a python that can't
+                    # be read by this one, is as good as an empty one.
+                    self.__entries = {}
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key):
+        """ Get a copy of a value, or None if it is missing. """
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        return pickle.loads(entry)
+
+    def put(self, key, value):
+        """ Store a copy of a value. """
+        self.__entries[key] = pickle.dumps(value, PICKLE_PROTOCOL)
+        self.__dirty = True
+
+    def prune(self, keys):
+        """ Forget every entry whose key is not in keys. """
+        keys = set(keys)
+        for key in list(self.__entries.keys()):
+            if key not in keys:
+                del self.__entries[key]
+                self.__dirty = True
+
+    def save(self):
+        """ Write the cache back to its file if it has changed. """
+        if not self.__dirty:
+            return
+        directory = os.path.dirname(self.filename)
+        if len(directory) > 0 and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp = self.filename + ".tmp"
+        with open(temp, "wb") as f:
+            pickle.dump(self.__entries, f, PICKLE_PROTOCOL)
+        replace_file(temp, self.filename)
+        self.__dirty = False
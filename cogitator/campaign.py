@@ -0,0 +1,202 @@
+"""
+Kill team campaign ledgers.
+
+The games played by a kill team are recorded in a ledger, an append-only file
+with one JSON event per line, kept in lists/campaigns/<roster>.jsonl. An event
+looks like
+
+    {"Game": 3, "Date": "2018-09-01", "Result": "Win",
+     "Squads": {"Brother Donatello": {"Experience": 2},
+                "Brother Michelangelo": {"Convalescence": true}}}
+
+The roster in the list gives the state of the kill team before the first game,
+and its current state is found by replaying the ledger on top of it:
+'Experience' is added to a squad's experience, and any other field (e.g.
+'Specialist', 'Convalescence', 'New Recruit', 'Dead') replaces the squad's
+value. The replayed state is snapshotted every so often, so that only the
+games since the last snapshot have to be replayed.
+"""
+
+import hashlib
+import json
+import os
+
+from cogitator.staging import write_file_atomically
+
+# The fields of a squad that a campaign keeps track of.
+CAMPAIGN_FIELDS = ("Experience", "Specialist", "Convalescence", "New Recruit")
+
+# How many games may be replayed before taking a new snapshot.
+SNAPSHOT_INTERVAL = 20
+
+
+def initial_state(army):
+    """ Get the state of an army before any games have been played. """
+    squads = {}
+    for detachment in army["Detachments"]:
+        for squad in detachment["Units"]:
+            squads[squad["Name"]] = dict(
+                (field, squad[field]) for field in CAMPAIGN_FIELDS
+                if field in squad)
+    return {"Games": 0, "Results": {}, "Squads": squads}
+
+
+def apply_event(state, event):
+    """ Update the state of an army with the outcome of a game. """
+    state["Games"] += 1
+    result = event.get("Result")
+    if result is not None:
+        state["Results"][result] = state["Results"].get(result, 0) + 1
+    for name, changes in event.get("Squads", {}).items():
+        squad = state["Squads"].setdefault(name, {})
+        for field, value in changes.items():
+            if field == "Experience":
+                squad[field] = squad.get(field, 0) + value
+            else:
+                squad[field] = value
+
+
+def apply_campaign(army, state):
+    """
+    Bring an army up to date with its campaign. Squads take their fields
+    from the state, and dead squads are removed.
+    :param army: The army, as read from its list.
+    :param state: The replayed state of the campaign.
+    """
+    for detachment in army["Detachments"]:
+        units = []
+        for squad in detachment["Units"]:
+            fields = state["Squads"].get(squad["Name"], {})
+            if fields.get("Dead", False):
+                continue
+            # The squad may be shared with other lists (see UnitLibrary), so
+            # it is copied rather than changed.
+            squad = dict(squad)
+            for field, value in fields.items():
+                if field != "Dead":
+                    squad[field] = value
+            units.append(squad)
+        detachment["Units"] = units
+    army["Campaign"] = {"Games": state["Games"], "Results": state["Results"]}
+
+    # Anything cached against the army depends on the campaign too.
+    army["Hash"] = hashlib.sha1((army["Hash"] + json.dumps(
+        state, sort_keys=True)).encode("utf-8")).hexdigest()
+
+
+def ledger_filename(lists_dir, basename):
+    """ Get the name of the ledger for a roster. """
+    return os.path.join(lists_dir, "campaigns", basename + ".jsonl")
+
+
+class Ledger(object):
+    """
+    The ledger of a campaign, and its snapshots.
+    """
+
+    def __init__(self, filename, snapshot_filename):
+        """
+        :param filename: The ledger file.
+        :param snapshot_filename: Where to keep the latest snapshot.
+        """
+        self.filename = filename
+        self.snapshot_filename = snapshot_filename
+        self.num_replayed = 0
+
+    def append(self, event):
+        """ Record a game. """
+        directory = os.path.dirname(self.filename)
+        if len(directory) > 0 and not os.path.exists(directory):
+            os.makedirs(directory)
+        line = json.dumps(event, sort_keys=True) + "\n"
+        with open(self.filename, "ab") as f:
+            f.write(line.encode("utf-8"))
+
+    def replay(self, army):
+        """
+        Work out the current state of an army.
+        :param army: The army, as read from its list.
+        :return: The state.
+        """
+        snapshot = self.read_snapshot(army["Hash"])
+        if snapshot is None:
+            state, offset, tail = initial_state(army), 0, ""
+        else:
+            state, offset, tail = snapshot["State"], snapshot["Offset"], \
+                snapshot["Tail"]
+        self.num_replayed = 0
+        if os.path.exists(self.filename):
+            with open(self.filename, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    start = offset
+                    offset += len(line)
+                    line = line.decode("utf-8")
+                    if len(line.strip()) == 0:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        raise ValueError("%s: corrupt entry at byte %s" % (
+                            self.filename, start))
+                    apply_event(state, event)
+                    tail = line
+                    self.num_replayed += 1
+        if self.num_replayed >= SNAPSHOT_INTERVAL:
+            self.write_snapshot(army["Hash"], state, offset, tail)
+        return state
+
+    def read_snapshot(self, roster_hash):
+        """
+        Read the latest snapshot, if it is still valid: it must have been
+        taken from the same roster, and the ledger must still contain the
+        entries it was taken from.
+        """
+        if not os.path.exists(self.snapshot_filename):
+            return None
+        try:
+            with open(self.snapshot_filename, "r") as f:
+                snapshot = json.load(f)
+        except ValueError:
+            return None
+        if snapshot["Roster"] != roster_hash:
+            return None
+        offset = snapshot["Offset"]
+        tail = snapshot["Tail"].encode("utf-8")
+        if not os.path.exists(self.filename) or \
+                os.path.getsize(self.filename) < offset:
+            return None
+        with open(self.filename, "rb") as f:
+            f.seek(offset - len(tail))
+            if f.read(len(tail)) != tail:
+                return None
+        return snapshot
+
+    def write_snapshot(self, roster_hash, state, offset, tail):
+        """ Save a snapshot of the state at a point in the ledger. """
+        directory = os.path.dirname(self.snapshot_filename)
+        if len(directory) > 0 and not os.path.exists(directory):
+            os.makedirs(directory)
+        write_file_atomically(self.snapshot_filename, json.dumps({
+            "Roster": roster_hash,
+            "Offset": offset,
+            "Tail": tail,
+            "State": state
+        }))
+
+
+def load_campaign(army, lists_dir, cache_dir):
+    """
+    Apply an army's campaign ledger to it, if it has one.
+    :param army: The army.
+    :param lists_dir: Directory of the lists.
+    :param cache_dir: Directory to keep snapshots in.
+    :return: The Ledger, or None if the army has no campaign.
+    """
+    filename = ledger_filename(lists_dir, army["Basename"])
+    if not os.path.exists(filename):
+        return None
+    ledger = Ledger(filename, os.path.join(cache_dir, "campaigns",
+                                           army["Basename"] + ".json"))
+    apply_campaign(army, ledger.replay(army))
+    return ledger
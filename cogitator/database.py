@@ -4,19 +4,79 @@ Functions for reading data from tables.
 
 from __future__ import print_function
 
+import array
 import csv
 import collections
+import hashlib
+import json
+import multiprocessing
+import numbers
 import os
 import re
-import sys
+import threading
 import yaml
 
+from cogitator.names import NameIndex, quote_names
+from cogitator.schema import Column, DataError, Schema, integer, \
+    optional_integer, flag, text_list
+
+# Lists are parsed with libyaml where PyYAML was built with it, which is many
+# times faster. Either way only plain data is loaded, so lists from other
+# players cannot construct arbitrary python objects.
+try:
+    from yaml import CSafeLoader as ArmyLoader
+except ImportError:
+    from yaml import SafeLoader as ArmyLoader
+
+# Parse at least this many lists at once before using more than one process.
+PARALLEL_PARSE_THRESHOLD = 16
+
+# The directory of shared unit definitions, within a directory of lists.
+UNITS_DIRNAME = "units"
+
+# The kinds of item, as flags, since a name may be in more than one table.
+MODEL_ITEM = 1
+WEAPON_ITEM = 2
+WARGEAR_ITEM = 4
+
+# The fields every army, detachment and squad in a list must have. Squads
+# which use a unit definition get them from it.
+ARMY_FIELDS = ("Name", "Game", "Points", "Warlord", "Detachments")
+DETACHMENT_FIELDS = ("Name", "Type", "Units")
+SQUAD_FIELDS = ("Name", "Slot", "Items")
+
+# Forget the compiled squads once there are this many of them.
+COMPILED_SQUADS_LIMIT = 65536
+
+# Model names like "Robot (10W)" denote damage variants of "Robot".
+DAMAGE_VARIANT_PATTERN = re.compile("(.*)\\(([0-9]+)W\\)")
+
+# Weapon names like "Missile Launcher [Krak]" denote a mode of a weapon.
+WEAPON_MODE_PATTERN = re.compile("(.*)\\[.*\\]")
+
+# Option names like "Tactical Marine: Heavy weapon" denote a group of options
+# for the units with a model.
+OPTION_GROUP_PATTERN = re.compile("([^:]*):(.*)")
+
 
 class Record(object):
     """
     A record that can parse itself from a row and add itself to a table.
     """
 
+    # The columns of the record's table.
+    schema = Schema(Column("Name"))
+
+    # Optionally, a method listing the problems with a row, converted as
+    # described by the schema, which the schema cannot catch itself, e.g.
+    # limits which make no sense.
+    check_row = None
+
+    # Optionally, a method listing the problems with a group of rows (see
+    # group_key()) in the order they are in their file, e.g. rows which parse()
+    # cannot read in that order, each as (index of the row, problem).
+    check_group = None
+
     def __init__(self):
         pass
 
@@ -26,7 +86,8 @@ class Record(object):
         and add it to the table (which should be a dict-like object mapping
         record identifiers to records.)
 
-        :param row: Row to parse from.
+        :param row: Row to parse from, with its values already converted as
+                    described by the schema.
         :param table: Table to add to.
         """
         pass
@@ -38,6 +99,17 @@ class Record(object):
         """
         return self.__class__.__name__.lower() + "s"
 
+    def group_key(self, name):
+        """
+        Get the name of the table entry that a row contributes to. Rows with
+        the same key are parsed together, and a dataset layer overrides its
+        base a whole group at a time.
+
+        :param name: Name of the row.
+        :return: The key.
+        """
+        return name
+
 
 class BasicRecord(Record):
     """
@@ -55,6 +127,8 @@ class BasicRecord(Record):
 
 class Ability(BasicRecord):
 
+    schema = Schema(Column("Name"), Column("Description"))
+
     def __init__(self):
         BasicRecord.__init__(self)
         self.description = ""
@@ -80,6 +154,15 @@ class Model(Record):
     through the base model, which must be read in first.
     """
 
+    schema = Schema(Column("Name"), Column("Cost", integer), Column("M"),
+                    Column("WS"), Column("BS"), Column("S"), Column("T"),
+                    Column("W"), Column("A"), Column("Ld"), Column("Sv"),
+                    Column("Abilities", text_list, required=False),
+                    Column("IncludesWargear", flag, required=False))
+
+    # The columns shown in stat tables.
+    STATS = ("Name", "Cost", "M", "WS", "BS", "S", "T", "W", "A", "Ld", "Sv")
+
     def __init__(self):
         Record.__init__(self)
         self.name = ""
@@ -93,24 +176,19 @@ class Model(Record):
 
         # Read name and cost.
         self.name = row["Name"]
-        self.cost = int(row["Cost"])
+        self.cost = row["Cost"]
 
         # Read in the model from the table row.
-        stats = ["Name", "Cost", "M", "WS", "BS", "S", "T", "W", "A", "Ld",
-                 "Sv"]
-        for stat in stats:
+        for stat in self.STATS:
             self.stats[stat] = row[stat]
-        self.abilities = [x.strip() for x in row["Abilities"].split("|")]
+        self.abilities = list(row["Abilities"])
 
         # Some models include the price of their wargear.
-        includes_wargear = row["IncludesWargear"]
-        if len(includes_wargear) != 0 and int(includes_wargear) != 0:
-            self.includes_wargear = True
+        self.includes_wargear = row["IncludesWargear"]
 
         # The model might actually be a damage variant of another model.  If
         # it is, then add it to the base model's list.
-        pattern = "(.*)\\(([0-9]+)W\\)"
-        match = re.match(pattern, self.name)
+        match = DAMAGE_VARIANT_PATTERN.match(self.name)
         if match:
             base_name = match.group(1).strip()
             threshold = int(match.group(2))
@@ -118,9 +196,29 @@ class Model(Record):
         else:
             table[self.name] = self
 
+    def group_key(self, name):
+        match = DAMAGE_VARIANT_PATTERN.match(name)
+        if match:
+            return match.group(1).strip()
+        return name
+
+    def check_group(self, key, rows):
+        # Damage variants are added to their model, so must come after it.
+        if rows[0]["Name"] == key:
+            return []
+        if any(row["Name"] == key for row in rows):
+            return [(0, "damage variant '%s' comes before its model '%s'" % (
+                rows[0]["Name"], key))]
+        return [(0, "damage variant '%s' of unknown model '%s'" % (
+            rows[0]["Name"], key))]
+
 
 class Psyker(BasicRecord):
 
+    schema = Schema(Column("Name"), Column("PowersPerTurn", integer),
+                    Column("DenyPerTurn", integer),
+                    Column("NumKnownPowers", integer), Column("Discipline"))
+
     def __init__(self):
         BasicRecord.__init__(self)
         self.powers_per_turn = 0
@@ -130,9 +228,9 @@ class Psyker(BasicRecord):
 
     def parse(self, row, table):
         BasicRecord.parse(self, row, table)
-        self.powers_per_turn = int(row["PowersPerTurn"])
-        self.deny_per_turn = int(row["DenyPerTurn"])
-        self.num_known_powers = int(row["NumKnownPowers"])
+        self.powers_per_turn = row["PowersPerTurn"]
+        self.deny_per_turn = row["DenyPerTurn"]
+        self.num_known_powers = row["NumKnownPowers"]
         self.discipline = row["Discipline"]
 
 
@@ -180,6 +278,13 @@ class Weapon(Record):
     ensure you're looking at the real record(s) and not a dummy base weapon.
     """
 
+    schema = Schema(Column("Name"), Column("Cost", integer), Column("Range"),
+                    Column("Type"), Column("S"), Column("AP"), Column("D"),
+                    Column("Abilities", text_list, required=False))
+
+    # The columns shown in stat tables.
+    STATS = ("Name", "Cost", "Range", "Type", "S", "AP", "D")
+
     def __init__(self, name="", cost=0):
         Record.__init__(self)
         self.name = name
@@ -194,16 +299,14 @@ class Weapon(Record):
 
         # Read name and cost.
         self.name = row["Name"]
-        self.cost = int(row["Cost"])
+        self.cost = row["Cost"]
 
         # Read stats
-        stats = ["Name", "Cost", "Range", "Type", "S", "AP", "D"]
-        for stat in stats:
+        for stat in self.STATS:
             self.stats[stat] = row[stat]
 
         # Extract the abilities
-        self.abilities = [x.strip() for x in row["Abilities"].split("|")]
-        if "" in self.abilities: self.abilities.remove("")
+        self.abilities = list(row["Abilities"])
 
         # Add a string representing the abilities to the stats map.
         abilities_str = ", ".join(self.abilities)
@@ -212,8 +315,7 @@ class Weapon(Record):
 
         # Weapons with different firing modes have the modes grouped
         # together as separate 'weapons' under a dummy base weapon entry.
-        pattern = "(.*)\\[.*\\]"
-        match = re.match(pattern, self.name)
+        match = WEAPON_MODE_PATTERN.match(self.name)
         if match:
             base_name = match.group(1).strip()
             if not base_name in table:
@@ -222,6 +324,12 @@ class Weapon(Record):
         else:
             table[self.name] = self
 
+    def group_key(self, name):
+        match = WEAPON_MODE_PATTERN.match(name)
+        if match:
+            return match.group(1).strip()
+        return name
+
     def get_modes(self):
         if len(self.modes) > 0:
             return self.modes
@@ -231,6 +339,9 @@ class Weapon(Record):
 
 class Wargear(BasicRecord):
 
+    schema = Schema(Column("Name"), Column("Cost", integer),
+                    Column("Abilities", text_list, required=False))
+
     def __init__(self):
         BasicRecord.__init__(self)
         self.cost = 0
@@ -238,28 +349,158 @@ class Wargear(BasicRecord):
 
     def parse(self, row, table):
         BasicRecord.parse(self, row, table)
-        self.cost = int(row["Cost"])
-        self.abilities = [x.strip() for x in row["Abilities"].split("|")]
+        self.cost = row["Cost"]
+        self.abilities = list(row["Abilities"])
 
     def table_name(self):
         return "wargear"
 
 
+# Slots are shown on force organisation charts in this order, followed by any
+# others in alphabetical order.
+SLOT_ORDER = ("HQ", "Troops", "Fast Attack", "Elites", "Heavy Support",
+              "Transports")
+
+
+def parse_slot_rule(rule):
+    """
+    Parse the limit of a slot of a formation.
+    :param rule: A range of units e.g. '2-3', or a ratio e.g. '1:2'.
+    :return: (is_ratio, (count, per)) for a ratio, or (is_ratio, (min, max))
+             for a range.
+    :raises ValueError: If the rule is malformed, or its ratio is not of a
+                        positive number of units.
+    """
+    is_ratio = ":" in rule
+    try:
+        first, second = (int(value) for value in
+                         rule.split(":" if is_ratio else "-"))
+    except ValueError:
+        raise ValueError("'%s' is neither a range such as '2-3' nor a ratio "
+                         "such as '1:2'" % rule)
+    if is_ratio and second <= 0:
+        raise ValueError("ratio '%s' must be per a positive number of "
+                         "units" % rule)
+    return is_ratio, (first, second)
+
+
+def slot_order_key(slot):
+    """ Sort key putting slots in chart order. """
+    if slot in SLOT_ORDER:
+        return (SLOT_ORDER.index(slot), slot)
+    return (len(SLOT_ORDER), slot)
+
+
 class Formation(BasicRecord):
+    """
+    A type of detachment. Every column other than the name and CP is a slot,
+    limited either to a range of units e.g. '2-3', or to a ratio e.g. '1:2'
+    meaning one unit in the slot for every two units in the range limited
+    slots.
+    """
+
+    schema = Schema(Column("Name"), Column("CP", integer))
 
     def __init__(self):
         BasicRecord.__init__(self)
         self.cp = 0
         self.slots = collections.OrderedDict()
-        self.transports_ratio = ""
+        self.ratios = collections.OrderedDict()
 
     def parse(self, row, table):
         BasicRecord.parse(self, row, table)
-        self.cp = int(row["CP"])
-        for slot in ("HQ", "Troops", "Fast Attack", "Elites", "Heavy Support"):
-            min, max = row[slot].split("-")
-            self.slots[slot] = (int(min), int(max))
-        self.transports_ratio = row["Transports"]
+        self.cp = row["CP"]
+        for slot in sorted(self.slot_columns(row), key=slot_order_key):
+            rule = row[slot]
+            if len(rule) == 0:
+                continue
+            is_ratio, limits = parse_slot_rule(rule)
+            if is_ratio:
+                self.ratios[slot] = limits
+            else:
+                self.slots[slot] = limits
+
+    def slot_columns(self, row):
+        return [column for column in row if column not in ("Name", "CP")]
+
+    def check_row(self, row):
+        problems = []
+        for slot in self.slot_columns(row):
+            if len(row[slot]) > 0:
+                try:
+                    parse_slot_rule(row[slot])
+                except ValueError as e:
+                    problems.append("slot '%s' of '%s': %s" % (
+                        slot, row["Name"], e))
+        return problems
+
+
+class OptionGroup(object):
+    """
+    A group of items of which a unit may take a limited number in total.
+    """
+
+    def __init__(self, name, items, maximum, per):
+        """
+        :param name: Name of the group, e.g. "Tactical Marine: Heavy weapon".
+        :param items: The items in the group.
+        :param maximum: How many of the items may be taken, or None if there
+                        is no limit.
+        :param per: If not None, maximum items may be taken for every this
+                    many models in the unit.
+        """
+        self.name = name
+        self.items = items
+        self.maximum = maximum
+        self.per = per
+
+    def limit(self, num_models):
+        """ How many of the items a unit of a number of models may take. """
+        if self.maximum is None or self.per is None:
+            return self.maximum
+        return self.maximum * (num_models // self.per)
+
+
+class Options(Record):
+    """
+    The wargear options of the units containing a model.
+
+    Each row is a group of items, named like "Tactical Marine: Heavy weapon",
+    of which a unit may take at most 'Max' in total, or 'Max' for every 'Per'
+    models in the unit. A group with no maximum lists items the unit may take
+    freely. A unit may only take items in the groups of its models, unless
+    none of its models have options, in which case it is not checked.
+    """
+
+    schema = Schema(Column("Name"), Column("Items", text_list),
+                    Column("Max", optional_integer, required=False),
+                    Column("Per", optional_integer, required=False))
+
+    def __init__(self):
+        Record.__init__(self)
+        self.name = ""
+        self.groups = []
+
+    def parse(self, row, table):
+        self.name = self.group_key(row["Name"])
+        options = table.setdefault(self.name, self)
+        options.groups.append(OptionGroup(row["Name"], row["Items"],
+                                          row["Max"], row["Per"]))
+
+    def table_name(self):
+        return "options"
+
+    def check_row(self, row):
+        if row["Per"] is not None and row["Per"] <= 0:
+            return ["'Per' of '%s' must be a positive number of models" %
+                    row["Name"]]
+        return []
+
+    def group_key(self, name):
+        match = OPTION_GROUP_PATTERN.match(name)
+        if match:
+            return match.group(1).strip()
+        return name
 
 
 class Background(BasicRecord):
@@ -274,18 +515,206 @@ class Demeanour(BasicRecord):
     pass
 
 
-def read_armies(dirname):
-    """ Read the army data into dicts. """
-    armies = []
-    for filename in os.listdir(dirname):
+# The types of record, one per table.
+TABLES = (Weapon, Wargear, Model, Formation, Ability, Psyker, Demeanour, Quirk,
+          Background, Options)
+
+
+def read_armies(dirname, cache=None):
+    """
+    Read the army data into dicts. Squads using shared unit definitions are
+    resolved against the directory's unit library.
+    :param dirname: Directory of lists.
+    :param cache: Optional PickleCache of parsed lists, keyed by the hash of
+                  their text. Lists found in it are not parsed at all, and
+                  those that are parsed are added to it.
+    :return: List of armies, in order of file name. The 'TextHash' of each
+             is the hash of its text, which the cache is keyed by.
+    """
+    files = []
+    for filename in sorted(os.listdir(dirname)):
         if not filename.lower().endswith(".yaml"): continue
-        with open(os.path.join(dirname, filename), "r") as infile:
-            army = yaml.load(infile)
-            army["Basename"] = os.path.splitext(filename)[0]
-            armies.append(army)
+        with open(os.path.join(dirname, filename), "rb") as infile:
+            text = infile.read()
+        files.append((os.path.splitext(filename)[0], text,
+                      hashlib.sha1(text).hexdigest()))
+
+    armies = [None] * len(files)
+    if cache is not None:
+        armies = [cache.get(text_hash) for _, _, text_hash in files]
+    unparsed = [i for i, army in enumerate(armies) if army is None]
+    parsed = parse_armies([files[i][1] for i in unparsed])
+    for i, army in zip(unparsed, parsed):
+        armies[i] = army
+        if cache is not None:
+            cache.put(files[i][2], army)
+
+    library = UnitLibrary(os.path.join(dirname, UNITS_DIRNAME))
+    for army, (basename, _, text_hash) in zip(armies, files):
+        prepare_army(army, basename, text_hash, library)
     return armies
 
 
+def read_army(filename, library=None):
+    """
+    Read an army from a file.
+    :param filename: The list.
+    :param library: UnitLibrary to resolve the squads against. By default,
+                    the library of the directory the list is in.
+    """
+    if library is None:
+        library = UnitLibrary(os.path.join(os.path.dirname(filename),
+                                           UNITS_DIRNAME))
+    with open(filename, "rb") as infile:
+        return load_army(infile.read(),
+                         os.path.splitext(os.path.basename(filename))[0],
+                         library)
+
+
+def load_army(text, basename, library=None):
+    """
+    Load an army from YAML.
+    :param text: YAML text.
+    :param basename: Name identifying the army's output files.
+    :param library: UnitLibrary to resolve the squads against, if any.
+    :return: The army. Its 'Basename' is set, its 'TextHash' is a hash of the
+             text it was loaded from, and its 'Hash' a hash of that and any
+             unit definitions it uses.
+    """
+    if not isinstance(text, bytes):
+        text = text.encode("utf-8")
+    return prepare_army(parse_army(text), basename,
+                        hashlib.sha1(text).hexdigest(), library)
+
+
+def prepare_army(army, basename, text_hash, library=None):
+    """
+    Check a parsed army and resolve its squads.
+    :param army: The parsed YAML.
+    :param basename: Name identifying the army's output files.
+    :param text_hash: Hash of the text it was parsed from.
+    :param library: UnitLibrary to resolve the squads against, if any.
+    :return: The army, as for load_army().
+    :raises DataError: If the army is missing any fields, or has quantities
+                       which are not whole numbers.
+    """
+    if not isinstance(army, dict):
+        raise DataError(["%s: not a map of fields" % basename])
+    army["Basename"] = basename
+    army["TextHash"] = text_hash
+    army["Hash"] = text_hash
+    check_army(army)
+    (library or UnitLibrary()).resolve(army)
+    check_squads(army)
+    return army
+
+
+class UnitLibrary(object):
+    """
+    Unit definitions shared between lists, read from the .yaml files in a
+    directory. Each file maps the names of units to their definitions, which
+    are written like the squads in a list.
+
+    A squad in a list may then be given as e.g. '- Use: Tactical Squad'. It
+    takes everything from the definition, except that any other fields it has
+    replace the definition's, and its 'Items' replace the quantities of the
+    definition's items; a quantity of 0 removes an item.
+
+    Each definition is resolved once for each set of overrides, and every
+    list using it gets the same squad, so anything worked out for the squad
+    (its cost, its card) is shared by all of them. Resolved squads must not
+    be changed in place.
+    """
+
+    def __init__(self, dirname=None):
+        """
+        :param dirname: Directory of unit definitions. There are none if it is
+                        None or does not exist.
+        """
+        self.definitions = {}
+        self.__resolved = {}
+        sha = hashlib.sha1()
+        if dirname is not None and os.path.isdir(dirname):
+            for filename in sorted(os.listdir(dirname)):
+                if not filename.lower().endswith(".yaml"): continue
+                with open(os.path.join(dirname, filename), "rb") as infile:
+                    text = infile.read()
+                sha.update(filename.encode("utf-8"))
+                sha.update(text)
+                self.definitions.update(parse_army(text) or {})
+        # Changes whenever any of the definitions do.
+        self.fingerprint = sha.hexdigest()
+
+    def resolve_squad(self, squad):
+        """ Get the squad using a definition, with its overrides applied. """
+        name = squad["Use"]
+        definition = self.definitions.get(name)
+        if definition is None:
+            raise UnknownRecordError("No unit definition '%s'." % name)
+        key = json.dumps(squad, sort_keys=True)
+        resolved = self.__resolved.get(key)
+        if resolved is None:
+            resolved = dict(definition)
+            resolved["Name"] = definition.get("Name", name)
+            resolved.update((field, value) for field, value in squad.items()
+                            if field != "Items")
+            items = dict(definition.get("Items") or {})
+            for item, quantity in (squad.get("Items") or {}).items():
+                if quantity == 0:
+                    items.pop(item, None)
+                else:
+                    items[item] = quantity
+            resolved["Items"] = items
+            self.__resolved[key] = resolved
+        return resolved
+
+    def resolve(self, army):
+        """
+        Resolve the squads in an army which use unit definitions. The army's
+        'Hash' is updated to cover the definitions it uses.
+        """
+        used = {}
+        for detachment in army["Detachments"]:
+            units = detachment["Units"]
+            for index, squad in enumerate(units):
+                if "Use" in squad:
+                    units[index] = self.resolve_squad(squad)
+                    used[squad["Use"]] = self.definitions[squad["Use"]]
+        if len(used) > 0:
+            army["Hash"] = hashlib.sha1((army["Hash"] + json.dumps(
+                used, sort_keys=True)).encode("utf-8")).hexdigest()
+
+
+def parse_army(text):
+    """ Parse the YAML text of an army. """
+    return yaml.load(text, Loader=ArmyLoader)
+
+
+def parse_armies(texts, processes=None):
+    """
+    Parse the YAML text of many armies, using several processes if there are
+    enough of them to be worth it.
+    :param texts: List of YAML texts.
+    :param processes: Number of processes. Defaults to the number of CPUs.
+    :return: List of armies.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if len(texts) < PARALLEL_PARSE_THRESHOLD or processes < 2:
+        return [parse_army(text) for text in texts]
+    try:
+        pool = multiprocessing.Pool(processes)
+    except (OSError, ImportError):
+        # No working process support, e.g. no /dev/shm.
+        return [parse_army(text) for text in texts]
+    try:
+        return pool.map(parse_army, texts,
+                        chunksize=max(1, len(texts) // (processes * 4)))
+    finally:
+        pool.close()
+        pool.join()
+
+
 def read_table(data_dir, create_record):
     """
     Read a table of records and return it.
@@ -296,94 +725,612 @@ def read_table(data_dir, create_record):
                           this table.
     :return: The table of records.
     """
-    basename = create_record().table_name()
-    filename = os.path.join(data_dir, basename+".csv")
-    table = collections.OrderedDict()
+    return read_layered_table([data_dir], create_record)
+
+
+def dataset_dirs(data_dir, name):
+    """
+    List the directories making up a dataset, base layer first.
+
+    A dataset directory may contain a 'dataset.yaml' naming another dataset as
+    its 'Base'. Tables are then inherited from the base, and the dataset only
+    needs to contain the rows that differ. If it also lists the tables to
+    'Inherit', e.g. [weapons, abilities], the rest are not inherited (see
+    table_dirs()).
+
+    :param data_dir: Path to data directory.
+    :param name: Name of the dataset directory, e.g. '40k'.
+    :return: List of directories.
+    :raises UnknownRecordError: If there is no such dataset.
+    :raises DataError: If a dataset is its own base.
+    """
+    dirs = []
+    while name is not None:
+        directory = os.path.join(data_dir, name)
+        if not os.path.isdir(directory):
+            raise UnknownRecordError("No dataset '%s'." % directory)
+        if directory in dirs:
+            raise DataError(["%s: dataset '%s' inherits itself" % (
+                os.path.join(directory, "dataset.yaml"), name)])
+        dirs.insert(0, directory)
+        name = read_manifest(directory).get("Base")
+    return dirs
+
+
+def read_manifest(directory):
+    """ Read the 'dataset.yaml' of a dataset directory, if it has one. """
+    manifest = os.path.join(directory, "dataset.yaml")
+    if not os.path.exists(manifest):
+        return {}
+    with open(manifest, "r") as infile:
+        return yaml.safe_load(infile) or {}
+
+
+def table_dirs(data_dirs, table):
+    """
+    Get the layers of a dataset that a table is read from: all of them, unless
+    a layer's 'dataset.yaml' lists the tables it will 'Inherit' without that
+    one, in which case the table starts afresh at that layer.
+    :param data_dirs: Data directories, base layer first.
+    :param table: Name of the table, e.g. 'weapons'.
+    :return: List of directories, base layer first.
+    """
+    for index in range(len(data_dirs) - 1, 0, -1):
+        inherit = read_manifest(data_dirs[index]).get("Inherit")
+        if inherit is not None and table not in inherit:
+            return data_dirs[index:]
+    return data_dirs
+
+
+def read_layered_rows(data_dirs, prototype):
+    """
+    Read the rows of a table from a stack of dataset layers.
+
+    Each layer overrides the groups of rows (see Record.group_key) that it
+    defines, and inherits the rest from the layers beneath it.
+
+    :param data_dirs: Data directories, base layer first.
+    :param prototype: An empty record of the type stored in the table.
+    :return: Ordered map of group key to (header, rows), where header is a
+             tuple of column names and rows is a tuple of value tuples.
+    """
+    basename = prototype.table_name()
+    groups = collections.OrderedDict()
+    for data_dir in table_dirs(data_dirs, basename):
+        filename = os.path.join(data_dir, basename+".csv")
+        if os.path.exists(filename):
+            groups.update(read_rows(filename, prototype))
+    return groups
+
+
+def read_csv(filename, prototype):
+    """
+    Read a .csv file, converting its values as described by the record's
+    schema.
+    :param filename: The .csv file.
+    :param prototype: An empty record of the type stored in the table.
+    :return: (header, rows, lines) where rows is a list of value tuples, and
+             lines the line number of each row.
+    :raises DataError: If the file does not match the schema, or has rows
+                       which its records reject.
+    """
+    rows = []
+    lines = []
     with open(filename) as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            record = create_record()
-            record.parse(row, table)
+        reader = csv.reader(csvfile)
+        header = tuple(name.strip() for name in next(reader, ()))
+        for values in reader:
+            if len(values) == 0:
+                continue
+            rows.append(tuple(values))
+            lines.append(reader.line_num)
+    header, rows = prototype.schema.convert(header, rows, filename, lines)
+    if prototype.check_row is not None:
+        errors = []
+        for values, line in zip(rows, lines):
+            for problem in prototype.check_row(dict(zip(header, values))):
+                errors.append("%s:%s: %s" % (filename, line, problem))
+        if len(errors) > 0:
+            raise DataError(errors)
+    return header, rows, lines
+
+
+def read_rows(filename, prototype):
+    """
+    Read the rows of a single .csv file, grouped as by read_layered_rows().
+    Values are converted as described by the record's schema.
+    :param filename: The .csv file.
+    :param prototype: An empty record of the type stored in the table.
+    :return: Ordered map of group key to (header, rows).
+    :raises DataError: If the file does not match the schema, or has groups
+                       of rows which its records reject.
+    """
+    header, rows, lines = read_csv(filename, prototype)
+    layer = collections.OrderedDict()
+    name = header.index("Name")
+    for values, line in zip(rows, lines):
+        layer.setdefault(prototype.group_key(values[name]), []).append(
+            (values, line))
+    groups = collections.OrderedDict()
+    errors = []
+    for key, entries in layer.items():
+        rows = tuple(values for values, line in entries)
+        if prototype.check_group is not None:
+            for index, problem in prototype.check_group(
+                    key, [dict(zip(header, values)) for values in rows]):
+                errors.append("%s:%s: %s" % (filename, entries[index][1],
+                                             problem))
+        groups[key] = (header, rows)
+    if len(errors) > 0:
+        raise DataError(errors)
+    return groups
+
+
+def parse_group(header, rows, create_record):
+    """
+    Parse a group of rows into records.
+    :param header: Column names.
+    :param rows: Value tuples.
+    :param create_record: Record creation function.
+    :return: List of (name, record) table entries.
+    """
+    table = collections.OrderedDict()
+    for values in rows:
+        record = create_record()
+        record.parse(dict(zip(header, values)), table)
+    return list(table.items())
+
+
+def read_layered_table(data_dirs, create_record, record_cache=None):
+    """
+    Read a table from a stack of dataset layers and return it.
+
+    If a record cache is given then groups with identical rows share their
+    records with any other table read through the same cache.
+
+    :param data_dirs: Data directories, base layer first.
+    :param create_record: Record creation function.
+    :param record_cache: Optional dict for sharing records between tables.
+    :return: The table of records.
+    """
+    prototype = create_record()
+    basename = prototype.table_name()
+    groups = read_layered_rows(data_dirs, prototype)
+    table = collections.OrderedDict()
+    for key, (header, rows) in groups.items():
+        cache_key = (basename, header, rows)
+        entries = None
+        if record_cache is not None:
+            entries = record_cache.get(cache_key)
+        if entries is None:
+            entries = parse_group(header, rows, create_record)
+            if record_cache is not None:
+                record_cache[cache_key] = entries
+        table.update(entries)
     return table
 
 
+def dataset_fingerprint(data_dirs):
+    """
+    Get a hash of the contents of a stack of dataset layers, which changes
+    whenever any of their files do.
+    """
+    sha = hashlib.sha1()
+    for data_dir in data_dirs:
+        for name in sorted(os.listdir(data_dir)):
+            path = os.path.join(data_dir, name)
+            if os.path.isfile(path):
+                sha.update(name.encode("utf-8"))
+                with open(path, "rb") as f:
+                    sha.update(f.read())
+    return sha.hexdigest()
+
+
+def source_signature(data_dirs):
+    """
+    Summarise the state of the files in a dataset, cheaply, so that we can
+    tell whether anything loaded from it is out of date.
+    """
+    parts = []
+    for data_dir in data_dirs:
+        for name in sorted(os.listdir(data_dir)):
+            path = os.path.join(data_dir, name)
+            stat = os.stat(path)
+            parts.append("%s:%s:%s" % (path, stat.st_mtime, stat.st_size))
+    return "\n".join(parts)
+
+
+def game_dirname(game):
+    """ Get the name of the dataset directory for a game. """
+    return game.lower().replace(" ", "-")
+
+
+def squad_level(squad):
+    """ Get the level a kill team squad has reached with its experience. """
+    xp = squad.get("Experience", 0)
+    if xp >= 12: return 3
+    if xp >= 7: return 2
+    if xp >= 3: return 1
+    return 0
+
+
+def is_quantity(value):
+    """ Check whether a value from a list is a whole number of items. """
+    return isinstance(value, numbers.Integral) and not isinstance(value, bool)
+
+
+def missing_fields(entry, fields):
+    """ List the fields an entry of a list does not have. """
+    return [field for field in fields if field not in entry]
+
+
+def check_army(army):
+    """
+    Check that an army, and its detachments, have the fields they need. The
+    squads' fields are checked once any unit definitions are resolved.
+    :raises DataError: Naming the list and detachment of each problem.
+    """
+    errors = []
+    def error(where, message):
+        errors.append("%s: %s%s" % (army["Basename"], where, message))
+    for field in missing_fields(army, ARMY_FIELDS):
+        error("", "no '%s'" % field)
+    if not is_quantity(army.get("Points", 0)):
+        error("", "points limit %r is not a whole number" % army["Points"])
+    detachments = army.get("Detachments", [])
+    if not isinstance(detachments, list):
+        error("", "'Detachments' is not a list")
+        detachments = []
+    for index, detachment in enumerate(detachments):
+        if not isinstance(detachment, dict):
+            error("detachment %s: " % (index + 1), "not a map of fields")
+            continue
+        where = "detachment '%s': " % detachment.get("Name", index + 1)
+        for field in missing_fields(detachment, DETACHMENT_FIELDS):
+            error(where, "no '%s'" % field)
+        units = detachment.get("Units", [])
+        if not isinstance(units, list) or \
+                not all(isinstance(squad, dict) for squad in units):
+            error(where, "'Units' is not a list of squads")
+            continue
+        for squad in units:
+            if not isinstance(squad.get("Items", {}), dict):
+                error(where, "squad '%s': 'Items' is not a map of item to "
+                      "quantity" % squad.get("Name", squad.get("Use")))
+    if len(errors) > 0:
+        raise DataError(errors)
+
+
+def check_squads(army):
+    """
+    Check that the squads of an army have the fields they need, and that the
+    quantities of their items are whole numbers.
+    :raises DataError: Naming the list and squad of each problem.
+    """
+    errors = []
+    for detachment in army["Detachments"]:
+        for index, squad in enumerate(detachment["Units"]):
+            if "Name" in squad:
+                where = "%s: squad '%s'" % (army["Basename"], squad["Name"])
+            else:
+                where = "%s: squad %s of detachment '%s'" % (
+                    army["Basename"], index + 1, detachment["Name"])
+            for field in missing_fields(squad, SQUAD_FIELDS):
+                errors.append("%s: no '%s'" % (where, field))
+            for item, quantity in squad.get("Items", {}).items():
+                if not is_quantity(quantity):
+                    errors.append("%s: quantity %r of '%s' is not a whole "
+                                  "number" % (where, quantity, item))
+    if len(errors) > 0:
+        raise DataError(errors)
+
+
+def squad_key(squad):
+    """
+    Get a key identifying the contents of a squad, in the order of its items,
+    which is all that its compiled form depends on.
+    """
+    return tuple(squad["Items"].items())
+
+
+class CompiledSquad(object):
+    """
+    A squad's items as parallel arrays of item ids and quantities, in the
+    order of the squad's items, with its costs worked out from them. Items in
+    none of the item tables are left out.
+    """
+
+    def __init__(self, ids, quantities, models_cost, wargear_cost,
+                 wargear_included):
+        self.ids = ids
+        self.quantities = quantities
+        self.models_cost = models_cost
+        self.wargear_cost = wargear_cost
+        self.wargear_included = wargear_included
+        self.cost = models_cost + (0 if wargear_included else wargear_cost)
+
+
+class UnknownRecordError(LookupError):
+    """
+    Raised when looking up something which is not in the database.
+    """
+    pass
+
+
 class Database(object):
-    def __init__(self, game, data_dir):
-        self.__game = game
-        data_dir = os.path.join(data_dir, game.lower().replace(" ", "-"))
-        self.__weapons = read_table(data_dir, Weapon)
-        self.__wargear = read_table(data_dir, Wargear)
-        self.__models = read_table(data_dir, Model)
-        self.__formations = read_table(data_dir, Formation)
-        self.__abilities = read_table(data_dir, Ability)
-        self.__psykers = read_table(data_dir, Psyker)
+    """
+    The data for a game.
+
+    A database is a snapshot: it is never changed once it has been loaded, so
+    any number of threads can read from it at once. To pick up changes to the
+    data, load a new one (see DatabaseRegistry.reload()).
+    """
+
+    def __init__(self, game, data_dir, record_cache=None, overlay_dirs=(),
+                 generation=0):
+        """
+        :param game: The game, e.g. '40k'.
+        :param data_dir: Path to data directory.
+        :param record_cache: Optional dict for sharing records with other
+                             databases.
+        :param overlay_dirs: Extra dataset layers to apply on top of the
+                             game's data, e.g. for trying out points changes.
+        :param generation: Which load of the data this is.
+        """
+        self.game = game
+        self.data_dir = data_dir
+        self.overlay_dirs = list(overlay_dirs)
+        self.generation = generation
+
+        # Every item gets a dense integer id the first time it is seen, with
+        # its name, kind, cost and record in arrays indexed by it. Names in
+        # none of the item tables have the id -1.
+        self.__item_ids = {}
+        self.__item_names = []
+        self.__item_records = []
+        self.__item_kinds = array.array("B")
+        self.__item_costs = array.array("l")
+        self.__item_includes = array.array("B")
+        self.__items_lock = threading.Lock()
+        self.__compiled = {}
+
+        # The names of each kind of record, indexed for suggesting the nearest
+        # ones to a name that is not there.
+        self.__name_indexes = {}
+        self.__names_lock = threading.Lock()
+
+        # Summarise the data before reading it, so that a change made while
+        # it is being read is picked up by the next reload. The fingerprint
+        # hashes every file, so is only worked out if it is needed.
+        self.signature = source_signature(self.dataset_dirs(data_dir))
+        self.__fingerprint = None
+        self.load(data_dir, record_cache)
+
+    @property
+    def fingerprint(self):
+        """
+        A hash of the contents of the data, for keying things worked out from
+        it. It is worked out the first time it is needed. If the data has
+        changed since it was loaded by then, it is a hash of the signature
+        taken when it was loaded instead, which no other load shares.
+        """
+        if self.__fingerprint is None:
+            data_dirs = self.dataset_dirs(self.data_dir)
+            fingerprint = dataset_fingerprint(data_dirs)
+            if source_signature(data_dirs) != self.signature:
+                fingerprint = hashlib.sha1(
+                    ("changed:" + self.signature).encode("utf-8")).hexdigest()
+            self.__fingerprint = fingerprint
+        return self.__fingerprint
+
+    def dataset_dirs(self, data_dir):
+        """ List the directories of the layers making up the database. """
+        return dataset_dirs(data_dir, game_dirname(self.game)) + \
+            self.overlay_dirs
+
+    def load(self, data_dir, record_cache):
+        """ Read in the tables for the game. """
+        data_dirs = self.dataset_dirs(data_dir)
+        def read(create_record):
+            return read_layered_table(data_dirs, create_record, record_cache)
+        self.__weapons = read(Weapon)
+        self.__wargear = read(Wargear)
+        self.__models = read(Model)
+        self.__formations = read(Formation)
+        self.__abilities = read(Ability)
+        self.__psykers = read(Psyker)
+        self.__options = read(Options)
         self.__demeanours = {}
         self.__backgrounds = {}
         self.__quirks = {}
         if self.is_kill_team:
-            self.__demeanours = read_table(data_dir, Demeanour)
-            self.__quirks = read_table(data_dir, Quirk)
-            self.__backgrounds = read_table(data_dir, Background)
+            self.__demeanours = read(Demeanour)
+            self.__quirks = read(Quirk)
+            self.__backgrounds = read(Background)
         self.__costs = {}
         self.__costs.update(self.__weapons)
         self.__costs.update(self.__models)
         self.__costs.update(self.__wargear)
+        with self.__items_lock:
+            for item in self.__costs:
+                self.__add_item(item, *self.classify_item(item))
 
     @property
     def is_kill_team(self):
-        return self.__game == "Kill Team"
+        return self.game == "Kill Team"
+
+    def classify_item(self, item):
+        """
+        Find an item in the item tables.
+        :return: (kind, record), where kind is a combination of the *_ITEM
+                 flags, and record is None if it is in none of them. Where
+                 names clash, wargear takes precedence over models, and models
+                 over weapons.
+        """
+        kind = 0
+        if item in self.__models: kind |= MODEL_ITEM
+        if item in self.__weapons: kind |= WEAPON_ITEM
+        if item in self.__wargear: kind |= WARGEAR_ITEM
+        return kind, self.__costs.get(item)
+
+    def item_id(self, item):
+        """ Get the id of an item, or -1 if it is in none of the tables. """
+        item_id = self.__item_ids.get(item)
+        if item_id is not None:
+            return item_id
+        kind, record = self.classify_item(item)
+        with self.__items_lock:
+            item_id = self.__item_ids.get(item)
+            if item_id is None:
+                item_id = self.__add_item(item, kind, record)
+        return item_id
+
+    def __add_item(self, item, kind, record):
+        """ Give an item the next id. Only call this holding the lock. """
+        item_id = -1
+        if record is not None:
+            item_id = len(self.__item_names)
+            self.__item_names.append(item)
+            self.__item_records.append(record)
+            self.__item_kinds.append(kind)
+            self.__item_costs.append(record.cost)
+            self.__item_includes.append(
+                getattr(record, "includes_wargear", False))
+        self.__item_ids[item] = item_id
+        return item_id
+
+    def is_model(self, item):
+        """ Check whether an item is a model. """
+        item_id = self.item_id(item)
+        return item_id >= 0 and self.__item_kinds[item_id] & MODEL_ITEM != 0
+
+    def is_weapon(self, item):
+        """ Check whether an item is a weapon. """
+        item_id = self.item_id(item)
+        return item_id >= 0 and self.__item_kinds[item_id] & WEAPON_ITEM != 0
+
+    def is_wargear(self, item):
+        """ Check whether an item is a piece of wargear. """
+        item_id = self.item_id(item)
+        return item_id >= 0 and self.__item_kinds[item_id] & WARGEAR_ITEM != 0
 
     def lookup_item(self, item):
         """ Lookup an item in the costs table. """
-        try:
-            return self.__costs[item]
-        except KeyError:
-            print ("No item '%s' in item table." % item)
-            sys.exit(1)
+        item_id = self.item_id(item)
+        if item_id < 0:
+            raise self.unknown_record("item", item,
+                                      "No item '%s' in item table." % item)
+        return self.__item_records[item_id]
+
+    def compile_squad(self, squad):
+        """
+        Get a squad's CompiledSquad. Squads are compiled once for each set
+        of contents, so a squad that is unchanged in a new revision of a list
+        is not costed again.
+        :raises DataError: If a quantity is not a whole number.
+        """
+        for item, quantity in squad["Items"].items():
+            if not is_quantity(quantity):
+                raise DataError(["squad '%s': quantity %r of '%s' is not a "
+                                 "whole number" % (squad["Name"], quantity,
+                                                   item)])
+        key = squad_key(squad)
+        compiled = self.__compiled.get(key)
+        if compiled is not None:
+            return compiled
+        ids = array.array("l")
+        quantities = array.array("l")
+        kinds = self.__item_kinds
+        costs = self.__item_costs
+        models_cost = 0
+        wargear_cost = 0
+        include_wargear = False
+        for item, quantity in squad["Items"].items():
+            item_id = self.item_id(item)
+            if item_id < 0:
+                continue
+            ids.append(item_id)
+            quantities.append(quantity)
+            kind = kinds[item_id]
+            if kind & MODEL_ITEM:
+                models_cost += costs[item_id] * quantity
+                if self.__item_includes[item_id]:
+                    include_wargear = True
+                else:
+                    # Can't cope with some models in a squad including their
+                    # wargear and some not!
+                    assert not include_wargear
+            if kind & (WEAPON_ITEM | WARGEAR_ITEM):
+                wargear_cost += costs[item_id] * quantity
+        compiled = CompiledSquad(ids, quantities, models_cost, wargear_cost,
+                                 include_wargear)
+
+        # The map is replaced rather than cleared, as for the registry, since
+        # other threads may be reading it.
+        if len(self.__compiled) >= COMPILED_SQUADS_LIMIT:
+            self.__compiled = {}
+        self.__compiled[key] = compiled
+        return compiled
 
     def lookup_formation(self, formation):
         """ Look up a formation in the formations table. """
         try:
             return self.__formations[formation]
         except KeyError:
-            print ("No formation '%s' in formations table." % formation)
+            raise self.unknown_record(
+                "formation", formation,
+                "No formation '%s' in formations table." % formation)
 
     def lookup_ability(self, ability):
         """ Look up an ability in the abilities table. """
         try:
             return self.__abilities[ability]
         except KeyError:
-            print ("No ability '%s' in abilities table." % ability)
+            raise self.unknown_record(
+                "ability", ability,
+                "No ability '%s' in abilities table." % ability)
 
     def lookup_psyker(self, model_name, **kwargs):
-        """ If a model is a psyker lookup its psychic powers. """
+        """
+        If a model is a psyker lookup its psychic powers. With quiet=True,
+        returns None for a model which is not a psyker.
+        """
         quiet = kwargs.get("quiet", False)
         try:
             return self.__psykers[model_name]
         except KeyError:
-            if not quiet:
-                print ("Model '%s' is not a psyker." % model_name)
+            if quiet:
+                return None
+            raise UnknownRecordError(
+                "Model '%s' is not a psyker." % model_name)
+
+    def lookup_options(self, model_name):
+        """
+        Look up the wargear options of the units containing a model. Returns
+        None for a model without any.
+        """
+        return self.__options.get(model_name)
 
     def lookup_quirk(self, name):
         """ Lookup a quirk. """
         try:
             return self.__quirks[name]
         except KeyError:
-            print ("Unknown quirk '%s'" % name)
+            raise UnknownRecordError("Unknown quirk '%s'" % name)
 
     def lookup_background(self, name):
         """ Lookup a background. """
         try:
             return self.__backgrounds[name]
         except KeyError:
-            print ("Unknown background '%s'" % name)
+            raise UnknownRecordError("Unknown background '%s'" % name)
 
     def lookup_demeanour(self, name):
         """ Lookup a demeanour. """
         try:
             return self.__demeanours[name]
         except KeyError:
-            print ("Unknown demeanour '%s'" % name)
+            raise UnknownRecordError("Unknown demeanour '%s'" % name)
 
     def lookup_buff(self, squad, stat_name, item):
         """ Lookup a buff for a stat. """
@@ -413,58 +1360,46 @@ class Database(object):
 
     def squad_models_cost(self, squad):
         """ Calculate the cost of a squad's models. """
-        total = 0
-        for item in squad["Items"]:
-            if item in self.__models:
-                quantity = squad["Items"][item]
-                total += self.lookup_item(item).cost * quantity
-        return total
+        return self.compile_squad(squad).models_cost
 
     def squad_wargear_included(self, squad):
         """
         Figure out whether the cost of the wargear is included already
         in the cost of the models
         """
-        include_wargear = False
-        for item in squad["Items"]:
-            if item in self.__models:
-                if self.lookup_item(item).includes_wargear:
-                    include_wargear = True
-                else:
-                    # Can't cope with some models in a squad including their
-                    # wargear and some not!
-                    assert not include_wargear
-        return include_wargear
+        return self.compile_squad(squad).wargear_included
 
     def squad_wargear_cost(self, squad):
         """ Figure out the cost of a squad's wargear. """
-        if self.squad_wargear_included(squad):
-            return 0
-        total = 0
-        for item in squad["Items"]:
-            if item in self.__weapons or item in self.__wargear:
-                quantity = squad["Items"][item]
-                total += self.lookup_item(item).cost * quantity
-        return total
+        compiled = self.compile_squad(squad)
+        return 0 if compiled.wargear_included else compiled.wargear_cost
 
     def squad_points_cost(self, squad):
-        """ Calculate the total points cost of a squad. """
-        return self.squad_models_cost(squad) + self.squad_wargear_cost(squad)
+        """
+        Calculate the total points cost of a squad. The cost is worked out
+        when the squad is compiled, so each squad is only costed once by each
+        snapshot of the data.
+        """
+        return self.compile_squad(squad).cost
 
     def get_squad_items(self, squad):
         """ Determine weapons and models used in the squad. """
+        compiled = self.compile_squad(squad)
+        kinds = self.__item_kinds
+        names = self.__item_names
         weapons = []
         models = []
         wargear = []
         num_models = 0
-        for item in squad["Items"]:
-            if item in self.__weapons and not item in weapons:
-                weapons.append(item)
-            elif item in self.__models and not item in models:
-                models.append(item)
-                num_models += squad["Items"][item]
-            elif item in self.__wargear and not item in wargear:
-                wargear.append(item)
+        for item_id, quantity in zip(compiled.ids, compiled.quantities):
+            kind = kinds[item_id]
+            if kind & WEAPON_ITEM:
+                weapons.append(names[item_id])
+            elif kind & MODEL_ITEM:
+                models.append(names[item_id])
+                num_models += quantity
+            elif kind & WARGEAR_ITEM:
+                wargear.append(names[item_id])
         return (weapons, models, wargear, num_models)
 
     def army_cp_total(self, army):
@@ -475,41 +1410,94 @@ class Database(object):
             total += formation.cp
         return total
 
+    def list_weapons(self):
+        """ List the names of all of the weapons. """
+        return list(self.__weapons.keys())
+
+    def list_wargear(self):
+        """ List the names of all of the wargear. """
+        return list(self.__wargear.keys())
+
+    def list_models(self):
+        """ List the names of all of the models. """
+        return list(self.__models.keys())
+
+    def list_abilities(self):
+        """ List the names of all of the abilities. """
+        return list(self.__abilities.keys())
+
+    def list_formations(self):
+        """ List the names of all of the formations. """
+        return list(self.__formations.keys())
+
+    def name_index(self, kind):
+        """
+        Get the NameIndex of a kind of record, building it the first time.
+        :param kind: 'item', 'formation' or 'ability'.
+        """
+        with self.__names_lock:
+            index = self.__name_indexes.get(kind)
+            if index is None:
+                if kind == "item":
+                    names = self.list_wargear() + self.list_models() + \
+                        self.list_weapons()
+                    index = NameIndex(names, Weapon().group_key)
+                elif kind == "formation":
+                    index = NameIndex(self.list_formations())
+                else:
+                    index = NameIndex(self.list_abilities())
+                self.__name_indexes[kind] = index
+            return index
+
+    def suggest_names(self, kind, name, limit=3):
+        """
+        Suggest the names of the records of a kind nearest to one.
+        :param kind: 'item', 'formation' or 'ability'.
+        :param name: The name, which need not be in the tables.
+        :return: List of names, nearest first.
+        """
+        return self.name_index(kind).suggest(name, limit)
+
+    def unknown_record(self, kind, name, message):
+        """
+        Make the error for a name missing from the tables, suggesting the
+        nearest ones which are there.
+        """
+        suggestions = self.suggest_names(kind, name)
+        if len(suggestions) > 0:
+            message += " Did you mean %s?" % quote_names(suggestions)
+        return UnknownRecordError(message)
+
+    def list_army_items(self, army, kind):
+        """
+        List each distinct item of a kind in an army, in the order they first
+        appear.
+        :param kind: One of the *_ITEM flags.
+        """
+        squads = [self.compile_squad(unit) for detachment in
+                  army["Detachments"] for unit in detachment["Units"]]
+        kinds = self.__item_kinds
+        seen = bytearray(len(kinds))
+        ids = []
+        for compiled in squads:
+            for item_id in compiled.ids:
+                if kinds[item_id] & kind and not seen[item_id]:
+                    seen[item_id] = 1
+                    ids.append(item_id)
+        names = self.__item_names
+        return [names[item_id] for item_id in ids]
+
     def list_army_weapons(self, army):
         """ List all of the weapons in the army."""
-        weapons = []
-        seen = set()
-        for detachment in army["Detachments"]:
-            for unit in detachment["Units"]:
-                for item in unit["Items"]:
-                    if item in self.__weapons and not item in seen:
-                        seen.add(item)
-                        weapons.append(item)
-        return weapons
+        return self.list_army_items(army, WEAPON_ITEM)
 
     def list_army_wargear(self, army):
         """ List all of the wargear in the army."""
-        wargear = []
-        seen = set()
-        for detachment in army["Detachments"]:
-            for unit in detachment["Units"]:
-                for item in unit["Items"]:
-                    if item in self.__wargear and not item in seen:
-                        seen.add(item)
-                        wargear.append(item)
-        return wargear
+        return self.list_army_items(army, WARGEAR_ITEM)
 
     def list_army_models(self, army):
         """ List each distinct model in the army. """
-        models = []
-        seen = set()
-        for detachment in army["Detachments"]:
-            for unit in detachment["Units"]:
-                for item in unit["Items"]:
-                    if item in self.__models and not item in seen:
-                        seen.add(item)
-                        models.append(item)
-        return models
+        return self.list_army_items(army, MODEL_ITEM)
 
     def list_army_abilities(self, army):
         """ List each distinct ability in the army. """
@@ -525,11 +1513,7 @@ class Database(object):
         return abilities
 
     def get_squad_level(self, squad):
-        xp = squad.get("Experience", 0)
-        if xp >= 12: return 3
-        if xp >= 7: return 2
-        if xp >= 3: return 1
-        return 0
+        return squad_level(squad)
 
     def list_squad_abilities(self, squad):
         """ List each ability in a squad. """
@@ -543,4 +1527,161 @@ class Database(object):
             level = self.get_squad_level(squad)
             for i in range(1, level + 1):
                 abilities.append("%s (%s)" % (specialist, i))
-        return abilities
\ No newline at end of file
+        return abilities
+
+
+class DatabaseRegistry(object):
+    """
+    The databases for all of the games, each loaded the first time an army
+    needs it. Records that are identical in several datasets are shared rather
+    than loaded once per game.
+
+    The databases can be reloaded while they are in use. Each reload loads a
+    whole new set of snapshots and then swaps them in at once, bumping the
+    generation. Threads holding a database from an earlier generation can
+    carry on using it, and get the new one the next time they ask.
+    """
+
+    def __init__(self, data_dir, create_database=Database):
+        """
+        :param data_dir: Path to data directory.
+        :param create_database: Database creation function, taking the game,
+                                the data directory, a record cache and the
+                                generation (as a keyword argument).
+        """
+        self.data_dir = os.path.abspath(data_dir)
+        self.create_database = create_database
+        self.generation = 0
+        self.__databases = {}
+        self.__record_cache = {}
+        self.__lock = threading.Lock()
+
+    def get(self, game):
+        """ Get the database for a game, loading it if necessary. """
+        database = self.__databases.get(game)
+        if database is None:
+            with self.__lock:
+                database = self.__databases.get(game)
+                if database is None:
+                    database = self.create_database(
+                        game, self.data_dir, self.__record_cache,
+                        generation=self.generation)
+                    # Readers never take the lock, so the map is replaced
+                    # rather than changed.
+                    databases = dict(self.__databases)
+                    databases[game] = database
+                    self.__databases = databases
+        return database
+
+    def for_army(self, army):
+        """ Get the database for the game an army is for. """
+        return self.get(army["Game"])
+
+    def source_signatures(self):
+        """ Get the current source_signature() of each loaded game's data. """
+        return dict((game, source_signature(database.dataset_dirs(
+            self.data_dir))) for game, database in self.__databases.items())
+
+    def is_stale(self, signatures=None):
+        """
+        Check whether the data for any loaded game has changed.
+        :param signatures: The source_signatures(), if already known.
+        """
+        if signatures is None:
+            signatures = self.source_signatures()
+        for game, database in self.__databases.items():
+            if signatures.get(game, database.signature) != database.signature:
+                return True
+        return False
+
+    def reload(self):
+        """
+        Load the data for every game that has been loaded again, and swap the
+        new databases in.
+        :return: The new generation.
+        """
+        with self.__lock:
+            generation = self.generation + 1
+
+            # Records whose rows have not changed are carried over from the
+            # previous generation; anything else is dropped along with it.
+            previous = self.__record_cache
+            record_cache = PreviousGenerationCache(previous)
+            databases = {}
+            for game in self.__databases:
+                databases[game] = self.create_database(
+                    game, self.data_dir, record_cache, generation=generation)
+            self.__record_cache = dict(record_cache)
+            self.__databases = databases
+            self.generation = generation
+        return generation
+
+
+class PreviousGenerationCache(dict):
+    """
+    A record cache which takes entries from the previous generation's cache as
+    they are asked for, so that it ends up with just the ones still in use.
+    """
+
+    def __init__(self, previous):
+        dict.__init__(self)
+        self.previous = previous
+
+    def get(self, key, default=None):
+        if key not in self and key in self.previous:
+            self[key] = self.previous[key]
+        return dict.get(self, key, default)
+
+
+class DatabaseReloader(object):
+    """
+    Watches the data files and reloads a registry's databases in the
+    background whenever they change.
+    """
+
+    def __init__(self, registry, interval=2.0):
+        """
+        :param registry: The DatabaseRegistry to keep up to date.
+        :param interval: How often to check the files, in seconds.
+        """
+        self.registry = registry
+        self.interval = interval
+        self.__failed = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """ Start watching. """
+        self.__thread = threading.Thread(target=self.run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """ Stop watching, and wait for any reload in progress to finish. """
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def run(self):
+        while not self.__stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """
+        Reload the databases if the data has changed. Bad data is reported
+        and the current databases kept until it is fixed.
+        :return: Whether the databases were reloaded.
+        """
+        signatures = self.registry.source_signatures()
+        if not self.registry.is_stale(signatures) or \
+                signatures == self.__failed:
+            return False
+        try:
+            generation = self.registry.reload()
+        except Exception as e:
+            # Don't try again until the files change.
+            self.__failed = signatures
+            print ("Not reloading the data:\n%s" % e)
+            return False
+        print ("Reloaded the data (generation %s)." % generation)
+        return True
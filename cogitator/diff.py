@@ -0,0 +1,140 @@
+"""
+Compare two revisions of an army list.
+
+Detachments are matched up by name, and units within matched detachments by
+name too (in order, where a detachment has several units of the same name).
+Costs come from the database's compiled squads, which are keyed by their
+contents, so unchanged squads are never re-costed.
+"""
+
+import collections
+
+
+def match_by_name(old_entries, new_entries):
+    """
+    Pair up two lists of named entries.
+    :param old_entries: Entries in the old revision.
+    :param new_entries: Entries in the new revision.
+    :return: List of (old, new) pairs, in which an entry missing from one
+             revision is None.
+    """
+    unmatched = collections.OrderedDict()
+    for entry in old_entries:
+        unmatched.setdefault(entry["Name"], []).append(entry)
+    pairs = []
+    for entry in new_entries:
+        candidates = unmatched.get(entry["Name"])
+        old = candidates.pop(0) if candidates else None
+        pairs.append((old, entry))
+    for candidates in unmatched.values():
+        for entry in candidates:
+            pairs.append((entry, None))
+    return pairs
+
+
+def diff_items(old_squad, new_squad):
+    """
+    List the items whose quantities differ between two revisions of a squad.
+    :return: List of (item, old quantity, new quantity).
+    """
+    old_items = old_squad["Items"]
+    new_items = new_squad["Items"]
+    changes = []
+    for item in old_items:
+        if old_items[item] != new_items.get(item, 0):
+            changes.append((item, old_items[item], new_items.get(item, 0)))
+    for item in new_items:
+        if item not in old_items:
+            changes.append((item, 0, new_items[item]))
+    return changes
+
+
+def format_delta(old, new):
+    """ Format a change in a number. """
+    if old == new:
+        return "%s" % new
+    return "%s -> %s (%+d)" % (old, new, new - old)
+
+
+def format_change(old, new):
+    """ Format a change in a value. """
+    if old == new:
+        return "%s" % new
+    return "%s -> %s" % (old, new)
+
+
+class ArmyComparer(object):
+    """
+    Produces a compact report of the differences between two revisions of an
+    army.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def diff_armies(self, old, new):
+        """
+        Compare two revisions of an army.
+        :param old: The old army.
+        :param new: The new army.
+        :return: The lines of the report.
+        """
+        lines = []
+        lines.append("Army: %s" % format_change(old["Name"], new["Name"]))
+        lines.append("  Points: %s (limit %s)" % (
+            format_delta(self.database.army_points_cost(old),
+                         self.database.army_points_cost(new)),
+            format_delta(old["Points"], new["Points"])))
+        lines.append("  CP: %s" % format_delta(
+            self.database.army_cp_total(old),
+            self.database.army_cp_total(new)))
+        for old_detachment, new_detachment in match_by_name(
+                old["Detachments"], new["Detachments"]):
+            lines += self.diff_detachments(old_detachment, new_detachment)
+        return lines
+
+    def diff_detachments(self, old, new):
+        """ Compare two revisions of a detachment. """
+        if old is None:
+            return ["  + Detachment %s (%s, %s pts)" % (
+                new["Name"], new["Type"],
+                self.database.detachment_points_cost(new))]
+        if new is None:
+            return ["  - Detachment %s (%s, %s pts)" % (
+                old["Name"], old["Type"],
+                self.database.detachment_points_cost(old))]
+        lines = []
+        for old_squad, new_squad in match_by_name(old["Units"], new["Units"]):
+            lines += self.diff_squads(old_squad, new_squad)
+        old_cost = self.database.detachment_points_cost(old)
+        new_cost = self.database.detachment_points_cost(new)
+        if len(lines) == 0 and old_cost == new_cost and \
+                old["Type"] == new["Type"]:
+            return []
+        header = "  ~ Detachment %s: %s pts" % (
+            new["Name"], format_delta(old_cost, new_cost))
+        if old["Type"] != new["Type"]:
+            header += ", %s" % format_change(old["Type"], new["Type"])
+        return [header] + lines
+
+    def diff_squads(self, old, new):
+        """ Compare two revisions of a squad. """
+        if old is None:
+            return ["    + %s (%s, %s pts)" % (
+                new["Name"], new["Slot"], self.database.squad_points_cost(new))]
+        if new is None:
+            return ["    - %s (%s, %s pts)" % (
+                old["Name"], old["Slot"], self.database.squad_points_cost(old))]
+        changes = diff_items(old, new)
+        if len(changes) == 0 and old["Slot"] == new["Slot"]:
+            return []
+        header = "    ~ %s: %s pts" % (new["Name"], format_delta(
+            self.database.squad_points_cost(old),
+            self.database.squad_points_cost(new)))
+        if old["Slot"] != new["Slot"]:
+            header += ", %s" % format_change(old["Slot"], new["Slot"])
+        lines = [header]
+        for item, old_quantity, new_quantity in changes:
+            lines.append("        %s: %s" % (
+                item, format_delta(old_quantity, new_quantity)))
+        return lines
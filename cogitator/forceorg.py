@@ -0,0 +1,97 @@
+"""
+Check detachments against the force organisation rules of their formations.
+
+The units of a detachment are tallied by slot in a single pass, after which
+each slot's count is compared with its limits, so checking an army takes time
+proportional to the number of units in it. Problems are returned as
+Violations rather than stopping the build, so that they can be shown on the
+force organisation chart, on the index page, and by the 'validate' command.
+"""
+
+import collections
+
+
+class SlotTally(object):
+    """
+    The number of units in a slot of a detachment, and the limits on it.
+    """
+
+    def __init__(self, slot, count, minimum, maximum):
+        self.slot = slot
+        self.count = count
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def is_valid(self):
+        return self.minimum <= self.count <= self.maximum
+
+
+class Violation(object):
+    """
+    A slot of a detachment with too few or too many units in it.
+    """
+
+    def __init__(self, detachment, tally):
+        self.detachment = detachment
+        self.slot = tally.slot
+        self.count = tally.count
+        self.minimum = tally.minimum
+        self.maximum = tally.maximum
+
+    def __str__(self):
+        if self.count > self.maximum:
+            return "%s: %s %s units, at most %s allowed." % (
+                self.detachment, self.count, self.slot, self.maximum)
+        return "%s: %s %s units, at least %s needed." % (
+            self.detachment, self.count, self.slot, self.minimum)
+
+
+class ForceOrgChecker(object):
+
+    def __init__(self, database):
+        self.database = database
+
+    def tally_detachment(self, detachment):
+        """
+        Count the units in each slot of a detachment.
+        :param detachment: The detachment.
+        :return: List of SlotTally in chart order. Units in slots the
+                 formation does not have are tallied against a limit of 0.
+        """
+        formation = self.database.lookup_formation(detachment["Type"])
+        counts = collections.Counter(squad["Slot"]
+                                     for squad in detachment["Units"])
+
+        tallies = []
+        for slot, (minimum, maximum) in formation.slots.items():
+            tallies.append(SlotTally(slot, counts[slot], minimum, maximum))
+        unknown = sorted(slot for slot in counts if slot not in
+                         formation.slots and slot not in formation.ratios)
+        for slot in unknown:
+            tallies.append(SlotTally(slot, counts[slot], 0, 0))
+
+        # Ratio limited slots depend on the size of the rest of the detachment.
+        others = sum(counts[slot] for slot in counts
+                     if slot not in formation.ratios)
+        for slot, (count, per) in formation.ratios.items():
+            tallies.append(SlotTally(slot, counts[slot], 0,
+                                     others * count // per))
+        return tallies
+
+    def check_detachment(self, detachment):
+        """ List the force organisation violations in a detachment. """
+        return [Violation(detachment["Name"], tally)
+                for tally in self.tally_detachment(detachment)
+                if not tally.is_valid()]
+
+    def check_army(self, army):
+        """
+        List the force organisation violations in an army. Kill teams are not
+        organised by slot, so they have none.
+        """
+        if self.database.is_kill_team:
+            return []
+        violations = []
+        for detachment in army["Detachments"]:
+            violations += self.check_detachment(detachment)
+        return violations
@@ -0,0 +1,286 @@
+"""
+Check the references between the data tables, and from the lists into them.
+
+The rows of every table of a dataset are read once, without building any
+records, and every reference is then checked against sets of names, so that
+all of the problems are found in one run rather than one at a time as pages
+fail to render:
+
+* names defined twice in a table, or in more than one of the item tables;
+* abilities of models, weapons and wargear missing from abilities.csv;
+* psykers, and wargear options, for things which are not models;
+* wargear options offering items which do not exist;
+* damage variants, e.g. "Robot (10W)", without a base model before them;
+* weapons with both a profile of their own and modes, e.g. "Bolter" as well
+  as "Bolter [Rapid]";
+* items, formations, abilities of the levels specialists have reached, and
+  kill team backgrounds, quirks and demeanours named by the lists but missing
+  from the data, along with the names nearest to them which are there.
+"""
+
+import collections
+import os
+
+from cogitator.database import Weapon, Wargear, Model, Ability, Psyker, \
+    Formation, Demeanour, Quirk, Background, Options, TABLES, dataset_dirs, \
+    game_dirname, read_csv, squad_level, table_dirs
+from cogitator.names import NameIndex, quote_names
+
+
+class Row(object):
+    """ A row of a table, and where it came from. """
+
+    def __init__(self, filename, line, values):
+        self.filename = filename
+        self.line = line
+        self.values = values
+
+    def __getitem__(self, column):
+        return self.values[column]
+
+    def location(self):
+        return "%s:%s" % (self.filename, self.line)
+
+
+def read_layered_groups(data_dirs, create_record, problems):
+    """
+    Read the rows of a table from a stack of dataset layers, grouped and
+    overridden as for loading, noting any names defined twice in a file.
+    :return: Ordered map of group key to list of Rows.
+    """
+    prototype = create_record()
+    groups = collections.OrderedDict()
+    for data_dir in table_dirs(data_dirs, prototype.table_name()):
+        filename = os.path.join(data_dir, prototype.table_name() + ".csv")
+        if not os.path.exists(filename):
+            continue
+        header, rows, lines = read_csv(filename, prototype)
+        layer = collections.OrderedDict()
+        first_lines = {}
+        for values, line in zip(rows, lines):
+            row = Row(filename, line, dict(zip(header, values)))
+            name = row["Name"]
+            if name in first_lines:
+                problems.append("%s: duplicate %s '%s' (first defined on "
+                                "line %s)" % (row.location(),
+                                              prototype.table_name(), name,
+                                              first_lines[name]))
+                continue
+            first_lines[name] = line
+            layer.setdefault(prototype.group_key(name), []).append(row)
+        groups.update(layer)
+    return groups
+
+
+class Dataset(object):
+    """ The rows of all the tables for a game. """
+
+    def __init__(self, data_dir, game):
+        self.game = game
+        self.problems = []
+        data_dirs = dataset_dirs(data_dir, game_dirname(game))
+        self.groups = {}
+        self.__name_indexes = {}
+        for create_record in TABLES:
+            self.groups[create_record] = read_layered_groups(
+                data_dirs, create_record, self.problems)
+
+    def names(self, create_record):
+        """ Get the names of the entries in a table. """
+        return set(self.groups[create_record].keys())
+
+    def name_index(self, *create_records):
+        """ Get a NameIndex of the entries in some tables. """
+        index = self.__name_indexes.get(create_records)
+        if index is None:
+            index = NameIndex([name for create_record in create_records
+                               for name in self.groups[create_record]],
+                              create_records[0]().group_key)
+            self.__name_indexes[create_records] = index
+        return index
+
+    def suggest(self, name, *create_records):
+        """ Get ', did you mean ...?' for the names nearest to one, if any. """
+        suggestions = self.name_index(*create_records).suggest(name)
+        if len(suggestions) == 0:
+            return ""
+        return ", did you mean %s?" % quote_names(suggestions)
+
+    def rows(self, create_record):
+        """ Iterate over the rows of a table. """
+        for rows in self.groups[create_record].values():
+            for row in rows:
+                yield row
+
+
+class IntegrityChecker(object):
+
+    def __init__(self, data_dir):
+        """
+        :param data_dir: Path to data directory.
+        """
+        self.data_dir = data_dir
+        self.__datasets = {}
+        self.__reported = set()
+
+    def dataset(self, game):
+        """ Get the rows of the tables for a game, reading them once. """
+        dataset = self.__datasets.get(game)
+        if dataset is None:
+            dataset = Dataset(self.data_dir, game)
+            self.__datasets[game] = dataset
+        return dataset
+
+    def check_data(self, game):
+        """
+        Check the tables for a game.
+        :return: List of problems, each starting with the file and line.
+                 Problems in a dataset layer shared with a game that has
+                 already been checked are not reported again.
+        """
+        dataset = self.dataset(game)
+        problems = list(dataset.problems)
+        problems += self.check_item_names(dataset)
+        problems += self.check_abilities(dataset)
+        problems += self.check_psykers(dataset)
+        problems += self.check_damage_variants(dataset)
+        problems += self.check_weapon_modes(dataset)
+        problems += self.check_options(dataset)
+        new_problems = [problem for problem in problems
+                        if problem not in self.__reported]
+        self.__reported.update(problems)
+        return new_problems
+
+    def check_item_names(self, dataset):
+        """ Items are looked up by name, so must be in only one table. """
+        problems = []
+        tables = collections.defaultdict(list)
+        for create_record in (Wargear, Model, Weapon):
+            for name, rows in dataset.groups[create_record].items():
+                tables[name].append(rows[0])
+        for name, rows in tables.items():
+            if len(rows) > 1:
+                problems.append("%s: item '%s' is also defined at %s" % (
+                    rows[0].location(), name,
+                    ", ".join(row.location() for row in rows[1:])))
+        return problems
+
+    def check_abilities(self, dataset):
+        problems = []
+        abilities = dataset.names(Ability)
+        for create_record in (Model, Weapon, Wargear):
+            for row in dataset.rows(create_record):
+                for ability in row["Abilities"]:
+                    if ability not in abilities:
+                        problems.append(
+                            "%s: %s '%s' has ability '%s', which is not in "
+                            "abilities.csv%s" % (
+                                row.location(), create_record.__name__.lower(),
+                                row["Name"], ability,
+                                dataset.suggest(ability, Ability)))
+        return problems
+
+    def check_psykers(self, dataset):
+        problems = []
+        models = dataset.names(Model)
+        for row in dataset.rows(Psyker):
+            if row["Name"] not in models:
+                problems.append("%s: psyker '%s' is not in models.csv" % (
+                    row.location(), row["Name"]))
+        return problems
+
+    def check_damage_variants(self, dataset):
+        """ A model's damage variants must come after the model itself. """
+        problems = []
+        for name, rows in dataset.groups[Model].items():
+            if rows[0]["Name"] == name:
+                continue
+            bases = [row for row in rows if row["Name"] == name]
+            if len(bases) == 0:
+                problems.append("%s: damage variant '%s' of unknown model "
+                                "'%s'" % (rows[0].location(),
+                                          rows[0]["Name"], name))
+            else:
+                problems.append("%s: damage variant '%s' comes before its "
+                                "model, at %s" % (rows[0].location(),
+                                                  rows[0]["Name"],
+                                                  bases[0].location()))
+        return problems
+
+    def check_weapon_modes(self, dataset):
+        """ A weapon either has a profile of its own, or modes. """
+        problems = []
+        for name, rows in dataset.groups[Weapon].items():
+            plain = [row for row in rows if row["Name"] == name]
+            if len(plain) > 0 and len(rows) > len(plain):
+                modes = [row for row in rows if row["Name"] != name]
+                problems.append("%s: weapon '%s' has a profile of its own as "
+                                "well as modes, e.g. '%s' at %s" % (
+                                    plain[0].location(), name,
+                                    modes[0]["Name"], modes[0].location()))
+        return problems
+
+    def check_options(self, dataset):
+        """ Options must be for models, and only offer items. """
+        problems = []
+        models = dataset.names(Model)
+        items = models | dataset.names(Weapon) | dataset.names(Wargear)
+        for key, rows in dataset.groups[Options].items():
+            if key not in models:
+                problems.append("%s: options for '%s', which is not in "
+                                "models.csv" % (rows[0].location(), key))
+            for row in rows:
+                for item in row["Items"]:
+                    if item not in items:
+                        problems.append("%s: option '%s' has item '%s', which "
+                                        "is not in the item tables" % (
+                                            row.location(), row["Name"], item))
+        return problems
+
+    def check_army(self, army, filename):
+        """
+        Check that everything a list names is in the data for its game.
+        :param army: The army.
+        :param filename: The list's file, for reporting problems.
+        :return: List of problems, each starting with the file.
+        """
+        dataset = self.dataset(army["Game"])
+        items = dataset.names(Weapon) | dataset.names(Wargear) | \
+            dataset.names(Model)
+        formations = dataset.names(Formation)
+        kill_team = army["Game"] == "Kill Team"
+        problems = []
+        def problem(where, message):
+            problems.append("%s: %s: %s" % (filename, where, message))
+        def check(where, name, create_record, kind):
+            if name is not None and name not in dataset.names(create_record):
+                problem(where, "no %s '%s' in %s.csv%s" % (
+                    kind, name, create_record().table_name(),
+                    dataset.suggest(name, create_record)))
+
+        for detachment in army["Detachments"]:
+            where = "detachment '%s'" % detachment["Name"]
+            if detachment["Type"] not in formations:
+                problem(where, "no formation '%s' in formations.csv%s" % (
+                    detachment["Type"],
+                    dataset.suggest(detachment["Type"], Formation)))
+            if kill_team:
+                check(where, detachment.get("Background"), Background,
+                      "background")
+                check(where, detachment.get("Quirk"), Quirk, "quirk")
+            for squad in detachment["Units"]:
+                where = "squad '%s'" % squad["Name"]
+                for item in squad["Items"]:
+                    if item not in items:
+                        problem(where, "no item '%s' in the item tables%s" % (
+                            item, dataset.suggest(item, Weapon, Wargear,
+                                                  Model)))
+                if kill_team:
+                    check(where, squad.get("Demeanour"), Demeanour,
+                          "demeanour")
+                    specialist = squad.get("Specialist")
+                    if specialist is not None:
+                        for level in range(1, squad_level(squad) + 1):
+                            check(where, "%s (%s)" % (specialist, level),
+                                  Ability, "ability")
+        return problems
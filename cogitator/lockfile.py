@@ -0,0 +1,189 @@
+"""
+Lockfiles: the computed totals of a list, kept next to it.
+
+When a list is built its points total, the cost and CP of each detachment and
+its force organisation violations are written to a .lock file beside the
+list, along with a hash of the list and of the rows of the data tables that
+went into them. The index and the summaries can then be rebuilt from the
+lockfiles without loading the data at all, for as long as neither the list
+nor those rows change.
+
+A lockfile is checked against the fingerprint of its game's data first, which
+only means hashing the data files. If the data has changed, the rows the list
+uses are read and hashed, so a change to an item the list does not use leaves
+its lockfile valid.
+"""
+
+import hashlib
+import json
+import os
+
+from cogitator.database import Formation, Model, Options, Wargear, Weapon, \
+    dataset_dirs, dataset_fingerprint, game_dirname, read_layered_rows
+from cogitator.forceorg import ForceOrgChecker
+from cogitator.staging import write_file_atomically
+
+# Changed whenever what goes into a lockfile does, so that old ones are redone.
+LOCK_VERSION = 1
+
+# The tables of the items in a squad.
+ITEM_TABLES = (Weapon, Wargear, Model, Options)
+
+
+def lock_filename(lists_dir, basename):
+    """ Get the name of a list's lockfile. """
+    return os.path.join(lists_dir, basename + ".lock")
+
+
+def army_totals(database, army):
+    """
+    Cost an army.
+    :param database: Database for the army's game.
+    :param army: The army.
+    :return: Map of the army's 'Total' points, 'CP', force organisation
+             'Violations' and the 'Name', 'Type', 'Cost' and 'CP' of each of
+             its 'Detachments'.
+    """
+    detachments = []
+    for detachment in army["Detachments"]:
+        detachments.append({
+            "Name": detachment["Name"],
+            "Type": detachment["Type"],
+            "Cost": database.detachment_points_cost(detachment),
+            "CP": database.lookup_formation(detachment["Type"]).cp
+        })
+    return {
+        "Total": database.army_points_cost(army),
+        "CP": database.army_cp_total(army),
+        "Detachments": detachments,
+        "Violations": [str(violation) for violation in
+                       ForceOrgChecker(database).check_army(army)]
+    }
+
+
+class DatasetRows(object):
+    """
+    The rows of a game's data tables, read as they are needed but never made
+    into records, for hashing the rows a list uses.
+    """
+
+    def __init__(self, data_dirs):
+        """
+        :param data_dirs: Data directories, base layer first.
+        """
+        self.data_dirs = data_dirs
+        self.__tables = {}
+
+    def groups(self, create_record):
+        """ Get the groups of rows of a table, as by read_layered_rows(). """
+        groups = self.__tables.get(create_record)
+        if groups is None:
+            groups = read_layered_rows(self.data_dirs, create_record())
+            self.__tables[create_record] = groups
+        return groups
+
+    def army_hash(self, army):
+        """ Get a hash of the rows an army's totals are worked out from. """
+        keys = set()
+        for detachment in army["Detachments"]:
+            keys.add((Formation, detachment["Type"]))
+            for squad in detachment["Units"]:
+                for item in squad["Items"]:
+                    for create_record in ITEM_TABLES:
+                        keys.add((create_record, item))
+        used = []
+        for create_record, key in keys:
+            group = self.groups(create_record).get(key)
+            if group is not None:
+                used.append([create_record().table_name(), key, group])
+        used.sort(key=lambda entry: (entry[0], entry[1]))
+        return hashlib.sha1(json.dumps(used, sort_keys=True).encode(
+            "utf-8")).hexdigest()
+
+
+class LockFiles(object):
+    """
+    The lockfiles of a directory of lists.
+    """
+
+    def __init__(self, lists_dir, data_dir):
+        """
+        :param lists_dir: Directory of YAML lists.
+        :param data_dir: Path to data directory.
+        """
+        self.lists_dir = lists_dir
+        self.data_dir = data_dir
+        self.num_written = 0
+        self.__fingerprints = {}
+        self.__rows = {}
+
+    def data_dirs(self, game):
+        return dataset_dirs(self.data_dir, game_dirname(game))
+
+    def fingerprint(self, game):
+        """ Get the fingerprint of a game's data, as Database does. """
+        fingerprint = self.__fingerprints.get(game)
+        if fingerprint is None:
+            fingerprint = dataset_fingerprint(self.data_dirs(game))
+            self.__fingerprints[game] = fingerprint
+        return fingerprint
+
+    def rows(self, game):
+        """ Get the DatasetRows of a game. """
+        rows = self.__rows.get(game)
+        if rows is None:
+            rows = DatasetRows(self.data_dirs(game))
+            self.__rows[game] = rows
+        return rows
+
+    def read(self, army):
+        """
+        Read an army's lockfile.
+        :param army: The army.
+        :return: The lock, or None if there is none or it is out of date.
+        """
+        filename = lock_filename(self.lists_dir, army["Basename"])
+        if not os.path.exists(filename):
+            return None
+        with open(filename, "r") as f:
+            try:
+                lock = json.load(f)
+            except ValueError:
+                return None
+        if lock.get("Version") != LOCK_VERSION or \
+                lock.get("List") != army["Hash"]:
+            return None
+        fingerprint = self.fingerprint(army["Game"])
+        if lock["Fingerprint"] != fingerprint:
+            if lock["Rows"] != self.rows(army["Game"]).army_hash(army):
+                return None
+            # Only rows the army does not use have changed.
+            lock["Fingerprint"] = fingerprint
+            self.write(lock, army["Basename"])
+        return lock
+
+    def update(self, database, army):
+        """
+        Bring an army's lockfile up to date.
+        :param database: Database for the army's game, loaded from the same
+                         data directory.
+        :param army: The army.
+        :return: The lock.
+        """
+        lock = self.read(army)
+        if lock is None:
+            lock = {
+                "Version": LOCK_VERSION,
+                "List": army["Hash"],
+                "Game": army["Game"],
+                "Fingerprint": self.fingerprint(army["Game"]),
+                "Rows": self.rows(army["Game"]).army_hash(army)
+            }
+            lock.update(army_totals(database, army))
+            self.write(lock, army["Basename"])
+        return lock
+
+    def write(self, lock, basename):
+        write_file_atomically(lock_filename(self.lists_dir, basename),
+                              json.dumps(lock, indent=1, sort_keys=True))
+        self.num_written += 1
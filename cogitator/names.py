@@ -0,0 +1,172 @@
+"""
+Find the names nearest to one which is not in a table, to suggest in place
+of it.
+
+Names are compared normalised: in lower case, with runs of whitespace made
+single spaces. Each normalised name is split into trigrams, padded at both
+ends, and each trigram has a posting for every name it appears in. Within an
+edit distance k a name can only have lost k * 3 of the distinct trigrams of
+another, so only the names sharing enough trigrams with the one being looked
+up, and of a near enough length, have their edit distance worked out. That
+keeps suggesting fast however many names there are.
+"""
+
+import collections
+
+# The length of the grams names are split into.
+GRAM_SIZE = 3
+
+# How many edits to allow per this many characters of the name looked up.
+CHARACTERS_PER_EDIT = 4
+
+
+def normalise(name):
+    """ Get the form of a name which is compared. """
+    return " ".join(name.lower().split())
+
+
+def grams(name):
+    """ Get the set of distinct trigrams of a normalised name. """
+    padded = "\0" * (GRAM_SIZE - 1) + name + "\0" * (GRAM_SIZE - 1)
+    return set(padded[i:i + GRAM_SIZE]
+               for i in range(len(padded) - GRAM_SIZE + 1))
+
+
+def edit_distance(a, b, limit):
+    """
+    Get the Levenshtein distance between two strings.
+    :param limit: Stop as soon as the distance is known to be over this.
+    :return: The distance, or limit + 1 if it is over the limit.
+    """
+    over = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return over
+    # Only the cells within limit of the diagonal can be within the limit.
+    previous = [min(j, over) for j in range(len(b) + 1)]
+    for i, a_char in enumerate(a, 1):
+        current = [over] * (len(b) + 1)
+        current[0] = min(i, over)
+        best = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1,
+                           previous[j - 1] + (a_char != b[j - 1]))
+            current[j] = min(distance, over)
+            best = min(best, distance)
+        if best > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+def quote_names(names):
+    """ Join some names for a message, e.g. "'A', 'B' or 'C'". """
+    quoted = ["'%s'" % name for name in names]
+    if len(quoted) < 2:
+        return "".join(quoted)
+    return "%s or %s" % (", ".join(quoted[:-1]), quoted[-1])
+
+
+class NameIndex(object):
+    """
+    The names in a table, for looking them up loosely and suggesting the
+    nearest ones to a name that is not there.
+    """
+
+    def __init__(self, names=(), group_key=None):
+        """
+        :param names: The names to index.
+        :param group_key: Optional function giving the name that a name looked
+                          up is kept under, e.g. Weapon.group_key() to find
+                          'Bolter' for 'Bolter [Rapid]'.
+        """
+        self.group_key = group_key or (lambda name: name)
+        self.names = []
+        self.normalised = []
+        self.ids = {}
+        self.postings = collections.defaultdict(list)
+        self.lengths = collections.defaultdict(list)
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        """ Index a name. Names normalising the same are only kept once. """
+        key = normalise(name)
+        if key in self.ids:
+            return
+        name_id = len(self.names)
+        self.ids[key] = name_id
+        self.names.append(name)
+        self.normalised.append(key)
+        self.lengths[len(key)].append(name_id)
+        for gram in grams(key):
+            self.postings[gram].append(name_id)
+
+    def find(self, name):
+        """
+        Look up a name ignoring case and spacing.
+        :return: The name as it was indexed, or None.
+        """
+        for key in (normalise(name), normalise(self.group_key(name))):
+            name_id = self.ids.get(key)
+            if name_id is not None:
+                return self.names[name_id]
+        return None
+
+    def shared_grams(self, key):
+        """ Count the trigrams each name shares with a normalised name. """
+        shared = collections.Counter()
+        for gram in grams(key):
+            for name_id in self.postings.get(gram, ()):
+                shared[name_id] += 1
+        return shared
+
+    def candidates(self, key, distance, shared):
+        """
+        Get the ids of the names which could be within an edit distance of a
+        normalised name.
+        :param shared: The counts of shared_grams() for the name.
+        """
+        needed = len(grams(key)) - distance * GRAM_SIZE
+        if needed <= 0:
+            # Too short for the trigrams to rule anything out.
+            ids = []
+            for length in range(max(0, len(key) - distance),
+                                len(key) + distance + 1):
+                ids += self.lengths.get(length, [])
+            return ids
+        return [name_id for name_id, count in shared.items()
+                if count >= needed and
+                abs(len(self.normalised[name_id]) - len(key)) <= distance]
+
+    def suggest(self, name, limit=3, max_distance=None):
+        """
+        Find the names nearest to one.
+        :param name: The name looked up.
+        :param limit: The most names to return.
+        :param max_distance: The most edits a name may be away, by default one
+                             for every four characters of the name.
+        :return: List of the names as they were indexed. A name which only
+                 differs in case or spacing, or which the name is grouped
+                 under, comes first, followed by those the fewest edits away.
+        """
+        found = self.find(name)
+        key = normalise(self.group_key(name))
+        if max_distance is None:
+            max_distance = max(1, len(key) // CHARACTERS_PER_EDIT)
+
+        # Look one edit further away at a time, as the nearer the names have
+        # to be the fewer there are to work out the edit distance of.
+        shared = self.shared_grams(key)
+        nearest = []
+        for distance in range(1, max_distance + 1):
+            for name_id in self.candidates(key, distance, shared):
+                if self.names[name_id] != found and edit_distance(
+                        key, self.normalised[name_id], distance) <= distance:
+                    nearest.append(self.names[name_id])
+            if len(nearest) > 0:
+                break
+        suggestions = [found] if found is not None else []
+        return (suggestions + sorted(nearest))[:limit]
@@ -0,0 +1,117 @@
+"""
+Check the wargear of squads against the options of their models.
+
+The option groups of each combination of models are compiled once into a map
+from item to the groups it counts towards, so checking a squad takes a single
+pass over its items, however many groups or lists there are. Problems are
+returned as OptionViolations rather than stopping the build, as for the
+force organisation rules.
+"""
+
+import collections
+
+
+class OptionViolation(object):
+    """
+    An item a squad may not take, or a group of options it has taken too many
+    of.
+    """
+
+    def __init__(self, squad, message):
+        self.squad = squad
+        self.message = message
+
+    def __str__(self):
+        return "%s: %s" % (self.squad, self.message)
+
+
+class CompiledOptions(object):
+    """
+    The option groups of the models in a squad, compiled for checking.
+    """
+
+    def __init__(self, options):
+        """
+        :param options: List of Options records, one per model with options.
+        """
+        self.groups = []
+        self.item_groups = {}
+        for record in options:
+            for group in record.groups:
+                index = len(self.groups)
+                self.groups.append(group)
+                for item in group.items:
+                    self.item_groups.setdefault(item, []).append(index)
+        self.item_groups = dict((item, tuple(indices)) for item, indices in
+                                self.item_groups.items())
+
+    def check(self, name, items, num_models):
+        """
+        Check the items of a squad.
+        :param name: The squad's name, for reporting violations.
+        :param items: Map of item to count, excluding models.
+        :param num_models: Number of models in the squad.
+        :return: List of OptionViolations.
+        """
+        violations = []
+        counts = collections.Counter()
+        for item, count in items.items():
+            indices = self.item_groups.get(item)
+            if indices is None:
+                violations.append(OptionViolation(
+                    name, "may not take %s." % item))
+                continue
+            for index in indices:
+                counts[index] += count
+        for index in sorted(counts):
+            group = self.groups[index]
+            limit = group.limit(num_models)
+            if limit is not None and counts[index] > limit:
+                violations.append(OptionViolation(
+                    name, "%s items from '%s', at most %s allowed." % (
+                        counts[index], group.name, limit)))
+        return violations
+
+
+class OptionsChecker(object):
+
+    def __init__(self, database):
+        self.database = database
+        self.__compiled = {}
+
+    def compile(self, models):
+        """
+        Get the compiled options of a combination of models.
+        :param models: Tuple of the names of models with options.
+        """
+        compiled = self.__compiled.get(models)
+        if compiled is None:
+            compiled = CompiledOptions([self.database.lookup_options(model)
+                                        for model in models])
+            self.__compiled[models] = compiled
+        return compiled
+
+    def check_squad(self, squad):
+        """ List the option violations in a squad. """
+        models = []
+        num_models = 0
+        items = {}
+        for item, count in squad["Items"].items():
+            if self.database.is_model(item):
+                num_models += count
+                if self.database.lookup_options(item) is not None:
+                    models.append(item)
+            else:
+                items[item] = count
+        if len(models) == 0:
+            return []
+        return self.compile(tuple(sorted(models))).check(
+            squad["Name"], items, num_models)
+
+    def check_army(self, army):
+        """ List the option violations in an army. """
+        violations = []
+        for detachment in army["Detachments"]:
+            for squad in detachment["Units"]:
+                violations += self.check_squad(squad)
+        return violations
@@ -2,6 +2,22 @@
 Utilities for writing html.
 """
 
+import re
+
+# Runs of characters which may not appear in an anchor.
+ANCHOR_SEPARATOR = re.compile("[^a-z0-9]+")
+
+
+def anchor_id(kind, name):
+    """
+    Get the id of the anchor for a named thing, e.g. 'weapon-power-fist'.
+    :param kind: What sort of thing it is, e.g. 'weapon'.
+    :param name: Its name.
+    """
+    return "%s-%s" % (kind, ANCHOR_SEPARATOR.sub("-", name.lower()).strip("-"))
+
+
+
 class Table(object):
     def __init__(self):
         self.__columns = []
@@ -12,6 +28,7 @@ class Table(object):
         self.__table_class = None
         self.__default_column_class = None
         self.__cell_styles = {}
+        self.__row_ids = {}
     def add_column(self, column_id):
         assert len(self.__rows) == 0
         assert not column_id in self.__indices
@@ -29,6 +46,9 @@ class Table(object):
         self.__styles[column_id] = column_class
     def add_row(self):
         self.__rows.append(["-"] * len(self.__columns))
+    def set_row_id(self, row_id):
+        """ Set the id of the last row added, so that it can be linked to. """
+        self.__row_ids[len(self.__rows)-1] = row_id
     def set_cell(self, column_id, text, style=None):
         if column_id in self.__indices:
             if style is not None:
@@ -39,19 +59,49 @@ class Table(object):
             outfile.start_tag("table", "class='%s'" % self.__table_class)
         else:
             outfile.start_tag("table")
-        outfile.start_tag("tr")
+
+        # Build the rows directly rather than tag by tag; this is equivalent
+        # to writing each cell with outfile.content(). Rows are formatted in
+        # one go unless they have cells with their own styles, or cells
+        # spanning several lines which need indenting.
+        row_pad = outfile.pad()
+        cell_pad = row_pad + " " * outfile.tabsize
+        row_start = "%s<tr >\n" % row_pad
+        row_end = "%s</tr>\n" % row_pad
+        def cell(text):
+            text = "%s" % text
+            if "\n" in text:
+                text = text.replace("\n", "\n" + cell_pad)
+            return "%s%s\n" % (cell_pad, text)
+        parts = [row_start]
         for column_id in self.__columns:
             name = self.__names.get(column_id, column_id)
-            outfile.content("<th class='title'>%s</th>" % name)
-        outfile.end_tag() # tr
+            parts.append(cell("<th class='title'>%s</th>" % name))
+        parts.append(row_end)
+        styles = [self.__styles.get(column_id, 'stat')
+                  for column_id in self.__columns]
+        row_format = row_start + "".join(
+            "%s<td class='%s'>%%s</td>\n" % (cell_pad, style.replace("%", "%%"))
+            for style in styles) + row_end
+        num_lines = len(styles) + 2
+        styled_rows = set(rowi for (column_id, rowi) in self.__cell_styles)
         for rowi, row in enumerate(self.__rows):
-            outfile.start_tag("tr")
-            for i, cell in enumerate(row):
-                column_id = self.__columns[i]
-                style = self.__styles.get(column_id, 'stat')
-                style = self.__cell_styles.get((column_id, rowi), style)
-                outfile.content("<td class='%s'>%s</td>" % (style, cell))
-            outfile.end_tag() # tr
+            row_id = self.__row_ids.get(rowi)
+            if rowi not in styled_rows and row_id is None:
+                text = row_format % tuple(row)
+                if text.count("\n") == num_lines:
+                    parts.append(text)
+                    continue
+            if row_id is not None:
+                parts.append("%s<tr id='%s'>\n" % (row_pad, row_id))
+            else:
+                parts.append(row_start)
+            for i, text in enumerate(row):
+                style = self.__cell_styles.get((self.__columns[i], rowi),
+                                               styles[i])
+                parts.append(cell("<td class='%s'>%s</td>" % (style, text)))
+            parts.append(row_end)
+        outfile.write("".join(parts))
         outfile.end_tag() # table
 
 
@@ -92,4 +142,51 @@ class Outfile(object):
 
     def comment(self, comment):
         self.write("\n")
-        self.content("<!-- %s -->" % comment)
\ No newline at end of file
+        self.content("<!-- %s -->" % comment)
+
+
+class ChunkBuffer(object):
+    """
+    A file-like object which collects what is written to it until it is
+    drained. Writing to an Outfile on top of one of these and draining it
+    every so often turns a writer into a source of html chunks.
+    """
+
+    def __init__(self):
+        self.__parts = []
+
+    def write(self, text):
+        self.__parts.append(text)
+
+    def drain(self):
+        """ Get everything written since the last drain. """
+        text = "".join(self.__parts)
+        self.__parts = []
+        return text
+
+
+class AsyncChunks(object):
+    """
+    An async iterator over chunks of html produced by a generator. Each chunk
+    is rendered on an executor so that the event loop is free to send the
+    previous one while the next is being rendered.
+    """
+
+    def __init__(self, chunks, executor=None):
+        self.__chunks = chunks
+        self.__executor = executor
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        import asyncio
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.__executor, self.__next_chunk)
+
+    def __next_chunk(self):
+        try:
+            return next(self.__chunks)
+        except StopIteration:
+            # Python 3 only, as is the rest of this class.
+            raise StopAsyncIteration
@@ -0,0 +1,148 @@
+"""
+Read army lists in bulk, e.g. the lists for a tournament.
+
+A pack of lists is either a directory of .yaml files, a .zip archive of them,
+or a single YAML stream holding one list per document. Lists are read one at
+a time as they are needed, so a pack of any size can be costed and rendered
+without holding all of its lists in memory, and archives are read without
+being extracted.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import zipfile
+
+import yaml
+
+from cogitator.database import UNITS_DIRNAME, ArmyLoader, UnitLibrary, \
+    UnknownRecordError, parse_army, prepare_army
+from cogitator.schema import DataError
+
+# The extensions of army lists.
+LIST_EXTENSIONS = (".yaml", ".yml")
+
+
+def pack_name(path):
+    """ Get the name of a pack from its path. """
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def is_list_filename(filename):
+    return filename.lower().endswith(LIST_EXTENSIONS)
+
+
+def parse_text(text):
+    """ Parse the text of a list. :return: (document, hash of the text) """
+    return parse_army(text), hashlib.sha1(text).hexdigest()
+
+
+def hash_document(document):
+    """
+    Get the hash of a document already parsed from a stream, whose text is
+    not kept. :return: (document, hash of its contents)
+    """
+    return document, hashlib.sha1(json.dumps(
+        document, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def iter_directory(dirname):
+    """
+    Iterate over the (basename, read) of the lists in a directory, where
+    read() parses the list and returns it and the hash of its text.
+    """
+    for filename in sorted(os.listdir(dirname)):
+        if not is_list_filename(filename):
+            continue
+        with open(os.path.join(dirname, filename), "rb") as f:
+            yield os.path.splitext(filename)[0], functools.partial(
+                parse_text, f.read())
+
+
+def iter_archive(filename):
+    """
+    Iterate over the (basename, read) of the lists in a zip archive, as for
+    iter_directory(). Lists in subdirectories of the archive are named after
+    their path, e.g. 'round_1_team_a'.
+    """
+    with zipfile.ZipFile(filename) as archive:
+        for name in sorted(archive.namelist()):
+            if not is_list_filename(name):
+                continue
+            basename = os.path.splitext(name)[0].strip("/").replace("/", "_")
+            yield basename, functools.partial(parse_text, archive.read(name))
+
+
+def iter_stream(filename):
+    """
+    Iterate over the (basename, read) of the documents in a YAML stream, as
+    for iter_directory(). The stream is parsed a document at a time, as it is
+    iterated over, and empty documents are skipped. Documents are named after
+    the stream and their position in it, e.g. 'tournament_3'.
+    :raises yaml.YAMLError: If the stream is malformed, after the documents
+                            before the problem.
+    """
+    stem = pack_name(filename)
+    number = 0
+    with open(filename, "rb") as f:
+        for document in yaml.load_all(f, Loader=ArmyLoader):
+            if document is None:
+                continue
+            number += 1
+            yield "%s_%s" % (stem, number), functools.partial(
+                hash_document, document)
+
+
+class Pack(object):
+    """
+    A pack of army lists. Iterating over it loads the lists one at a time;
+    any which cannot be loaded are skipped and noted in 'errors'. The lists
+    in a directory may use the unit definitions in its 'units' directory.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: A directory, .zip archive, or YAML file.
+        """
+        self.path = path
+        self.name = pack_name(path)
+        self.errors = []
+
+    def sources(self):
+        """ Iterate over the (basename, read) of the lists. """
+        if os.path.isdir(self.path):
+            return iter_directory(self.path)
+        if zipfile.is_zipfile(self.path):
+            return iter_archive(self.path)
+        return iter_stream(self.path)
+
+    def __iter__(self):
+        library = UnitLibrary(os.path.join(self.path, UNITS_DIRNAME)
+                              if os.path.isdir(self.path) else None)
+        sources = self.sources()
+        while True:
+            try:
+                basename, read = next(sources)
+            except StopIteration:
+                return
+            except yaml.YAMLError as e:
+                # The parser can't find where the next document of a stream
+                # starts after a syntax error, so the rest of it is lost.
+                self.errors.append("%s: not a YAML stream from here on: %s" %
+                                   (self.name, e))
+                return
+            try:
+                document, text_hash = read()
+                army = prepare_army(document, basename, text_hash, library)
+            except yaml.YAMLError as e:
+                self.errors.append("%s: not an army list: %s" % (basename, e))
+                continue
+            except DataError as e:
+                # One entry per list, each of its problems on a line.
+                self.errors.append(str(e))
+                continue
+            except UnknownRecordError as e:
+                self.errors.append("%s: %s" % (basename, e))
+                continue
+            yield army
@@ -0,0 +1,178 @@
+"""
+Schemas for the .csv data tables.
+
+Each type of record declares the columns of its table: their names, types,
+and whether they must be present. Tables are converted a column at a time,
+with every value stripped of surrounding whitespace and interned, and every
+problem in a file is reported with its line number rather than the first one
+stopping the build with a traceback.
+"""
+
+import sys
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass  # Python 2, where intern() is a builtin.
+
+
+class DataError(ValueError):
+    """
+    Errors in a data table. The message lists each of them, one per line.
+    """
+
+    def __init__(self, errors):
+        ValueError.__init__(self, "\n".join(errors))
+        self.errors = errors
+
+
+def text(value):
+    """ Convert a text value. """
+    return intern(value.strip())
+
+
+def integer(value):
+    """ Convert an integer value. """
+    return int(value)
+
+
+def optional_integer(value):
+    """ Convert an integer value which may be left empty, giving None. """
+    value = value.strip()
+    return int(value) if len(value) > 0 else None
+
+
+def flag(value):
+    """ Convert a flag, which is set by any non-zero integer. """
+    value = value.strip()
+    return len(value) != 0 and int(value) != 0
+
+
+def text_list(value):
+    """ Convert a list of text values separated by '|'. """
+    return tuple(intern(x.strip()) for x in value.split("|") if x.strip())
+
+
+# Describes each converter's values, for error messages.
+DESCRIPTIONS = {
+    integer: "an integer",
+    optional_integer: "an integer or nothing",
+    flag: "0 or 1",
+}
+
+# Turns converted values back into text, for converters whose values are not
+# written out as they are.
+FORMATTERS = {
+    flag: lambda value: "1" if value else "0",
+    text_list: lambda value: "|".join(value),
+    optional_integer: lambda value: "" if value is None else str(value),
+}
+
+
+class Column(object):
+    """
+    A column of a table.
+    """
+
+    def __init__(self, name, convert=text, required=True, default=""):
+        """
+        :param name: Name of the column.
+        :param convert: Function converting text from the column to a value.
+        :param required: Whether tables must have the column. Values for a
+                         missing optional column are converted from default.
+        :param default: Text to use for a missing optional column.
+        """
+        self.name = name
+        self.convert = convert
+        self.required = required
+        self.default = default
+
+    def format(self, value):
+        """ Turn a converted value back into text. """
+        return FORMATTERS.get(self.convert, str)(value)
+
+
+class Schema(object):
+    """
+    The columns of a table. A table may have other columns besides, which are
+    treated as text.
+    """
+
+    def __init__(self, *columns):
+        self.columns = columns
+
+    def header(self, header):
+        """
+        Get the header of converted rows from that of a file: the schema's
+        columns, followed by any others in the file.
+        """
+        names = [column.name for column in self.columns]
+        return tuple(names + [name for name in header if name not in names])
+
+    def check_header(self, filename, header):
+        """ List the problems with the header of a file. """
+        return ["%s:1: missing column '%s'" % (filename, column.name)
+                for column in self.columns
+                if column.required and column.name not in header]
+
+    def convert(self, header, rows, filename="", lines=None):
+        """
+        Convert rows of text.
+        :param header: Column names of the rows.
+        :param rows: List of value tuples.
+        :param filename: Name of the file the rows came from, for errors.
+        :param lines: Line number of each row, for errors.
+        :return: (header, rows) where header is from Schema.header(), and rows
+                 is a list of tuples of converted values.
+        :raises DataError: If any values cannot be converted.
+        """
+        if lines is None:
+            lines = list(range(1, len(rows) + 1))
+        errors = self.check_header(filename, header)
+        if len(errors) > 0:
+            raise DataError(errors)
+
+        # Short rows are padded, as by csv.DictReader.
+        width = len(header)
+        rows = [row if len(row) == width else
+                tuple(row[:width]) + ("",) * (width - len(row))
+                for row in rows]
+        values = dict(zip(header, zip(*rows))) if len(rows) > 0 else {}
+
+        # Each distinct value in a column is only converted once.
+        columns = []
+        for column in self.columns:
+            cells = values.get(column.name, (column.default,) * len(rows))
+            try:
+                converted = dict((cell, column.convert(cell))
+                                 for cell in set(cells))
+                columns.append([converted[cell] for cell in cells])
+            except ValueError:
+                columns.append(self.convert_cells(column, cells, filename,
+                                                  lines, errors))
+        names = set(column.name for column in self.columns)
+        for name in header:
+            if name not in names:
+                columns.append(list(map(text, values.get(name, ()))))
+        if len(errors) > 0:
+            raise DataError(errors)
+        return self.header(header), list(zip(*columns))
+
+    def convert_cells(self, column, cells, filename, lines, errors):
+        """ Convert a column cell by cell, noting each bad value. """
+        converted = []
+        for line, cell in zip(lines, cells):
+            try:
+                converted.append(column.convert(cell))
+            except ValueError:
+                converted.append(None)
+                errors.append("%s:%s: column '%s' should be %s, not '%s'" % (
+                    filename, line, column.name,
+                    DESCRIPTIONS.get(column.convert, "valid"), cell.strip()))
+        return converted
+
+    def format(self, header, row):
+        """ Turn a converted row back into text. """
+        converters = dict((column.name, column) for column in self.columns)
+        return tuple(converters[name].format(value) if name in converters
+                     else value for name, value in zip(header, row))
@@ -0,0 +1,144 @@
+"""
+A full text search index over the squads in the army lists.
+
+Squad names, the names of the models, weapons and wargear in each squad, and
+the names and descriptions of the squads' abilities are split into terms.
+Each term has a posting for every squad it appears in, giving the page and
+anchor of the squad. The index is written as one JSON file per initial letter
+of the terms, so that a browser only has to fetch the shard for the word that
+is being searched for.
+"""
+
+import collections
+import json
+import os
+import re
+
+from cogitator.cache import SignatureCache
+from cogitator.database import UnknownRecordError
+from cogitator.staging import write_file_atomically
+from cogitator.writers.squad import squad_anchor
+
+# What counts as a word.
+TERM_PATTERN = re.compile("[a-z0-9]+")
+
+
+def terms(text):
+    """ Split some text into search terms. """
+    return TERM_PATTERN.findall(text.lower())
+
+
+def shard_name(term):
+    """ Get the name of the shard holding a term. """
+    return term[0]
+
+
+def squad_text(database, squad):
+    """ Get the pieces of text describing a squad, to be indexed. """
+    text = [squad["Name"]]
+    text += list(squad["Items"].keys())
+    for ability in database.list_squad_abilities(squad):
+        text.append(ability)
+        try:
+            text.append(database.lookup_ability(ability).description)
+        except UnknownRecordError:
+            pass
+    return text
+
+
+def index_army(database, army, href):
+    """
+    Index the squads of an army.
+    :param database: Database for the army's game.
+    :param army: The army.
+    :param href: Link to the page with the army's squads on, relative to the
+                 docs directory.
+    :return: Map of term to list of postings, each of which is a list of
+             the squad's link and a label.
+    """
+    postings = collections.defaultdict(list)
+    for detachment_index, detachment in enumerate(army["Detachments"]):
+        for squad_index, squad in enumerate(detachment["Units"]):
+            posting = ["%s#%s" % (href, squad_anchor(detachment_index,
+                                                     squad_index)),
+                       "%s: %s" % (army["Name"], squad["Name"])]
+            for term in set(term for text in squad_text(database, squad)
+                            for term in terms(text)):
+                postings[term].append(posting)
+    return postings
+
+
+class SearchIndex(object):
+    """
+    The search index for all the armies. Each army's postings are saved
+    between runs and only recomputed when the army or its data has changed,
+    and only the shards whose contents change are rewritten.
+    """
+
+    def __init__(self, filename):
+        self.cache = SignatureCache(filename)
+        self.basenames = []
+        self.num_indexed = 0
+
+    def add_army(self, database, army, href):
+        """
+        Add an army to the index, re-indexing it if necessary.
+        :return: (signature, postings) for the army.
+        """
+        signature = "%s:%s:%s" % (army["Hash"], database.fingerprint, href)
+        postings = self.cache.get(army["Basename"], signature)
+        if postings is None:
+            postings = index_army(database, army, href)
+            self.num_indexed += 1
+        self.add_postings(army["Basename"], signature, postings)
+        return signature, postings
+
+    def add_postings(self, basename, signature, postings):
+        """ Add an army which has already been indexed, e.g. by a shard. """
+        if self.cache.get(basename, signature) is None:
+            self.cache.put(basename, signature, postings)
+        self.basenames.append(basename)
+
+    def shards(self):
+        """ Merge the postings of the armies into shards. """
+        shards = collections.defaultdict(dict)
+        for basename in sorted(self.basenames):
+            for term, postings in self.cache.get(basename).items():
+                shards[shard_name(term)].setdefault(term, []).extend(postings)
+        return shards
+
+    def save(self, prune=True):
+        """
+        Save the postings for next time.
+        :param prune: Whether to forget armies which were not added.
+        """
+        if prune:
+            self.cache.prune(self.basenames)
+        self.cache.save()
+
+    def write(self, dirname):
+        """
+        Write out the shards of the index, and save the postings for next time.
+        :param dirname: Directory to write the shards to.
+        :return: Number of shards which changed.
+        """
+        self.save()
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        shards = self.shards()
+        num_written = 0
+        for name, shard in shards.items():
+            filename = os.path.join(dirname, name + ".json")
+            text = json.dumps(shard, sort_keys=True, separators=(",", ":"))
+            if os.path.exists(filename):
+                with open(filename, "r") as f:
+                    if f.read() == text:
+                        continue
+            write_file_atomically(filename, text)
+            num_written += 1
+        for filename in os.listdir(dirname):
+            name, extension = os.path.splitext(filename)
+            if extension == ".json" and name not in shards:
+                os.remove(os.path.join(dirname, filename))
+                num_written += 1
+        return num_written
@@ -0,0 +1,145 @@
+"""
+Split a build across machines.
+
+Each list belongs to one of N shards, chosen by a hash of its basename so
+that the split is the same on every machine and does not depend on the order
+the lists are found in. A shard build writes the pages of its lists, and a
+manifest holding what the index needs from each of them: its summary and its
+search postings. Merging the manifests of all N shards then gives the same
+index, summaries and search shards as building everything in one go.
+"""
+
+import hashlib
+import json
+import os
+
+from cogitator.staging import write_file_atomically
+
+# Changed whenever the format of the manifests does.
+MANIFEST_VERSION = 3
+
+# The name of the manifest in a shard's output directory.
+MANIFEST_FILENAME = "manifest.json"
+
+
+class ShardError(ValueError):
+    """ A problem with a shard specification or a set of manifests. """
+    pass
+
+
+def parse_shard(text):
+    """
+    Parse a shard specification.
+    :param text: e.g. '2/4', for the second of four shards.
+    :return: (index, count), where index counts from 1.
+    :raises ShardError: If it is not a valid specification.
+    """
+    try:
+        index, count = [int(x) for x in text.split("/")]
+    except ValueError:
+        raise ShardError("Expected a shard such as '1/4', not '%s'." % text)
+    if count < 1 or not 1 <= index <= count:
+        raise ShardError("There is no shard %s of %s." % (index, count))
+    return index, count
+
+
+def shard_of(basename, count):
+    """
+    Get the shard a list belongs to.
+    :param basename: The list's basename.
+    :param count: The number of shards.
+    :return: The shard's index, counting from 1.
+    """
+    digest = hashlib.sha1(basename.encode("utf-8")).hexdigest()
+    return int(digest, 16) % count + 1
+
+
+def shard_dirname(index, count):
+    """ Get the default name of a shard's output directory. """
+    return "%s-of-%s" % (index, count)
+
+
+def write_manifest(dirname, index, count, fingerprints, entries,
+                   library=False, lazy=False):
+    """
+    Write a shard's manifest.
+    :param dirname: The shard's output directory.
+    :param index: The shard's index.
+    :param count: The number of shards.
+    :param fingerprints: Map of game to fingerprint of the data it was built
+                         from.
+    :param entries: List of maps, one per army, each with the army's
+                    'Basename', 'Summary', search 'Postings' and their
+                    'Signature'.
+    :param library: Whether the pages link to the datasheet library.
+    :param lazy: Whether the full pages load their cards and appendices
+                 lazily.
+    """
+    write_file_atomically(os.path.join(dirname, MANIFEST_FILENAME), json.dumps({
+        "Version": MANIFEST_VERSION,
+        "Shard": index,
+        "Count": count,
+        "Fingerprints": fingerprints,
+        "Library": library,
+        "Lazy": lazy,
+        "Armies": entries
+    }, indent=1, sort_keys=True))
+
+
+def read_manifest(dirname):
+    """ Read the manifest of a shard's output directory. """
+    filename = os.path.join(dirname, MANIFEST_FILENAME)
+    if not os.path.exists(filename):
+        raise ShardError("%s: no manifest, has the shard been built?" %
+                         dirname)
+    with open(filename, "r") as f:
+        try:
+            manifest = json.load(f)
+        except ValueError:
+            raise ShardError("%s: corrupt manifest." % filename)
+    if manifest.get("Version") != MANIFEST_VERSION:
+        raise ShardError("%s: built by a different version, rebuild it." %
+                         filename)
+    return manifest
+
+
+def merge_manifests(manifests):
+    """
+    Combine the manifests of every shard of a build.
+    :param manifests: List of manifests.
+    :return: The entries for all the armies, sorted by basename.
+    :raises ShardError: If shards are missing or repeated, or were built from
+                        different data or with different options.
+    """
+    if len(manifests) == 0:
+        raise ShardError("No shards to merge.")
+    count = manifests[0]["Count"]
+    shards = sorted(manifest["Shard"] for manifest in manifests)
+    if any(manifest["Count"] != count for manifest in manifests) or \
+            shards != list(range(1, count + 1)):
+        raise ShardError("Expected shards 1 to %s of %s once each, got %s." % (
+            count, count, ", ".join("%s/%s" % (m["Shard"], m["Count"])
+                                    for m in manifests)))
+
+    if any(manifest["Library"] != manifests[0]["Library"]
+           for manifest in manifests):
+        raise ShardError("Some shards were built with --library and some "
+                         "without.")
+    if any(manifest["Lazy"] != manifests[0]["Lazy"]
+           for manifest in manifests):
+        raise ShardError("Some shards were built with --lazy and some "
+                         "without.")
+
+    fingerprints = {}
+    entries = {}
+    for manifest in manifests:
+        for game, fingerprint in manifest["Fingerprints"].items():
+            if fingerprints.setdefault(game, fingerprint) != fingerprint:
+                raise ShardError("The shards were built from different %s "
+                                 "data." % game)
+        for entry in manifest["Armies"]:
+            if entry["Basename"] in entries:
+                raise ShardError("'%s' is in more than one shard." %
+                                 entry["Basename"])
+            entries[entry["Basename"]] = entry
+    return [entries[basename] for basename in sorted(entries)]
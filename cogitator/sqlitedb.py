@@ -0,0 +1,242 @@
+"""
+A database backend which keeps its tables in a sqlite file.
+
+The .csv tables for a game are imported into a file named after the hash of
+their contents the first time they are needed, so a reload imports the new
+data into a new file while databases loaded before it carry on reading the
+old one. Records are then read a group of rows
+at a time (see Record.group_key) as they are looked up, so a process which
+only touches a handful of items never has to load the whole catalogue.
+"""
+
+import glob
+import os
+import sqlite3
+import threading
+
+from cogitator.cache import LRUCache
+from cogitator.database import Database, Weapon, Wargear, Model, Formation, \
+    Ability, Psyker, Demeanour, Quirk, Background, Options, TABLES, \
+    MODEL_ITEM, WEAPON_ITEM, WARGEAR_ITEM, UnknownRecordError, \
+    game_dirname, parse_group, read_layered_rows, source_signature
+
+# Columns which get an index if a table has them.
+INDEXED_COLUMNS = ("Name", "Cost", "M", "WS", "BS", "S", "T", "W", "A", "Ld",
+                   "Sv", "Range", "Type", "AP", "D")
+
+# Marks a lookup which has been cached as having no result.
+MISSING = object()
+
+
+def quote(name):
+    """ Quote a column or table name. """
+    return '"%s"' % name.replace('"', '""')
+
+
+def import_tables(data_dirs, filename):
+    """
+    Import the .csv tables of a dataset into a sqlite file, unless the file is
+    already up to date.
+    :param data_dirs: Data directories, base layer first.
+    :param filename: The sqlite file.
+    """
+    signature = source_signature(data_dirs)
+    connection = sqlite3.connect(filename)
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta "
+                "(key TEXT PRIMARY KEY, value TEXT)")
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = 'signature'").fetchone()
+            if row is not None and row[0] == signature:
+                return
+            for create_record in TABLES:
+                import_table(connection, data_dirs, create_record())
+            connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('signature', ?)",
+                (signature,))
+    finally:
+        connection.close()
+
+
+def import_table(connection, data_dirs, prototype):
+    """ (Re)create a table and fill it with the rows of a dataset. """
+    table = prototype.table_name()
+    groups = read_layered_rows(data_dirs, prototype)
+
+    # Layers may not agree on the columns; take them all, and at least those
+    # of the schema, for a table with no rows.
+    columns = [column.name for column in prototype.schema.columns]
+    for header, rows in groups.values():
+        for column in header:
+            if column not in columns:
+                columns.append(column)
+
+    # Values are stored as text, and converted again when they are read.
+    definitions = ["seq INTEGER PRIMARY KEY", "group_key TEXT"]
+    for column in columns:
+        definitions.append("%s TEXT" % quote(column))
+    connection.execute("DROP TABLE IF EXISTS %s" % quote(table))
+    connection.execute("CREATE TABLE %s (%s)" % (quote(table),
+                                                 ", ".join(definitions)))
+
+    insert = "INSERT INTO %s (group_key, %s) VALUES (?, %s)" % (
+        quote(table), ", ".join(quote(column) for column in columns),
+        ", ".join("?" * len(columns)))
+    for key, (header, rows) in groups.items():
+        for values in rows:
+            row = dict(zip(header, prototype.schema.format(header, values)))
+            connection.execute(insert, [key] + [row.get(column) for column
+                                                in columns])
+
+    # Costs are indexed numerically so that they can be compared.
+    for column in ("group_key",) + INDEXED_COLUMNS:
+        if column == "group_key" or column in columns:
+            expression = quote(column)
+            if column == "Cost":
+                expression = "CAST(%s AS INTEGER)" % expression
+            connection.execute("CREATE INDEX %s ON %s (%s)" % (
+                quote("%s_%s" % (table, column)), quote(table), expression))
+
+
+class SQLiteDatabase(Database):
+    """
+    A Database whose tables are stored in sqlite rather than held in memory.
+    Looked up records are kept in a small cache.
+    """
+
+    def __init__(self, game, data_dir, cache_dir, cache_size=256,
+                 generation=0):
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        Database.__init__(self, game, data_dir, generation=generation)
+
+    def load(self, data_dir, record_cache):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        name = game_dirname(self.game)
+        filename = os.path.join(self.cache_dir, "%s.%s.sqlite" % (
+            name, self.fingerprint[:16]))
+        import_tables(self.dataset_dirs(data_dir), filename)
+
+        # Remove imports of older versions of the data. Any still in use stay
+        # readable until they are closed, except on Windows, where they are
+        # left for next time.
+        for old in glob.glob(os.path.join(self.cache_dir, name + ".*.sqlite")):
+            if old != filename:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+        self.__connection = sqlite3.connect(filename, check_same_thread=False)
+        self.__lock = threading.Lock()
+        self.__records = LRUCache(self.cache_size)
+        self.__queries = {}
+        for create_record in TABLES:
+            table = create_record().table_name()
+            columns = [row[1] for row in self.__connection.execute(
+                "PRAGMA table_info(%s)" % quote(table))][2:]
+            query = "SELECT %s FROM %s WHERE group_key = ? ORDER BY seq" % (
+                ", ".join(quote(column) for column in columns), quote(table))
+            self.__queries[create_record] = (tuple(columns), query)
+
+    def close(self):
+        """ Close the connection to the sqlite file. """
+        self.__connection.close()
+
+    def lookup_record(self, create_record, name):
+        """
+        Look up a record by name.
+        :param create_record: Type of record, which determines the table.
+        :param name: Name of the record.
+        :return: The record, or None if there is no such record.
+        """
+        key = (create_record, name)
+        record = self.__records.get(key, MISSING)
+        if record is MISSING:
+            columns, query = self.__queries[create_record]
+            with self.__lock:
+                rows = self.__connection.execute(query, (name,)).fetchall()
+            header, rows = create_record.schema.convert(
+                columns, [tuple(value or "" for value in row) for row in rows])
+            record = None
+            for entry_name, entry in parse_group(header, rows, create_record):
+                if entry_name == name:
+                    record = entry
+            self.__records.put(key, record)
+        return record
+
+    def list_names(self, create_record):
+        """ List the names of the entries in a table. """
+        query = "SELECT DISTINCT group_key FROM %s" % quote(
+            create_record().table_name())
+        with self.__lock:
+            return [row[0] for row in self.__connection.execute(query)]
+
+    def list_weapons(self):
+        return self.list_names(Weapon)
+
+    def list_wargear(self):
+        return self.list_names(Wargear)
+
+    def list_models(self):
+        return self.list_names(Model)
+
+    def list_abilities(self):
+        return self.list_names(Ability)
+
+    def list_formations(self):
+        return self.list_names(Formation)
+
+    def classify_item(self, item):
+        # Where names clash, wargear takes precedence over models, and models
+        # over weapons, as in the in-memory cost table.
+        kind = 0
+        record = None
+        for create_record, flag in ((Weapon, WEAPON_ITEM), (Model, MODEL_ITEM),
+                                    (Wargear, WARGEAR_ITEM)):
+            found = self.lookup_record(create_record, item)
+            if found is not None:
+                kind |= flag
+                record = found
+        return kind, record
+
+    def lookup(self, create_record, name, message, kind=None):
+        """
+        Look up a record, raising UnknownRecordError if it is missing.
+        :param kind: Kind of record to suggest the nearest names of, if any.
+        """
+        record = self.lookup_record(create_record, name)
+        if record is None:
+            if kind is not None:
+                raise self.unknown_record(kind, name, message % name)
+            raise UnknownRecordError(message % name)
+        return record
+
+    def lookup_formation(self, formation):
+        return self.lookup(Formation, formation,
+                           "No formation '%s' in formations table.",
+                           "formation")
+
+    def lookup_ability(self, ability):
+        return self.lookup(Ability, ability,
+                           "No ability '%s' in abilities table.", "ability")
+
+    def lookup_psyker(self, model_name, **kwargs):
+        if kwargs.get("quiet", False):
+            return self.lookup_record(Psyker, model_name)
+        return self.lookup(Psyker, model_name, "Model '%s' is not a psyker.")
+
+    def lookup_options(self, model_name):
+        return self.lookup_record(Options, model_name)
+
+    def lookup_quirk(self, name):
+        return self.lookup(Quirk, name, "Unknown quirk '%s'")
+
+    def lookup_background(self, name):
+        return self.lookup(Background, name, "Unknown background '%s'")
+
+    def lookup_demeanour(self, name):
+        return self.lookup(Demeanour, name, "Unknown demeanour '%s'")
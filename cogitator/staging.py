@@ -0,0 +1,153 @@
+"""
+Build a generation of output files off to the side and swap it into place.
+
+Pages are written into a staging directory next to the live one. Files whose
+content has not changed since the previous generation are hard linked from the
+live directory rather than rewritten. Once everything has been written the
+live directory is renamed out of the way and the staging directory renamed
+into place, so anything serving the live directory sees either the old
+generation or the new one, never a partially written one.
+
+The swap is two renames, not one: between them there is a moment with no live
+directory at all, and a request then gets a 404. A crash before the swap
+leaves the old generation untouched, and a crash between the renames is
+recovered by the next build's begin(). A symlink flipped in one rename would
+close the gap, but the docs are checked in and served from git, which would
+record the link rather than the pages, and windows has no symlinks.
+"""
+
+import filecmp
+import os
+import shutil
+
+
+def replace_file(src, dst):
+    """
+    Atomically replace dst with src.
+    :param src: File to move into place.
+    :param dst: File to replace.
+    """
+    if hasattr(os, "replace"):
+        os.replace(src, dst)
+    else:
+        # Python 2: rename() replaces atomically on posix but refuses to
+        # overwrite on windows.
+        if os.name == "nt" and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def write_file_atomically(filename, text):
+    """
+    Write a file by writing a temporary file and moving it into place.
+    :param filename: File to write.
+    :param text: Content of the file.
+    """
+    temp = filename + ".tmp"
+    with open(temp, "w") as f:
+        f.write(text)
+    replace_file(temp, filename)
+
+
+class StagingDirectory(object):
+    """
+    A staging area for the next generation of a live output directory.
+    """
+
+    def __init__(self, live_dir):
+        self.live_dir = live_dir
+        self.staging_dir = live_dir + ".staging"
+        self.old_dir = live_dir + ".old"
+        self.num_written = 0
+        self.num_linked = 0
+
+    def begin(self):
+        """ Recover from any interrupted build and create the staging area. """
+        if os.path.exists(self.old_dir):
+            if not os.path.exists(self.live_dir):
+                # We died mid-swap; the old generation is the live one.
+                os.rename(self.old_dir, self.live_dir)
+            else:
+                shutil.rmtree(self.old_dir)
+        if os.path.exists(self.staging_dir):
+            shutil.rmtree(self.staging_dir)
+        os.makedirs(self.staging_dir)
+
+    def path(self, relpath):
+        """ Get the staging path of a file, creating its directory. """
+        filename = os.path.join(self.staging_dir, relpath)
+        directory = os.path.dirname(filename)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        return filename
+
+    def live_path(self, relpath):
+        """ Get the path of a file in the live generation. """
+        return os.path.join(self.live_dir, relpath)
+
+    def write_file(self, relpath, text):
+        """
+        Write a file into the staging area, reusing the live copy if it has
+        the same content.
+        :param relpath: Path relative to the output directory.
+        :param text: Content of the file.
+        """
+        filename = self.path(relpath)
+        live = self.live_path(relpath)
+        if os.path.isfile(live):
+            with open(live, "r") as f:
+                unchanged = f.read() == text
+            if unchanged and self.__link(live, filename):
+                return
+        with open(filename, "w") as f:
+            f.write(text)
+        self.num_written += 1
+
+    def copy_file(self, src, relpath):
+        """
+        Copy a file into the staging area, reusing the live copy if it is the
+        same.
+        :param src: File to copy.
+        :param relpath: Path relative to the output directory.
+        """
+        filename = self.path(relpath)
+        live = self.live_path(relpath)
+        if os.path.isfile(live) and filecmp.cmp(src, live, shallow=False):
+            if self.__link(live, filename):
+                return
+        shutil.copy2(src, filename)
+        self.num_written += 1
+
+    def copy_tree(self, src, relpath):
+        """ Copy a directory tree into the staging area. """
+        for dirpath, dirnames, filenames in os.walk(src):
+            reldir = os.path.relpath(dirpath, src)
+            for name in filenames:
+                self.copy_file(os.path.join(dirpath, name),
+                               os.path.normpath(
+                                   os.path.join(relpath, reldir, name)))
+
+    def commit(self):
+        """
+        Swap the staging area into place as the live directory. There is no
+        live directory between the two renames.
+        """
+        if os.path.exists(self.live_dir):
+            os.rename(self.live_dir, self.old_dir)
+        os.rename(self.staging_dir, self.live_dir)
+        if os.path.exists(self.old_dir):
+            shutil.rmtree(self.old_dir)
+
+    def abort(self):
+        """ Throw away the staging area, leaving the live directory alone. """
+        if os.path.exists(self.staging_dir):
+            shutil.rmtree(self.staging_dir)
+
+    def __link(self, src, dst):
+        """ Hard link a file from the live generation, if we can. """
+        try:
+            os.link(src, dst)
+        except (OSError, AttributeError):
+            return False
+        self.num_linked += 1
+        return True
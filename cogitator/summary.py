@@ -0,0 +1,76 @@
+"""
+Compact summaries of armies, for the index page.
+"""
+
+from cogitator.cache import SignatureCache
+from cogitator.lockfile import army_totals
+
+# Changed whenever what goes into a summary does, so that old ones are redone.
+SUMMARY_VERSION = 2
+
+
+def army_summary(database, army, variants):
+    """
+    Summarise an army.
+    :param database: Database for the army's game.
+    :param army: The army.
+    :param variants: The army's pages, as returned by get_variants().
+    :return: The summary.
+    """
+    return totals_summary(army, variants, army_totals(database, army))
+
+
+def totals_summary(army, variants, totals):
+    """
+    Summarise an army whose totals are already known, e.g. from its lockfile.
+    :param army: The army.
+    :param variants: The army's pages, as returned by get_variants().
+    :param totals: The army's totals, as returned by army_totals().
+    :return: The summary.
+    """
+    limit = army["Points"]
+    return {
+        "Basename": army["Basename"],
+        "Name": army["Name"],
+        "Game": army["Game"],
+        "Points": limit,
+        "Total": totals["Total"],
+        "Spare": limit - totals["Total"],
+        "CP": totals["CP"],
+        "Warlord": army["Warlord"],
+        "Violations": list(totals["Violations"]),
+        "Variants": [{"name": variant["name"],
+                      "href": variant["filename"].replace("\\", "/")}
+                     for variant in variants]
+    }
+
+
+class SummaryIndex(object):
+    """
+    Summaries of all the armies. These are saved between runs, and an army is
+    only re-summarised when it or the data for its game has changed.
+    """
+
+    def __init__(self, filename):
+        self.cache = SignatureCache(filename)
+        self.num_summarised = 0
+
+    def summarise(self, database, army, variants):
+        """ Get the summary of an army, recomputing it if necessary. """
+        signature = "%s:%s:%s" % (SUMMARY_VERSION, army["Hash"],
+                                  database.fingerprint)
+        summary = self.cache.get(army["Basename"], signature)
+        if summary is None:
+            summary = army_summary(database, army, variants)
+            self.cache.put(army["Basename"], signature, summary)
+            self.num_summarised += 1
+        return summary
+
+    def save(self, basenames=None):
+        """
+        Save the summaries, forgetting any armies not in basenames. If it is
+        None, e.g. when building a shard, nothing is forgotten.
+        """
+        if basenames is not None:
+            self.cache.prune(basenames)
+        self.cache.save()
@@ -0,0 +1,77 @@
+"""
+Precompiled html fragments.
+
+A Template is described by a function which writes the fragment to an
+Outfile, taking the names of its slots as arguments. The first time the
+template is rendered at a given depth of tag nesting, the function is run once
+with markers in place of the slot values and the output is turned into a
+format string, so that rendering it from then on is a single string
+formatting operation and a single write, with exactly the same output as
+calling the function directly.
+"""
+
+from cogitator.output import ChunkBuffer, Outfile
+
+
+# Stands in for the tags enclosing a template while it is compiled.
+OUTER = object()
+
+
+class Template(object):
+
+    def __init__(self, build, *slots):
+        """
+        :param build: Function taking an Outfile and a keyword argument per
+                      slot which writes the fragment. It may leave tags open,
+                      but must not close tags that it did not open.
+        :param slots: Names of the slots.
+        """
+        self.build = build
+        self.slots = slots
+        self.__compiled = {}
+
+    def render(self, outfile, **values):
+        """
+        Write the fragment.
+        :param outfile: Outfile to write to.
+        :param values: Value for each slot.
+        """
+        depth = len(outfile.stack)
+        compiled = self.__compiled.get(depth)
+        if compiled is None:
+            compiled = self.__compile(depth, outfile.tabsize)
+            self.__compiled[depth] = compiled
+        fmt, pads, pushed = compiled
+
+        # Outfile.content() indents every line of the content it writes, so
+        # values spanning several lines need indenting to match.
+        for slot, pad in pads:
+            value = values[slot]
+            if isinstance(value, str) and "\n" in value:
+                values[slot] = value.replace("\n", "\n" + pad)
+
+        outfile.write(fmt % values)
+        outfile.stack.extend(pushed)
+
+    def __compile(self, depth, tabsize):
+        """ Compile the template for use at a particular depth. """
+        markers = dict((slot, "\0%s\0" % slot) for slot in self.slots)
+        buf = ChunkBuffer()
+        outfile = Outfile(buf)
+        outfile.tabsize = tabsize
+        outfile.stack = [OUTER] * depth
+        self.build(outfile, **markers)
+        assert outfile.stack[:depth] == [OUTER] * depth, \
+            "Templates must not close tags they did not open."
+        text = buf.drain()
+        fmt = text.replace("%", "%%")
+        pads = []
+        for slot, marker in markers.items():
+            start = text.find(marker)
+            if start < 0:
+                continue
+            line_start = text.rfind("\n", 0, start) + 1
+            line = text[line_start:start]
+            pads.append((slot, line[:len(line) - len(line.lstrip(" "))]))
+            fmt = fmt.replace(marker, "%%(%s)s" % slot)
+        return fmt, pads, outfile.stack[depth:]
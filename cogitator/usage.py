@@ -0,0 +1,243 @@
+"""
+Track which lists use which items, and work out what a change to the data
+tables does to them.
+"""
+
+import collections
+import os
+import shutil
+import tempfile
+
+from cogitator.cache import SignatureCache, file_hash
+from cogitator.database import Database, TABLES, UNITS_DIRNAME, \
+    UnitLibrary, dataset_dirs, game_dirname, read_army, read_rows, table_dirs
+
+
+def index_army(army):
+    """
+    List everything an army uses.
+    :param army: The army.
+    :return: Index entry for the army.
+    """
+    uses = []
+    for detachment_index, detachment in enumerate(army["Detachments"]):
+        for squad_index, squad in enumerate(detachment["Units"]):
+            for item, quantity in squad["Items"].items():
+                uses.append([item, detachment_index, detachment["Name"],
+                             squad_index, squad["Name"], quantity])
+    return {
+        "Name": army["Name"],
+        "Game": army["Game"],
+        "Points": army["Points"],
+        "Uses": uses
+    }
+
+
+class UsageIndex(object):
+    """
+    A reverse index from each item to the armies, detachments and squads that
+    use it. The index is saved between runs and only lists which have changed
+    are re-indexed.
+    """
+
+    def __init__(self, filename):
+        self.cache = SignatureCache(filename)
+        self.__postings = None
+
+    def update(self, dirname):
+        """
+        Bring the index up to date with the lists in a directory.
+        :param dirname: Directory of YAML lists.
+        :return: Number of lists that had to be re-indexed.
+        """
+        basenames = []
+        num_indexed = 0
+        library = UnitLibrary(os.path.join(dirname, UNITS_DIRNAME))
+        for filename in sorted(os.listdir(dirname)):
+            if not filename.lower().endswith(".yaml"): continue
+            path = os.path.join(dirname, filename)
+            basename = os.path.splitext(filename)[0]
+            signature = "%s:%s" % (file_hash(path), library.fingerprint)
+            if self.cache.get(basename, signature) is None:
+                entry = index_army(read_army(path, library))
+                entry["Filename"] = filename
+                self.cache.put(basename, signature, entry)
+                num_indexed += 1
+            basenames.append(basename)
+        self.cache.prune(basenames)
+        self.cache.save()
+        if num_indexed > 0 or len(basenames) != len(self.cache):
+            self.__postings = None
+        return num_indexed
+
+    def entry(self, basename):
+        """ Get the index entry for an army. """
+        return self.cache.get(basename)
+
+    def games(self):
+        """ List the games of the indexed lists. """
+        return sorted(set(self.cache.get(basename)["Game"]
+                          for basename in self.cache.keys()))
+
+    def uses(self, game, item):
+        """
+        List the uses of an item.
+        :param game: The game the item belongs to.
+        :param item: Name of the item.
+        :return: List of (basename, detachment index, detachment name,
+                 squad index, squad name, quantity).
+        """
+        if self.__postings is None:
+            postings = collections.defaultdict(list)
+            for basename in sorted(self.cache.keys()):
+                entry = self.cache.get(basename)
+                for use in entry["Uses"]:
+                    postings[(entry["Game"], use[0])].append(
+                        tuple([basename] + use[1:]))
+            self.__postings = postings
+        return self.__postings.get((game, item), [])
+
+
+def changed_groups(old_groups, new_groups):
+    """ List the keys of the groups of rows that differ between two tables. """
+    changed = []
+    for key in new_groups:
+        if old_groups.get(key) != new_groups[key]:
+            changed.append(key)
+    for key in old_groups:
+        if key not in new_groups:
+            changed.append(key)
+    return changed
+
+
+def table_type(table_name):
+    """ Get the record type stored in a table, by its name e.g. 'weapons'. """
+    for create_record in TABLES:
+        if create_record().table_name() == table_name:
+            return create_record
+    raise ValueError("No table '%s'." % table_name)
+
+
+class ImpactAnalysis(object):
+    """
+    Works out which lists are affected by a change to a data table, and what
+    their new totals are. Only the affected lists are re-costed. When the
+    current data is the baseline, the old totals are taken from the lists'
+    lockfiles where they are up to date.
+
+    The lists affected are those of the game whose data changed, and of any
+    game layered on top of it which inherits the table (see table_dirs()),
+    e.g. kill team lists for a change to the 40k weapons.
+    """
+
+    def __init__(self, index, game, data_dir, lists_dir, locks=None):
+        """
+        :param index: UsageIndex of the lists.
+        :param game: The game whose data changed.
+        :param data_dir: Path to data directory.
+        :param lists_dir: Directory of YAML lists.
+        :param locks: Optional LockFiles of the lists.
+        """
+        self.index = index
+        self.game = game
+        self.data_dir = data_dir
+        self.lists_dir = lists_dir
+        self.locks = locks
+
+    def layered_games(self, table_name):
+        """
+        List the games of the lists whose data includes a game's table.
+        :param table_name: The table, e.g. 'weapons'.
+        :return: Dict of each game to the dataset layers stacked on top of
+                 the table, which override its rows.
+        :raises UnknownRecordError: If there is no dataset for a game.
+        """
+        changed_dir = dataset_dirs(self.data_dir,
+                                   game_dirname(self.game))[-1]
+        games = {}
+        for game in self.index.games():
+            data_dirs = dataset_dirs(self.data_dir, game_dirname(game))
+            layers = table_dirs(data_dirs, table_name)
+            if changed_dir in layers:
+                games[game] = layers[layers.index(changed_dir) + 1:]
+        return games
+
+    def analyse(self, table_name, new_filename, old_filename=None):
+        """
+        Assess a change to a table.
+        :param table_name: The table that changed, e.g. 'weapons'.
+        :param new_filename: A .csv file with the new rows. This can be the
+                             whole table or just the rows that changed.
+        :param old_filename: Optionally, the table before the change.
+                             Otherwise the current data is the baseline.
+        :return: List of (basename, army name, old total, new total, limit,
+                 changed items) for each affected list.
+        """
+        create_record = table_type(table_name)
+        prototype = create_record()
+        new_groups = read_rows(new_filename, prototype)
+        if old_filename is None:
+            changed = list(new_groups.keys())
+        else:
+            changed = changed_groups(read_rows(old_filename, prototype),
+                                     new_groups)
+
+        # Find the lists that use the changed items.
+        games = self.layered_games(table_name)
+        affected = collections.OrderedDict()
+        for item in changed:
+            for game in sorted(games):
+                for use in self.index.uses(game, item):
+                    items = affected.setdefault(use[0], [])
+                    if item not in items:
+                        items.append(item)
+        if len(affected) == 0:
+            return []
+
+        armies = collections.OrderedDict()
+        old_totals = {}
+        library = UnitLibrary(os.path.join(self.lists_dir, UNITS_DIRNAME))
+        for basename in affected:
+            filename = self.index.entry(basename)["Filename"]
+            army = read_army(os.path.join(self.lists_dir, filename), library)
+            armies[basename] = army
+            if old_filename is None and self.locks is not None:
+                lock = self.locks.read(army)
+                if lock is not None:
+                    old_totals[basename] = lock["Total"]
+
+        # Cost them before and after, each with the data of its own game. The
+        # layers above the changed table are applied again on top of the
+        # change, so that the rows they override stay overridden.
+        record_cache = {}
+        temp_dirs = []
+        old_databases = {}
+        new_databases = {}
+        try:
+            def database(game, filename):
+                if filename is None:
+                    return Database(game, self.data_dir, record_cache)
+                temp_dir = tempfile.mkdtemp()
+                temp_dirs.append(temp_dir)
+                shutil.copy(filename, os.path.join(temp_dir, table_name+".csv"))
+                return Database(game, self.data_dir, record_cache,
+                                [temp_dir] + games[game])
+            for basename, army in armies.items():
+                game = army["Game"]
+                if basename not in old_totals and game not in old_databases:
+                    old_databases[game] = database(game, old_filename)
+                if game not in new_databases:
+                    new_databases[game] = database(game, new_filename)
+        finally:
+            for temp_dir in temp_dirs:
+                shutil.rmtree(temp_dir)
+        results = []
+        for basename, items in affected.items():
+            army = armies[basename]
+            old_total = old_totals.get(basename)
+            if old_total is None:
+                old_total = old_databases[army["Game"]].army_points_cost(army)
+            new_total = new_databases[army["Game"]].army_points_cost(army)
+            results.append((basename, army["Name"], old_total, new_total,
+                            army["Points"], items))
+        return results
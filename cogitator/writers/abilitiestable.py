@@ -2,21 +2,59 @@
 Table of abilities.
 """
 
+from cogitator.output import anchor_id
+from cogitator.templates import Template
+
+
+def write_abilities_start(outfile):
+    """ Start the table. Leaves it open. """
+    outfile.comment("Abilities")
+    outfile.start_tag("table")
+    outfile.content("<tr><th class='title' colspan='2'>Abilities</th></tr>")
+
+
+def write_ability(outfile, ability, description):
+    """ Write a row of the table. """
+    outfile.content(
+        "<tr><td class='stat-left'><span class='ability_tag'>%s: </span> %s</td></tr>" % (
+        ability, description))
+
+
+def write_anchored_ability(outfile, anchor, ability, description):
+    """ Write a row of the table which can be linked to. """
+    outfile.content(
+        "<tr id='%s'><td class='stat-left'><span class='ability_tag'>%s: </span> %s</td></tr>" % (
+        anchor, ability, description))
+
+
+ABILITIES_START = Template(write_abilities_start)
+ABILITY = Template(write_ability, "ability", "description")
+ANCHORED_ABILITY = Template(write_anchored_ability, "anchor", "ability",
+                            "description")
+
 
 class AbilitiesTableWriter(object):
 
     def __init__(self, database):
         self.database = database
 
-    def write_abilities_table(self, outfile, abilities, squad=None):
-        # Write out the list of abilities.
+    def write_abilities_table(self, outfile, abilities, squad=None,
+                              anchored=False):
+        """
+        Write out the list of abilities.
+        :param anchored: Whether to give each ability's row an id to link to.
+        """
         if len(abilities) == 0:
             return
-        outfile.comment("Abilities")
-        outfile.start_tag("table")
-        outfile.content("<tr><th class='title' colspan='2'>Abilities</th></tr>")
+        ABILITIES_START.render(outfile)
         for ability in sorted(abilities):
-            outfile.content(
-                "<tr><td class='stat-left'><span class='ability_tag'>%s: </span> %s</td></tr>" % (
-                ability, self.database.lookup_ability(ability).description))
-        outfile.end_tag()  # table
\ No newline at end of file
+            description = self.database.lookup_ability(ability).description
+            if anchored:
+                ANCHORED_ABILITY.render(outfile,
+                                        anchor=anchor_id("ability", ability),
+                                        ability=ability,
+                                        description=description)
+            else:
+                ABILITY.render(outfile, ability=ability,
+                               description=description)
+        outfile.end_tag()  # table
@@ -0,0 +1,96 @@
+"""
+Write the analytics report.
+
+Each report is written in full to a .csv file, and as a table on a single
+page. The page only shows the most used items of each kind in each game; the
+rest are in items.csv.
+"""
+
+import csv
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from cogitator.output import Table
+from cogitator.templates import Template
+
+# How many of the most used items of each kind to show for each game.
+ITEMS_SHOWN = 20
+
+
+def write_analytics_start(outfile, num_armies):
+    """ Start the page. Leaves the body open. """
+    outfile.start_tag("html")
+    outfile.start_tag("head")
+    outfile.content("<meta charset='utf-8'/>")
+    outfile.content("<link rel='stylesheet' type='text/css' href='../style/style.css'/>")
+    outfile.end_tag()  # head
+    outfile.start_tag("body")
+    outfile.content("<h1> Army list statistics </h1>")
+    outfile.content("<p>Over %s lists.</p>" % num_armies)
+
+
+def write_report_heading(outfile, title, filename):
+    outfile.content("<h2>%s <a href='./%s'>(csv)</a></h2>" % (title,
+                                                             filename))
+
+
+ANALYTICS_START = Template(write_analytics_start, "num_armies")
+REPORT_HEADING = Template(write_report_heading, "title", "filename")
+
+
+def report_filename(report):
+    return report.name + ".csv"
+
+
+def report_csv(report):
+    """ Get the text of a report's .csv file. """
+    text = StringIO()
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerow(report.header)
+    for row in report.rows:
+        writer.writerow(row)
+    return text.getvalue()
+
+
+def shown_rows(report):
+    """ Get the rows of a report to show on the page. """
+    if report.name != "items":
+        return report.rows
+    shown = []
+    counts = {}
+    for row in report.rows:
+        key = (row[0], row[2])  # game, kind
+        counts[key] = counts.get(key, 0) + 1
+        if counts[key] <= ITEMS_SHOWN:
+            shown.append(row)
+    return shown
+
+
+class AnalyticsWriter(object):
+
+    def write_analytics(self, outfile, reports, num_armies):
+        """
+        Write the page of reports.
+        :param outfile: Outfile to write to.
+        :param reports: List of Reports.
+        :param num_armies: The number of armies they cover.
+        """
+        ANALYTICS_START.render(outfile, num_armies=num_armies)
+        for report in reports:
+            REPORT_HEADING.render(outfile, title=report.title,
+                                  filename=report_filename(report))
+            table = Table()
+            table.set_table_class("index_table")
+            table.set_default_column_class("stat-centre")
+            for column in report.header:
+                table.add_column(column)
+            for row in shown_rows(report):
+                table.add_row()
+                for column, value in zip(report.header, row):
+                    table.set_cell(column, value)
+            table.write(outfile)
+        outfile.end_tag()  # body
+        outfile.end_tag()  # html
@@ -1,61 +1,225 @@
 """
 Write an army.
+
+In lazy mode the full page of an army only holds its header, force
+organisation charts and a small placeholder for each squad card and section of
+the appendices. Those are written to fragment files of their own, which
+scripts/lazy.js loads into the page as they scroll into view, so the page can
+be laid out as soon as its header has arrived. Without scripting, each
+placeholder is a link to the same content on the army's cards or appendices
+page.
 """
 
+from cogitator.output import AsyncChunks, ChunkBuffer, Outfile
+from cogitator.templates import Template
 from cogitator.writers.armyheader import ArmyHeaderWriter
 from cogitator.writers.detachment import DetachmentWriter
 from cogitator.writers.killteamlist import KillTeamListWriter
+from cogitator.writers.librarylinks import LibraryLinksWriter
 from cogitator.writers.modelstable import ModelsTableWriter
 from cogitator.writers.wargeartable import WargearTableWriter
 from cogitator.writers.weaponstable import WeaponsTableWriter
 from cogitator.writers.abilitiestable import AbilitiesTableWriter
 
 
+def write_page_start(outfile):
+    """ Start the page. Leaves the body open. """
+    outfile.start_tag("html")
+    outfile.start_tag("head")
+    outfile.content(
+        "<link rel='stylesheet' type='text/css' href='../style/style.css'/>")
+    outfile.end_tag()  # head
+    outfile.start_tag("body")
+
+
+def write_army_start(outfile):
+    """ Start the army list. Leaves it open. """
+    outfile.comment("Army list")
+    outfile.start_tag("div", "class='army'")
+
+
+def write_lazy_page_start(outfile):
+    """ Start a page with lazily loaded fragments. Leaves the body open. """
+    outfile.start_tag("html")
+    outfile.start_tag("head")
+    outfile.content(
+        "<link rel='stylesheet' type='text/css' href='../style/style.css'/>")
+    outfile.content("<script src='../scripts/lazy.js' defer></script>")
+    outfile.end_tag()  # head
+    outfile.start_tag("body")
+
+
+def write_placeholder(outfile, anchor, src, href, title):
+    """ Write a placeholder for a fragment. """
+    outfile.start_tag("div", "class='lazy' id='%s' data-src='%s'" % (anchor,
+                                                                     src))
+    outfile.content("<a href='%s'>%s</a>" % (href, title))
+    outfile.end_tag()  # div
+
+
+PAGE_START = Template(write_page_start)
+LAZY_PAGE_START = Template(write_lazy_page_start)
+ARMY_START = Template(write_army_start)
+PLACEHOLDER = Template(write_placeholder, "anchor", "src", "href", "title")
+
+
+def fragment_dirname(basename):
+    """ Get the directory of an army's fragments, relative to its pages. """
+    return basename + "_fragments"
+
+
 class ArmyWriter(object):
 
-    def __init__(self, database):
+    def __init__(self, database, library=None):
+        """
+        :param database: Database for the army's game.
+        :param library: Link to the game's datasheet library from the army's
+                        pages. If given, the appendices link to the library
+                        rather than repeating its tables.
+        """
         self.database = database
+        self.library = library
+        self.headerwriter = ArmyHeaderWriter(database)
+        self.detachmentwriter = DetachmentWriter(database)
+        self.killteamlistwriter = KillTeamListWriter(database)
+        self.modelstable = ModelsTableWriter(database)
+        self.wargeartable = WargearTableWriter(database)
+        self.weaponstable = WeaponsTableWriter(database)
+        self.abilitiestable = AbilitiesTableWriter(database)
+        if library is not None:
+            self.librarylinks = LibraryLinksWriter(database, library)
 
     def write_army(self, outfile, army, sections=[]):
         """ Write the HTML for an army to a stream. """
+        for _ in self.iter_army_sections(outfile, army, sections):
+            pass
+
+    def iter_army(self, army, sections=[]):
+        """
+        Generate the HTML for an army in chunks, section by section and squad
+        by squad, so that it can be sent before the whole page is rendered.
+        """
+        buf = ChunkBuffer()
+        for _ in self.iter_army_sections(Outfile(buf), army, sections):
+            chunk = buf.drain()
+            if len(chunk) > 0:
+                yield chunk
+
+    def aiter_army(self, army, sections=[], executor=None):
+        """ Async iterator version of iter_army(). """
+        return AsyncChunks(self.iter_army(army, sections), executor)
+
+    def iter_army_sections(self, outfile, army, sections=[]):
+        """
+        Write the HTML for an army to a stream, yielding after each piece of
+        the page has been written.
+        """
 
         # Start of HTML file.
-        outfile.start_tag("html")
-        outfile.start_tag("head")
-        outfile.content(
-            "<link rel='stylesheet' type='text/css' href='../style/style.css'/>")
-        outfile.end_tag()  # head
-        outfile.start_tag("body")
+        PAGE_START.render(outfile)
 
         # Output totals and army info.
         if len(sections) == 0 or "header" in sections:
-            writer = ArmyHeaderWriter(self.database)
-            writer.write_army_header(outfile, army)
+            self.headerwriter.write_army_header(outfile, army)
+        yield
 
         # Output breakdown for each detachment.
         if len(sections) == 0 or "units" in sections:
-            outfile.comment("Army list")
-            outfile.start_tag("div", "class='army'")
-            for detachment in army["Detachments"]:
-                writer = DetachmentWriter(self.database)
-                writer.write_detachment(outfile, detachment)
+            ARMY_START.render(outfile)
+            for index, detachment in enumerate(army["Detachments"]):
+                for _ in self.detachmentwriter.iter_detachment(
+                        outfile, detachment, index):
+                    yield
             outfile.end_tag()  # div
+            yield
 
-        # Write out stat tables for all weapons and models in army.
+        # Write out stat tables for all weapons and models in army, or links to
+        # them in the library.
         if len(sections) == 0 or "appendices" in sections:
             outfile.comment("Appendices")
-            if self.database.is_kill_team:
-                writer = KillTeamListWriter(self.database)
-                writer.write_kill_team_list(outfile, army)
-            modelstable = ModelsTableWriter(self.database)
-            wargeartable = WargearTableWriter(self.database)
-            weaponstable = WeaponsTableWriter(self.database)
-            abilitiestable = AbilitiesTableWriter(self.database)
-            modelstable.write_models_table(outfile, self.database.list_army_models(army))
-            wargeartable.write_wargear_table(outfile, self.database.list_army_wargear(army))
-            weaponstable.write_weapons_table(outfile, self.database.list_army_weapons(army))
-            abilitiestable.write_abilities_table(outfile, self.database.list_army_abilities(army))
+            for _, _, write_section in self.appendix_sections(army):
+                write_section(outfile)
+                yield
 
         # End of HTML file.
         outfile.end_tag()  # body
-        outfile.end_tag()  # html
\ No newline at end of file
+        outfile.end_tag()  # html
+        yield
+
+    def appendix_sections(self, army):
+        """
+        List the sections of an army's appendices: the kill team's roster, and
+        then either stat tables for all the weapons and models in the army or
+        links to them in the library.
+        :return: List of (name, title, function writing the section to an
+                 Outfile).
+        """
+        sections = []
+        if self.database.is_kill_team:
+            sections.append(("kill-team", "Kill team", lambda outfile:
+                self.killteamlistwriter.write_kill_team_list(outfile, army)))
+        if self.library is not None:
+            sections.append(("datasheets", "Datasheets", lambda outfile:
+                self.librarylinks.write_links(outfile, army)))
+            return sections
+        sections += [
+            ("models", "Models", lambda outfile:
+                self.modelstable.write_models_table(
+                    outfile, self.database.list_army_models(army))),
+            ("wargear", "Wargear", lambda outfile:
+                self.wargeartable.write_wargear_table(
+                    outfile, self.database.list_army_wargear(army))),
+            ("weapons", "Weapons", lambda outfile:
+                self.weaponstable.write_weapons_table(
+                    outfile, self.database.list_army_weapons(army))),
+            ("abilities", "Abilities", lambda outfile:
+                self.abilitiestable.write_abilities_table(
+                    outfile, self.database.list_army_abilities(army)))]
+        return sections
+
+    def write_lazy_army(self, outfile, army, cards_href, appendices_href):
+        """
+        Write the full page of an army in lazy mode.
+        :param outfile: Outfile to write to.
+        :param army: The army.
+        :param cards_href: Link to the army's cards page, for browsers
+                           without scripting.
+        :param appendices_href: Link to the army's appendices page, likewise.
+        :return: List of (filename, html) of the fragments, relative to
+                 fragment_dirname().
+        """
+        dirname = fragment_dirname(army["Basename"])
+        fragments = []
+
+        def add_fragment(name, href, title, write_fragment):
+            buf = ChunkBuffer()
+            write_fragment(Outfile(buf))
+            text = buf.drain()
+            if len(text.strip()) == 0:
+                return
+            filename = name + ".html"
+            fragments.append((filename, text))
+            PLACEHOLDER.render(outfile, anchor=name,
+                               src=dirname + "/" + filename, href=href,
+                               title=title)
+
+        def write_squad(squad, anchor):
+            add_fragment(anchor, cards_href + "#" + anchor, squad["Name"],
+                         lambda fragment: self.detachmentwriter.squadwriter.
+                         write_squad(fragment, squad, anchor))
+
+        LAZY_PAGE_START.render(outfile)
+        self.headerwriter.write_army_header(outfile, army)
+        ARMY_START.render(outfile)
+        for index, detachment in enumerate(army["Detachments"]):
+            for _ in self.detachmentwriter.iter_detachment(
+                    outfile, detachment, index, write_squad):
+                pass
+        outfile.end_tag()  # div
+        outfile.comment("Appendices")
+        for name, title, write_section in self.appendix_sections(army):
+            add_fragment("appendix-" + name, appendices_href, title,
+                         write_section)
+        outfile.end_tag()  # body
+        outfile.end_tag()  # html
+        return fragments
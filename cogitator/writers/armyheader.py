@@ -2,6 +2,67 @@
 Write an army header, with optional links to files.
 """
 
+from cogitator.templates import Template
+
+
+def write_army_table(outfile, comment, title, warlord, limit, total, spare,
+                     cp_total):
+    """ Write the table of army totals. Leaves the header div open. """
+    outfile.comment(comment)
+    outfile.start_tag("div", "class='army_header'")
+    outfile.start_tag("table", "class='army_table'")
+    outfile.content(
+        "<tr><th colspan='2' class='title'>%s</th></tr>" % title)
+    outfile.content("<tr><th>Warlord</th><td>%s</td></tr>" % warlord)
+    outfile.content("<tr><th>Points limit</th><td>%s</td></tr>" % limit)
+    outfile.content("<tr><th>Points total</th><td>%s</td></tr>" % total)
+    outfile.content(
+        "<tr><th>Points to spare</th><td>%s</td></tr>" % spare)
+    outfile.content("<tr><th>CP</td><td>%s</th></tr>" % cp_total)
+    outfile.end_tag()  # table
+
+
+def write_detachments_start(outfile):
+    """ Start the table of detachments. Leaves it open. """
+    outfile.start_tag("table")
+    outfile.start_tag("tr")
+    outfile.content("<th class='title'>Detachment</th>")
+    outfile.content("<th class='title'>Type</th>")
+    outfile.content("<th class='title'>CP</th>")
+    outfile.content("<th class='title'>Cost</th>")
+    outfile.end_tag()  # tr
+
+
+def write_detachment_row(outfile, name, type, cp, cost):
+    """ Write a row of the table of detachments. """
+    outfile.start_tag("tr")
+    outfile.content("<td colspan='1'>%s</td>" % name)
+    outfile.content("<td colspan='1'>%s</td>" % type)
+    outfile.content("<td colspan='1'>%s</td>" % cp)
+    outfile.content("<td colspan='1'>%s</td>" % cost)
+    outfile.end_tag()  # tr
+
+
+def write_kill_team_table(outfile, background, quirk):
+    """ Write the kill team's background and quirk. """
+    outfile.start_tag("table")
+    outfile.start_tag("tr")
+    outfile.content("<th class='title'>Background</th>")
+    outfile.content("<th class='title'>Quirk</th>")
+    outfile.end_tag()  # tr
+    outfile.start_tag("tr")
+    outfile.content("<td colspan='1'>%s</td>" % background)
+    outfile.content("<td colspan='1'>%s</td>" % quirk)
+    outfile.end_tag()  # tr
+    outfile.end_tag()  # table
+
+
+ARMY_TABLE = Template(write_army_table, "comment", "title", "warlord",
+                      "limit", "total", "spare", "cp_total")
+DETACHMENTS_START = Template(write_detachments_start)
+DETACHMENT_ROW = Template(write_detachment_row, "name", "type", "cp", "cost")
+KILL_TEAM_TABLE = Template(write_kill_team_table, "background", "quirk")
+
 
 class ArmyHeaderWriter(object):
 
@@ -11,59 +72,30 @@ class ArmyHeaderWriter(object):
     def write_army_header(self, outfile, army, variants=None):
         """ Write the army header. """
         army_name = army["Name"]
-        outfile.comment(army_name)
+        title = army_name
         if variants is not None:
-            army_name += " ("
+            title += " ("
             for variant in variants:
-                army_name += " <a href='%s'>%s</a>" % (
+                title += " <a href='%s'>%s</a>" % (
                 variant["filename"], variant["name"])
-            army_name += ")"
+            title += ")"
         limit = army["Points"]
         total = self.database.army_points_cost(army)
-        cp_total = self.database.army_cp_total(army)
-        warlord = army["Warlord"]
-        outfile.start_tag("div", "class='army_header'")
-        outfile.start_tag("table", "class='army_table'")
-        outfile.content(
-            "<tr><th colspan='2' class='title'>%s</th></tr>" % army_name)
-        outfile.content("<tr><th>Warlord</th><td>%s</td></tr>" % warlord)
-        outfile.content("<tr><th>Points limit</th><td>%s</td></tr>" % limit)
-        outfile.content("<tr><th>Points total</th><td>%s</td></tr>" % total)
-        outfile.content(
-            "<tr><th>Points to spare</th><td>%s</td></tr>" % (limit - total))
-        outfile.content("<tr><th>CP</td><td>%s</th></tr>" % cp_total)
-        outfile.end_tag()  # table
+        ARMY_TABLE.render(outfile, comment=army_name, title=title,
+                          warlord=army["Warlord"], limit=limit, total=total,
+                          spare=limit - total,
+                          cp_total=self.database.army_cp_total(army))
         if not self.database.is_kill_team:
-            outfile.start_tag("table")
-            outfile.start_tag("tr")
-            outfile.content("<th class='title'>Detachment</th>")
-            outfile.content("<th class='title'>Type</th>")
-            outfile.content("<th class='title'>CP</th>")
-            outfile.content("<th class='title'>Cost</th>")
-            outfile.end_tag()  # tr
+            DETACHMENTS_START.render(outfile)
             for detachment in army["Detachments"]:
-                outfile.start_tag("tr")
-                outfile.content("<td colspan='1'>%s</td>" % detachment["Name"])
-                outfile.content("<td colspan='1'>%s</td>" % detachment["Type"])
-                outfile.content(
-                    "<td colspan='1'>%s</td>" % self.database.lookup_formation(
-                        detachment["Type"]).cp)
-                outfile.content(
-                    "<td colspan='1'>%s</td>" % self.database.detachment_points_cost(
-                        detachment))
-                outfile.end_tag()  # tr
+                DETACHMENT_ROW.render(
+                    outfile, name=detachment["Name"], type=detachment["Type"],
+                    cp=self.database.lookup_formation(detachment["Type"]).cp,
+                    cost=self.database.detachment_points_cost(detachment))
             outfile.end_tag()  # table
         else:
             kt = army["Detachments"][0] if len(army["Detachments"]) > 0 else {}
-            outfile.start_tag("table")
-            outfile.start_tag("tr")
-            outfile.content("<th class='title'>Background</th>")
-            outfile.content("<th class='title'>Quirk</th>")
-            outfile.end_tag()  # tr
-            outfile.start_tag("tr")
-            outfile.content(
-                "<td colspan='1'>%s</td>" % kt.get("Background", "None"))
-            outfile.content("<td colspan='1'>%s</td>" % kt.get("Quirk", "None"))
-            outfile.end_tag()  # tr
-            outfile.end_tag()  # table
-        outfile.end_tag()  # div
\ No newline at end of file
+            KILL_TEAM_TABLE.render(outfile,
+                                   background=kt.get("Background", "None"),
+                                   quirk=kt.get("Quirk", "None"))
+        outfile.end_tag()  # div
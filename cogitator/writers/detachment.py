@@ -2,7 +2,7 @@
 Write a detachment.
 """
 
-from cogitator.writers.squad import SquadWriter
+from cogitator.writers.squad import SquadWriter, squad_anchor
 from cogitator.writers.forceorg import ForceOrgWriter
 
 
@@ -10,22 +10,42 @@ class DetachmentWriter(object):
 
     def __init__(self, database):
         self.database = database
+        self.forceorgwriter = ForceOrgWriter(database)
+        self.squadwriter = SquadWriter(database)
 
-    def write_detachment(self, outfile, detachment):
-        """ Write a detachment. """
+    def write_detachment(self, outfile, detachment, index=0):
+        """
+        Write a detachment.
+        :param outfile: Outfile to write to.
+        :param detachment: The detachment.
+        :param index: Position of the detachment in its army.
+        """
+        for _ in self.iter_detachment(outfile, detachment, index):
+            pass
+
+    def iter_detachment(self, outfile, detachment, index=0, write_squad=None):
+        """
+        Write a detachment, yielding after the chart and each squad.
+        :param write_squad: Optionally, a function of a squad and its anchor
+                            writing something in place of its card.
+        """
+        if write_squad is None:
+            def write_squad(squad, anchor):
+                self.squadwriter.write_squad(outfile, squad, anchor)
 
         # Write out the table of force organisation slots
         if not self.database.is_kill_team:
-            writer = ForceOrgWriter(self.database)
-            writer.write_force_organisation_chart(outfile, detachment)
+            self.forceorgwriter.write_force_organisation_chart(outfile,
+                                                               detachment)
+            yield
 
         # Write out each squad.
         outfile.start_tag("div", "class='detachment'")
         if self.database.is_kill_team:
             outfile.start_tag("div", "class='cards'")
-        for squad in detachment["Units"]:
-            writer = SquadWriter(self.database)
-            writer.write_squad(outfile, squad)
+        for squad_index, squad in enumerate(detachment["Units"]):
+            write_squad(squad, squad_anchor(index, squad_index))
+            yield
         if self.database.is_kill_team:
             outfile.end_tag()
         outfile.end_tag()  # div
\ No newline at end of file
@@ -2,86 +2,132 @@
 Write a force organisation chart for a detachment.
 """
 
+from cogitator.forceorg import ForceOrgChecker
+from cogitator.templates import Template
+
+
+def write_detachment_table(outfile, name, type, cp, cost):
+    """
+    Write the detachment's name, type, CP and cost. Leaves the header div
+    open.
+    """
+    outfile.start_tag("div", "class='detachment_header'")
+
+    outfile.comment(name)
+    outfile.start_tag("table", "class='detachment_table'")
+    outfile.start_tag("tr")
+    outfile.oneliner("th", extra="colspan='6' class='title'", content=name)
+    outfile.end_tag()  # tr
+    outfile.start_tag("tr")
+    outfile.oneliner("th", content="Type")
+    outfile.oneliner("td", extra="colspan='1'", content=type)
+    outfile.oneliner("th", content="CP")
+    outfile.oneliner("td", extra="colspan='1'", content=cp)
+    outfile.oneliner("th", content="Cost")
+    outfile.oneliner("td", extra="colspan='1'", content=cost)
+    outfile.end_tag()  # tr
+    outfile.end_tag()  # table
+
+
+def write_formation_start(outfile):
+    """ Start the formation table. Leaves it and its header row open. """
+    outfile.comment("Formation")
+    outfile.start_tag("table", "class='detachment_table'")
+    outfile.start_tag("tr")
+
+
+def write_slot_title(outfile, slot):
+    """ Write a column header of the formation table. """
+    outfile.oneliner("th", extra="class='title'", content=slot)
+
+
+def write_row_start(outfile):
+    """ Start a row. Leaves it open. """
+    outfile.start_tag("tr")
+
+
+def write_slot_count(outfile, count, limit):
+    """ Write the count and limit of a slot. """
+    outfile.oneliner("td", content="%s/%s" % (count, limit))
+
+
+def write_slot_violation(outfile, count, minimum, maximum):
+    """ Write the count and limits of a slot which has too few or many units. """
+    outfile.oneliner("td", extra="class='violation' title='%s-%s allowed'" % (
+        minimum, maximum), content="%s/%s" % (count, maximum))
+
+
+def write_units_start(outfile):
+    """ Start the unit summary table. Leaves it open. """
+    outfile.comment("Unit summary")
+    outfile.start_tag("table")
+    outfile.start_tag("tr")
+    outfile.oneliner("th", extra="class='title'", content="Unit")
+    outfile.oneliner("th", extra="class='title'", content="Slot")
+    outfile.oneliner("th", extra="class='title'", content="Cost")
+    outfile.end_tag()  # tr
+
+
+def write_unit(outfile, name, slot, cost):
+    """ Write a row of the unit summary table. """
+    outfile.start_tag("tr")
+    outfile.oneliner("td", content=name)
+    outfile.oneliner("td", content=slot)
+    outfile.oneliner("td", content=cost)
+    outfile.end_tag()  # tr
+
+
+DETACHMENT_TABLE = Template(write_detachment_table, "name", "type", "cp",
+                            "cost")
+FORMATION_START = Template(write_formation_start)
+SLOT_TITLE = Template(write_slot_title, "slot")
+ROW_START = Template(write_row_start)
+SLOT_COUNT = Template(write_slot_count, "count", "limit")
+SLOT_VIOLATION = Template(write_slot_violation, "count", "minimum", "maximum")
+UNITS_START = Template(write_units_start)
+UNIT = Template(write_unit, "name", "slot", "cost")
+
 
 class ForceOrgWriter(object):
     
     def __init__(self, database):
         self.database = database
+        self.checker = ForceOrgChecker(database)
 
     def write_force_organisation_chart(self, outfile, detachment):
         """ Write the force organisation chart for the detachment. """
 
-        outfile.start_tag("div", "class='detachment_header'")
-
-        outfile.comment(detachment["Name"])
-        outfile.start_tag("table", "class='detachment_table'")
-        outfile.start_tag("tr")
-        outfile.oneliner("th", extra="colspan='6' class='title'",
-                         content=detachment["Name"])
-        outfile.end_tag()  # tr
-        outfile.start_tag("tr")
-        outfile.oneliner("th", content="Type")
-        outfile.oneliner("td", extra="colspan='1'", content=detachment["Type"])
-        outfile.oneliner("th", content="CP")
-        outfile.oneliner("td", extra="colspan='1'",
-                         content=self.database.lookup_formation(
-                             detachment["Type"]).cp)
-        outfile.oneliner("th", content="Cost")
-        outfile.oneliner("td", extra="colspan='1'",
-                         content=self.database.detachment_points_cost(detachment))
-        outfile.end_tag()  # tr
-        outfile.end_tag()  # table
-
-        # Write the column header. Note that transports are handled as a special
-        # case.
-        outfile.comment("Formation")
-        outfile.start_tag("table", "class='detachment_table'")
-        outfile.start_tag("tr")
         formation = self.database.lookup_formation(detachment["Type"])
-        for slot in formation.slots:
-            outfile.oneliner("th", extra="class='title'", content=slot)
-        outfile.oneliner("th", extra="class='title'", content="Transports")
+        DETACHMENT_TABLE.render(
+            outfile, name=detachment["Name"], type=detachment["Type"],
+            cp=formation.cp,
+            cost=self.database.detachment_points_cost(detachment))
+
+        # Write the column header.
+        tallies = self.checker.tally_detachment(detachment)
+        FORMATION_START.render(outfile)
+        for tally in tallies:
+            SLOT_TITLE.render(outfile, slot=tally.slot)
         outfile.end_tag()  # tr
 
-        # Write the slot totals and limits.
-        outfile.start_tag("tr")
-        for slot in formation.slots:
-            min, max = formation.slots[slot]
-            count = 0
-            for squad in detachment["Units"]:
-                if squad["Slot"] == slot:
-                    count += 1
-            outfile.oneliner("td", content="%s/%s" % (count, max))
-
-        # Again handle transports as a special case since their limit depends
-        # on everything else.
-        assert formation.transports_ratio == "1:1"
-        transport_count = 0
-        transport_limit = 0
-        for squad in detachment["Units"]:
-            if squad["Slot"] == "Transports":
-                transport_count += 1
+        # Write the slot totals and limits, marking any which are broken.
+        ROW_START.render(outfile)
+        for tally in tallies:
+            if tally.is_valid():
+                SLOT_COUNT.render(outfile, count=tally.count,
+                                  limit=tally.maximum)
             else:
-                transport_limit += 1
-        outfile.oneliner("td",
-                         content="%s/%s" % (transport_count, transport_limit))
+                SLOT_VIOLATION.render(outfile, count=tally.count,
+                                      minimum=tally.minimum,
+                                      maximum=tally.maximum)
         outfile.end_tag()  # tr
         outfile.end_tag()  # table
 
         # Write a summary of all units in detachment.
-        outfile.comment("Unit summary")
-        outfile.start_tag("table")
-        outfile.start_tag("tr")
-        outfile.oneliner("th", extra="class='title'", content="Unit")
-        outfile.oneliner("th", extra="class='title'", content="Slot")
-        outfile.oneliner("th", extra="class='title'", content="Cost")
-        outfile.end_tag()  # tr
+        UNITS_START.render(outfile)
         for squad in detachment["Units"]:
-            outfile.start_tag("tr")
-            outfile.oneliner("td", content=squad["Name"])
-            outfile.oneliner("td", content=squad["Slot"])
-            outfile.oneliner("td", content=self.database.squad_points_cost(squad))
-            outfile.end_tag()  # tr
+            UNIT.render(outfile, name=squad["Name"], slot=squad["Slot"],
+                        cost=self.database.squad_points_cost(squad))
         outfile.end_tag()  # table
 
-        outfile.end_tag()  # div
\ No newline at end of file
+        outfile.end_tag()  # div
@@ -0,0 +1,80 @@
+"""
+Write the index page.
+
+The page itself is just a frame; the list of armies is loaded from
+armies.json and paged, sorted and filtered by scripts/index.js in the browser,
+and scripts/search.js searches the squads using the shards in search/.
+A plain list of links is included for browsers without scripting.
+"""
+
+from cogitator.templates import Template
+
+
+def write_index_start(outfile):
+    """ Start the page. Leaves the body and the no-script list open. """
+    outfile.start_tag("html")
+    outfile.start_tag("head")
+    outfile.content("<meta charset='utf-8'/>")
+    outfile.content("<link rel='stylesheet' type='text/css' href='./style/style.css'/>")
+    outfile.content("<script src='./scripts/index.js' defer></script>")
+    outfile.content("<script src='./scripts/search.js' defer></script>")
+    outfile.end_tag()  # head
+    outfile.start_tag("body")
+    outfile.content("<h1> Army Lists </h1>")
+    outfile.start_tag("div", "class='search' data-src='search'")
+    outfile.content("<label>Search units, wargear and abilities <input id='search_query' type='search'/></label>")
+    outfile.oneliner("ul", extra="id='search_results'")
+    outfile.end_tag()  # div
+    outfile.start_tag("div", "class='index_controls'")
+    outfile.content("<label>Game <select id='index_game'><option value=''>All</option></select></label>")
+    outfile.content("<label>Points <select id='index_points'><option value=''>All</option></select></label>")
+    outfile.content("<label>Name <input id='index_filter' type='search'/></label>")
+    outfile.end_tag()  # div
+    outfile.start_tag("table", "id='index_table' class='index_table' data-src='armies.json'")
+    outfile.start_tag("thead")
+    outfile.start_tag("tr")
+    for key, title in (("Name", "Army"), ("Game", "Game"),
+                       ("Points", "Limit"), ("Total", "Total"),
+                       ("Spare", "Spare"), ("CP", "CP"),
+                       ("Warlord", "Warlord"), ("Violations", "Legal")):
+        outfile.content("<th class='title sortable' data-key='%s'>%s</th>" % (
+            key, title))
+    outfile.content("<th class='title'>Pages</th>")
+    outfile.end_tag()  # tr
+    outfile.end_tag()  # thead
+    outfile.oneliner("tbody")
+    outfile.end_tag()  # table
+    outfile.start_tag("div", "class='index_pager'")
+    outfile.content("<button id='index_prev'>&lt;</button>")
+    outfile.content("<span id='index_page'></span>")
+    outfile.content("<button id='index_next'>&gt;</button>")
+    outfile.end_tag()  # div
+    outfile.start_tag("noscript")
+    outfile.start_tag("ul")
+
+
+def write_index_link(outfile, href, name):
+    """ Write a link to an army for the no-script list. """
+    outfile.content("<li><a href='%s'>%s</a></li>" % (href, name))
+
+
+INDEX_START = Template(write_index_start)
+INDEX_LINK = Template(write_index_link, "href", "name")
+
+
+class IndexWriter(object):
+
+    def write_index(self, outfile, summaries):
+        """
+        Write the index page.
+        :param outfile: Outfile to write to.
+        :param summaries: Army summaries, as made by army_summary().
+        """
+        INDEX_START.render(outfile)
+        for summary in summaries:
+            INDEX_LINK.render(outfile, href=summary["Variants"][0]["href"],
+                              name=summary["Name"])
+        outfile.end_tag()  # ul
+        outfile.end_tag()  # noscript
+        outfile.end_tag()  # body
+        outfile.end_tag()  # html
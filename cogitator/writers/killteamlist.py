@@ -2,6 +2,23 @@
 Write a summary of kill team members with points cost breakdown.
 """
 
+from cogitator.templates import Template
+
+
+def write_kill_team_list_start(outfile):
+    """ Start the table. Leaves it open. """
+    outfile.start_tag("table")
+    outfile.content("<tr><th class='title' colspan=2>Army List</th></tr>")
+
+
+def write_kill_team_member(outfile, name, text):
+    """ Write a row of the table. """
+    outfile.content("<tr><td class='stat-left'><span class='ability_tag'>%s: </span> %s</td></tr>" % (name, text))
+
+
+KILL_TEAM_LIST_START = Template(write_kill_team_list_start)
+KILL_TEAM_MEMBER = Template(write_kill_team_member, "name", "text")
+
 
 class KillTeamListWriter(object):
 
@@ -11,8 +28,7 @@ class KillTeamListWriter(object):
     def write_kill_team_list(self, outfile, army):
         """ Write the kill team army summary. """
         if not self.database.is_kill_team: return
-        outfile.start_tag("table")
-        outfile.content("<tr><th class='title' colspan=2>Army List</th></tr>")
+        KILL_TEAM_LIST_START.render(outfile)
         for detachment in army["Detachments"]:
             for squad in detachment["Units"]:
                 weapons, models, wargear, num_models = self.database.get_squad_items(squad)
@@ -24,5 +40,5 @@ class KillTeamListWriter(object):
                 items_strs = ["%s (%spts)" % (item.name, item.cost) for item in
                               items]
                 text += ", ".join(items_strs)
-                outfile.content("<tr><td class='stat-left'><span class='ability_tag'>%s: </span> %s</td></tr>" % (squad["Name"], text))
-        outfile.end_tag()
\ No newline at end of file
+                KILL_TEAM_MEMBER.render(outfile, name=squad["Name"], text=text)
+        outfile.end_tag()
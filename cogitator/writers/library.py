@@ -0,0 +1,59 @@
+"""
+Write the datasheet library for a game.
+
+In library mode every model, weapon, piece of wargear and ability of a game is
+written once, to a shared page with an anchor per entry, and the appendices
+of each army link to the entries it uses (see librarylinks.py) rather than
+repeating them. The size of the output then grows with the size of the
+catalogue rather than with the size of the catalogue times the number of
+armies.
+"""
+
+from cogitator.database import game_dirname
+from cogitator.templates import Template
+from cogitator.writers.abilitiestable import AbilitiesTableWriter
+from cogitator.writers.army import PAGE_START
+from cogitator.writers.modelstable import ModelsTableWriter
+from cogitator.writers.wargeartable import WargearTableWriter
+from cogitator.writers.weaponstable import WeaponsTableWriter
+
+
+def library_filename(game):
+    """ Get the name of a game's library page, relative to the library. """
+    return game_dirname(game) + ".html"
+
+
+def write_library_start(outfile, game):
+    """ Start the library. Leaves it open. """
+    outfile.comment("Datasheet library")
+    outfile.start_tag("div", "class='library'")
+    outfile.content("<h1>%s datasheets</h1>" % game)
+
+
+LIBRARY_START = Template(write_library_start, "game")
+
+
+class LibraryWriter(object):
+
+    def __init__(self, database):
+        self.database = database
+        self.modelstable = ModelsTableWriter(database)
+        self.wargeartable = WargearTableWriter(database)
+        self.weaponstable = WeaponsTableWriter(database)
+        self.abilitiestable = AbilitiesTableWriter(database)
+
+    def write_library(self, outfile):
+        """ Write the library page for the database's game. """
+        PAGE_START.render(outfile)
+        LIBRARY_START.render(outfile, game=self.database.game)
+        self.modelstable.write_models_table(
+            outfile, self.database.list_models(), anchored=True)
+        self.wargeartable.write_wargear_table(
+            outfile, self.database.list_wargear(), anchored=True)
+        self.weaponstable.write_weapons_table(
+            outfile, self.database.list_weapons(), anchored=True)
+        self.abilitiestable.write_abilities_table(
+            outfile, self.database.list_abilities(), anchored=True)
+        outfile.end_tag()  # div
+        outfile.end_tag()  # body
+        outfile.end_tag()  # html
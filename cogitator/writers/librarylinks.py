@@ -0,0 +1,52 @@
+"""
+Write links from an army's appendices to the datasheet library.
+"""
+
+from cogitator.output import anchor_id
+from cogitator.templates import Template
+
+
+def write_links_start(outfile):
+    """ Start the table of links. Leaves it open. """
+    outfile.comment("Datasheets")
+    outfile.start_tag("table")
+    outfile.content("<tr><th class='title' colspan='2'>Datasheets</th></tr>")
+
+
+def write_links(outfile, kind, links):
+    """ Write a row of links. """
+    outfile.content(
+        "<tr><td class='stat-left'><span class='ability_tag'>%s: </span> %s</td></tr>" % (
+        kind, links))
+
+
+LINKS_START = Template(write_links_start)
+LINKS = Template(write_links, "kind", "links")
+
+
+class LibraryLinksWriter(object):
+
+    def __init__(self, database, href):
+        """
+        :param database: Database for the game.
+        :param href: Link to the game's library page from an army's pages.
+        """
+        self.database = database
+        self.href = href
+
+    def write_links(self, outfile, army):
+        """ Write links to the library entries an army uses. """
+        LINKS_START.render(outfile)
+        for kind, anchor_kind, names in (
+                ("Models", "model", self.database.list_army_models(army)),
+                ("Wargear", "wargear", self.database.list_army_wargear(army)),
+                ("Weapons", "weapon", self.database.list_army_weapons(army)),
+                ("Abilities", "ability",
+                 self.database.list_army_abilities(army))):
+            if len(names) == 0:
+                continue
+            LINKS.render(outfile, kind=kind, links=", ".join(
+                "<a href='%s#%s'>%s</a>" % (self.href,
+                                            anchor_id(anchor_kind, name), name)
+                for name in sorted(names)))
+        outfile.end_tag()  # table
@@ -2,7 +2,7 @@
 Write a table of models.
 """
 
-from cogitator.output import Table
+from cogitator.output import Table, anchor_id
 
 
 class ModelsTableWriter(object):
@@ -10,8 +10,12 @@ class ModelsTableWriter(object):
     def __init__(self, database):
         self.database = database
 
-    def write_models_table(self, outfile, item_names, squad=None):
-        """ Write a table of models. """
+    def write_models_table(self, outfile, item_names, squad=None,
+                           anchored=False):
+        """
+        Write a table of models.
+        :param anchored: Whether to give each model's row an id to link to.
+        """
         if len(item_names) == 0:
             return
         outfile.comment("Models")
@@ -37,6 +41,8 @@ class ModelsTableWriter(object):
             first = True
             for variant in variants:
                 table.add_row()
+                if anchored and first:
+                    table.set_row_id(anchor_id("model", name))
                 for stat in stats:
                     value = variant.stats[stat]
                     if stat in ("WS", "BS", "Sv"):
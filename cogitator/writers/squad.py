@@ -2,6 +2,8 @@
 Write a squad datasheet or card.
 """
 
+from cogitator.output import ChunkBuffer, Outfile
+from cogitator.templates import OUTER, Template
 from cogitator.writers.modelstable import ModelsTableWriter
 from cogitator.writers.wargeartable import WargearTableWriter
 from cogitator.writers.weaponstable import WeaponsTableWriter
@@ -9,44 +11,136 @@ from cogitator.writers.abilitiestable import AbilitiesTableWriter
 from cogitator.writers.psykertable import PsykerTableWriter
 
 
+# Stands in for the anchor of a squad whose card is cached.
+ANCHOR_MARKER = "\0anchor\0"
+
+
+def squad_anchor(detachment_index, squad_index):
+    """ Get the id of a squad's element on an army page. """
+    return "squad-%s-%s" % (detachment_index, squad_index)
+
+
+def write_squad_start(outfile, comment, anchor, title, portrait):
+    """ Start the squad, with its name and portrait. Leaves a table open. """
+    outfile.comment(comment)
+    outfile.start_tag("div", "class='squad' id='%s'" % anchor)
+
+    # Squad name and total cost.
+    outfile.comment("Summary")
+    outfile.start_tag("table", "class='unit_table'")
+    outfile.start_tag("tr")
+    outfile.oneliner("th", extra="colspan='6' class='title'", content=title)
+    outfile.start_tag("td", "class='squad_portrait_cell' rowspan=2")
+    outfile.oneliner("img",
+                     extra="class='squad_portrait' src='%s'" % portrait)
+    outfile.end_tag()
+    outfile.end_tag()  # tr
+
+
+def write_squad_stats(outfile, slot, num_models, cost):
+    """ Write the squad's slot, size and cost. """
+    outfile.start_tag("tr")
+    outfile.oneliner("th", content="Slot")
+    outfile.oneliner("td", content=slot)
+    outfile.oneliner("th", content="Models")
+    outfile.oneliner("td", content=num_models)
+    outfile.oneliner("th", content="Cost")
+    outfile.oneliner("td", content=cost)
+    outfile.end_tag()  # tr
+
+
+def write_squad_notes(outfile, notes):
+    """ Write the squad's notes. """
+    outfile.content("<tr><td class='notes'>%s</td></tr>" % notes)
+
+
+# Cells of the experience gauge.
+XP_CELLS = ["cell%s" % i for i in range(12)]
+
+
+def write_experience_gauge(outfile, **cells):
+    """ Write the experience gauge, given the class of each cell. """
+    outfile.start_tag("table")
+    outfile.start_tag("tr")
+    outfile.start_tag("th class='title_nofill'")
+    outfile.content("XP")
+    outfile.end_tag()  # th
+    outfile.start_tag("td")
+    outfile.start_tag("div", "class='experience_gauge'")
+    for cell in XP_CELLS:
+        outfile.oneliner("div", extra="class='%s'" % cells[cell])
+    outfile.end_tag()  # div
+    outfile.end_tag()  # td
+    outfile.end_tag()  # tr
+    outfile.end_tag()  # table
+
+
+def write_extra_space(outfile):
+    """ Write some space for mid-campaign additions. """
+    outfile.oneliner("div", extra="class='extra_space'")
+
+
+SQUAD_START = Template(write_squad_start, "comment", "anchor", "title",
+                       "portrait")
+SQUAD_STATS = Template(write_squad_stats, "slot", "num_models", "cost")
+SQUAD_NOTES = Template(write_squad_notes, "notes")
+EXPERIENCE_GAUGE = Template(write_experience_gauge, *XP_CELLS)
+EXTRA_SPACE = Template(write_extra_space)
+
+
 class SquadWriter(object):
 
     def __init__(self, database):
         self.database = database
+        self.modelwriter = ModelsTableWriter(database)
+        self.wargearwriter = WargearTableWriter(database)
+        self.weaponswriter = WeaponsTableWriter(database)
+        self.abilitieswriter = AbilitiesTableWriter(database)
+        self.psykerwriter = PsykerTableWriter(database)
+        self.__cards = {}
 
-    def write_squad(self, outfile, squad):
-        """ Write out the cost breakdown for a squad. """
+    def write_squad(self, outfile, squad, anchor):
+        """
+        Write out the cost breakdown for a squad. The cards of squads using
+        shared unit definitions are only written once, and reused wherever
+        the same squad appears, in any army.
+        :param outfile: Outfile to write to.
+        :param squad: The squad.
+        :param anchor: Id of the squad's element, see squad_anchor().
+        """
+        if "Use" not in squad:
+            self.write_card(outfile, squad, anchor)
+            return
+        depth = len(outfile.stack)
+        key = (id(squad), depth, outfile.tabsize)
+        cached = self.__cards.get(key)
+        if cached is None or cached[0] is not squad:
+            buf = ChunkBuffer()
+            card = Outfile(buf)
+            card.tabsize = outfile.tabsize
+            card.stack = [OUTER] * depth
+            self.write_card(card, squad, ANCHOR_MARKER)
+            cached = (squad, buf.drain())
+            self.__cards[key] = cached
+        outfile.write(cached[1].replace(ANCHOR_MARKER, anchor))
+
+    def write_card(self, outfile, squad, anchor):
+        """ Write out the cost breakdown for a squad, as for write_squad(). """
 
         weapons, models, wargear, num_models = self.database.get_squad_items(squad)
         abilities = self.database.list_squad_abilities(squad)
 
         # Start the squad.
-        outfile.comment(squad["Name"])
-        outfile.start_tag("div", "class='squad'")
-
-        # Squad name and total cost.
-        outfile.comment("Summary")
-        outfile.start_tag("table", "class='unit_table'")
-        outfile.start_tag("tr")
         name = squad["Name"]
         if self.database.is_kill_team:
             name += " (%s)" % self.database.squad_points_cost(squad)
-        outfile.oneliner("th", extra="colspan='6' class='title'", content=name)
-        outfile.start_tag("td", "class='squad_portrait_cell' rowspan=2")
-        portrait = squad.get("Portrait", "../images/default.png")
-        outfile.oneliner("img",
-                         extra="class='squad_portrait' src='%s'" % portrait)
-        outfile.end_tag()
-        outfile.end_tag()  # tr
+        SQUAD_START.render(
+            outfile, comment=squad["Name"], anchor=anchor, title=name,
+            portrait=squad.get("Portrait", "../images/default.png"))
         if not self.database.is_kill_team:
-            outfile.start_tag("tr")
-            outfile.oneliner("th", content="Slot")
-            outfile.oneliner("td", content=squad["Slot"])
-            outfile.oneliner("th", content="Models")
-            outfile.oneliner("td", content=num_models)
-            outfile.oneliner("th", content="Cost")
-            outfile.oneliner("td", content=self.database.squad_points_cost(squad))
-            outfile.end_tag()  # tr
+            SQUAD_STATS.render(outfile, slot=squad["Slot"],
+                               num_models=num_models,
+                               cost=self.database.squad_points_cost(squad))
         notes = squad.get("Notes", "")
         demeanour = squad.get("Demeanour")
         if demeanour is not None:
@@ -54,51 +148,37 @@ class SquadWriter(object):
                 notes += " "
             notes += "(%s)" % demeanour
         if len(notes) > 0:
-            outfile.content("<tr><td class='notes'>%s</td></tr>" % notes)
+            SQUAD_NOTES.render(outfile, notes=notes)
         outfile.end_tag()  # table
 
         # Write the experience gauge
         if self.database.is_kill_team:
             xp = squad.get("Experience", 0)
-            outfile.start_tag("table")
-            outfile.start_tag("tr")
-            outfile.start_tag("th class='title_nofill'")
-            outfile.content("XP")
-            outfile.end_tag()  # th
-            outfile.start_tag("td")
-            outfile.start_tag("div", "class='experience_gauge'")
-            for i in xrange(12):
+            cells = {}
+            for i, cell in enumerate(XP_CELLS):
                 cell_class = "experience_cell"
                 if i == 3 or i == 7 or i == 12:
                     cell_class += "_level"
                 if xp >= i:
                     cell_class += "_checked"
-                outfile.oneliner("div", extra="class='%s'" % cell_class)
-            outfile.end_tag()  # div
-            outfile.end_tag()  # td
-            outfile.end_tag()  # tr
-            outfile.end_tag()  # table
+                cells[cell] = cell_class
+            EXPERIENCE_GAUGE.render(outfile, **cells)
 
         # Write quick reference tables for the squad.
-        modelwriter = ModelsTableWriter(self.database)
-        wargearwriter = WargearTableWriter(self.database)
-        weaponswriter = WeaponsTableWriter(self.database)
-        abilitieswriter = AbilitiesTableWriter(self.database)
-        modelwriter.write_models_table(outfile, models, squad)
+        self.modelwriter.write_models_table(outfile, models, squad)
         if not self.database.is_kill_team:
-            wargearwriter.write_wargear_table(outfile, wargear, squad)
-        weaponswriter.write_weapons_table(outfile, weapons, squad)
-        abilitieswriter.write_abilities_table(outfile, abilities, squad)
+            self.wargearwriter.write_wargear_table(outfile, wargear, squad)
+        self.weaponswriter.write_weapons_table(outfile, weapons, squad)
+        self.abilitieswriter.write_abilities_table(outfile, abilities, squad)
 
         # If the squad contains psykers, write out their info.
         for model in models:
-            writer = PsykerTableWriter(self.database)
-            writer.write_psyker_table(outfile, model)
+            self.psykerwriter.write_psyker_table(outfile, model)
 
         # Add some space for mid-campaign additions to avoid the need for
         # re-printing.
         if self.database.is_kill_team:
-            outfile.oneliner("div", extra="class='extra_space'")
+            EXTRA_SPACE.render(outfile)
 
         # Done with the squad.
-        outfile.end_tag()  # div
\ No newline at end of file
+        outfile.end_tag()  # div
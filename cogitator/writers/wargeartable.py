@@ -2,7 +2,7 @@
 Write a table of wargear.
 """
 
-from cogitator.output import Table
+from cogitator.output import Table, anchor_id
 
 
 class WargearTableWriter(object):
@@ -10,7 +10,12 @@ class WargearTableWriter(object):
     def __init__(self, database):
         self.database = database
 
-    def write_wargear_table(self, outfile, item_names, squad=None):
+    def write_wargear_table(self, outfile, item_names, squad=None,
+                            anchored=False):
+        """
+        Write a table of wargear.
+        :param anchored: Whether to give each item's row an id to link to.
+        """
         if len(item_names) == 0:
             return
         outfile.comment("Wargear")
@@ -31,6 +36,8 @@ class WargearTableWriter(object):
         for name in sorted(item_names):
             item = self.database.lookup_item(name)
             table.add_row()
+            if anchored:
+                table.set_row_id(anchor_id("wargear", name))
             table.set_cell("Item", name)
             table.set_cell("Cost", item.cost)
             table.set_cell("Abilities", ", ".join(item.abilities))
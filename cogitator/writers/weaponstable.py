@@ -2,7 +2,7 @@
 Write a table of weapons.
 """
 
-from cogitator.output import Table
+from cogitator.output import Table, anchor_id
 
 
 class WeaponsTableWriter(object):
@@ -10,8 +10,13 @@ class WeaponsTableWriter(object):
     def __init__(self, database):
         self.database = database
 
-    def write_weapons_table(self, outfile, item_names, squad=None):
-        """ Write a table of weapons. """
+    def write_weapons_table(self, outfile, item_names, squad=None,
+                            anchored=False):
+        """
+        Write a table of weapons.
+        :param anchored: Whether to give each weapon's first row an id to link
+                         to.
+        """
         if len(item_names) == 0:
             return
         outfile.comment("Weapons")
@@ -42,6 +47,8 @@ class WeaponsTableWriter(object):
             multiple_modes = len(modes) > 1
             if multiple_modes:
                 table.add_row()
+                if anchored:
+                    table.set_row_id(anchor_id("weapon", name))
                 for stat in stats:
                     value = ""
                     if stat != "Cost" and stat != "Name":
@@ -60,6 +67,8 @@ class WeaponsTableWriter(object):
             # want to do it again.
             for mode in modes:
                 table.add_row()
+                if anchored and not multiple_modes:
+                    table.set_row_id(anchor_id("weapon", name))
                 for stat in stats:
                     style = None
                     value = mode.stats[stat]
@@ -0,0 +1,160 @@
+/*
+ * The index page. The armies are listed in armies.json, which is written by
+ * generate.py; this pages, sorts and filters them so that the page stays
+ * quick however many lists there are.
+ */
+(function () {
+    "use strict";
+
+    var PAGE_SIZE = 50;
+
+    var armies = [];
+    var shown = [];
+    var page = 0;
+    var sortKey = "Name";
+    var sortDescending = false;
+
+    function element(id) {
+        return document.getElementById(id);
+    }
+
+    function cell(row, content) {
+        var td = document.createElement("td");
+        if (content !== undefined && content !== null) {
+            td.appendChild(document.createTextNode(String(content)));
+        }
+        row.appendChild(td);
+        return td;
+    }
+
+    function addOptions(select, values) {
+        values.sort(function (a, b) { return a < b ? -1 : a > b ? 1 : 0; });
+        for (var i = 0; i < values.length; ++i) {
+            var option = document.createElement("option");
+            option.value = String(values[i]);
+            option.appendChild(document.createTextNode(String(values[i])));
+            select.appendChild(option);
+        }
+    }
+
+    function distinct(key) {
+        var seen = {};
+        var values = [];
+        for (var i = 0; i < armies.length; ++i) {
+            var value = armies[i][key];
+            if (!seen.hasOwnProperty(value)) {
+                seen[value] = true;
+                values.push(value);
+            }
+        }
+        return values;
+    }
+
+    function compare(a, b) {
+        var x = a[sortKey];
+        var y = b[sortKey];
+        if (x instanceof Array) { x = x.length; }
+        if (y instanceof Array) { y = y.length; }
+        if (typeof x === "string") { x = x.toLowerCase(); }
+        if (typeof y === "string") { y = y.toLowerCase(); }
+        var order = x < y ? -1 : x > y ? 1 : 0;
+        return sortDescending ? -order : order;
+    }
+
+    function update() {
+        var game = element("index_game").value;
+        var points = element("index_points").value;
+        var text = element("index_filter").value.toLowerCase();
+        shown = [];
+        for (var i = 0; i < armies.length; ++i) {
+            var army = armies[i];
+            if (game && army.Game !== game) { continue; }
+            if (points && String(army.Points) !== points) { continue; }
+            if (text && army.Name.toLowerCase().indexOf(text) < 0) { continue; }
+            shown.push(army);
+        }
+        shown.sort(compare);
+        page = 0;
+        render();
+    }
+
+    function render() {
+        var pages = Math.max(1, Math.ceil(shown.length / PAGE_SIZE));
+        page = Math.min(Math.max(page, 0), pages - 1);
+        var body = element("index_table").tBodies[0];
+        while (body.firstChild) {
+            body.removeChild(body.firstChild);
+        }
+        var end = Math.min(shown.length, (page + 1) * PAGE_SIZE);
+        for (var i = page * PAGE_SIZE; i < end; ++i) {
+            var army = shown[i];
+            var row = document.createElement("tr");
+            cell(row, army.Name);
+            cell(row, army.Game);
+            cell(row, army.Points);
+            cell(row, army.Total);
+            cell(row, army.Spare);
+            cell(row, army.CP);
+            cell(row, army.Warlord);
+            var legal = cell(row, army.Violations.length === 0 ? "Yes" : "No");
+            if (army.Violations.length > 0) {
+                legal.className = "violation";
+                legal.title = army.Violations.join("\n");
+            }
+            var links = cell(row);
+            for (var j = 0; j < army.Variants.length; ++j) {
+                var link = document.createElement("a");
+                link.href = army.Variants[j].href;
+                link.appendChild(document.createTextNode(army.Variants[j].name));
+                links.appendChild(link);
+                links.appendChild(document.createTextNode(" "));
+            }
+            body.appendChild(row);
+        }
+        element("index_page").textContent =
+            (page + 1) + " / " + pages + " (" + shown.length + " lists)";
+        element("index_prev").disabled = page === 0;
+        element("index_next").disabled = page >= pages - 1;
+    }
+
+    function sortBy(key) {
+        if (key === sortKey) {
+            sortDescending = !sortDescending;
+        } else {
+            sortKey = key;
+            sortDescending = false;
+        }
+        shown.sort(compare);
+        render();
+    }
+
+    function start() {
+        var headings = document.querySelectorAll("#index_table th.sortable");
+        for (var i = 0; i < headings.length; ++i) {
+            headings[i].onclick = (function (key) {
+                return function () { sortBy(key); };
+            })(headings[i].getAttribute("data-key"));
+        }
+        element("index_game").onchange = update;
+        element("index_points").onchange = update;
+        element("index_filter").oninput = update;
+        element("index_prev").onclick = function () { page -= 1; render(); };
+        element("index_next").onclick = function () { page += 1; render(); };
+
+        var request = new XMLHttpRequest();
+        request.open("GET", element("index_table").getAttribute("data-src"));
+        request.onload = function () {
+            armies = JSON.parse(request.responseText);
+            addOptions(element("index_game"), distinct("Game"));
+            addOptions(element("index_points"), distinct("Points"));
+            update();
+        };
+        request.send();
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", start);
+    } else {
+        start();
+    }
+})();
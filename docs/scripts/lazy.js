@@ -0,0 +1,53 @@
+/*
+ * Load the squad cards and appendices of an army page built with
+ * 'generate.py --lazy' as they scroll into view. Each placeholder names the
+ * fragment to load in data-src, and is replaced by it; the link inside it is
+ * for browsers without scripting.
+ */
+(function () {
+    "use strict";
+
+    // How far outside the window to start loading fragments.
+    var MARGIN = "400px";
+
+    function load(placeholder) {
+        var request = new XMLHttpRequest();
+        request.open("GET", placeholder.getAttribute("data-src"));
+        request.onload = function () {
+            // Pages opened from disk report a status of 0.
+            if ((request.status === 200 || request.status === 0) &&
+                    request.responseText.length > 0) {
+                placeholder.outerHTML = request.responseText;
+            }
+        };
+        request.send();
+    }
+
+    function start() {
+        var placeholders = document.querySelectorAll(".lazy");
+        var i;
+        if (!("IntersectionObserver" in window)) {
+            for (i = 0; i < placeholders.length; ++i) {
+                load(placeholders[i]);
+            }
+            return;
+        }
+        var observer = new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    load(entry.target);
+                }
+            });
+        }, {rootMargin: MARGIN});
+        for (i = 0; i < placeholders.length; ++i) {
+            observer.observe(placeholders[i]);
+        }
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", start);
+    } else {
+        start();
+    }
+})();
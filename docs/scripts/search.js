@@ -0,0 +1,115 @@
+/*
+ * Search the squads in the army lists. The index is written by generate.py
+ * as one JSON file per initial letter of the terms in it, and only the
+ * shards needed for a query are fetched. Every word of the query must match
+ * the start of a term, so "melta" finds meltaguns and multi-meltas.
+ */
+(function () {
+    "use strict";
+
+    var MAX_RESULTS = 100;
+
+    var shards = {};
+    var latest = "";
+
+    function element(id) {
+        return document.getElementById(id);
+    }
+
+    function words(text) {
+        return text.toLowerCase().match(/[a-z0-9]+/g) || [];
+    }
+
+    function fetchShard(name, callback) {
+        if (shards.hasOwnProperty(name)) {
+            callback(shards[name]);
+            return;
+        }
+        var base = document.querySelector(".search").getAttribute("data-src");
+        var request = new XMLHttpRequest();
+        request.open("GET", base + "/" + name + ".json");
+        request.onload = function () {
+            shards[name] = request.status === 200 ?
+                JSON.parse(request.responseText) : {};
+            callback(shards[name]);
+        };
+        request.onerror = function () {
+            shards[name] = {};
+            callback(shards[name]);
+        };
+        request.send();
+    }
+
+    // Find the postings for every term starting with a word.
+    function lookup(shard, word) {
+        var found = {};
+        for (var term in shard) {
+            if (shard.hasOwnProperty(term) && term.indexOf(word) === 0) {
+                var postings = shard[term];
+                for (var i = 0; i < postings.length; ++i) {
+                    found[postings[i][0]] = postings[i][1];
+                }
+            }
+        }
+        return found;
+    }
+
+    function show(results) {
+        var list = element("search_results");
+        while (list.firstChild) {
+            list.removeChild(list.firstChild);
+        }
+        var hrefs = Object.keys(results).sort();
+        for (var i = 0; i < hrefs.length && i < MAX_RESULTS; ++i) {
+            var item = document.createElement("li");
+            var link = document.createElement("a");
+            link.href = hrefs[i];
+            link.appendChild(document.createTextNode(results[hrefs[i]]));
+            item.appendChild(link);
+            list.appendChild(item);
+        }
+    }
+
+    function search() {
+        var query = element("search_query").value;
+        var queryWords = words(query);
+        latest = query;
+        if (queryWords.length === 0) {
+            show({});
+            return;
+        }
+        var matches = [];
+        var remaining = queryWords.length;
+        queryWords.forEach(function (word, i) {
+            fetchShard(word.charAt(0), function (shard) {
+                matches[i] = lookup(shard, word);
+                remaining -= 1;
+                if (remaining > 0 || query !== latest) {
+                    return;
+                }
+                // Keep the squads matching every word.
+                var results = matches[0];
+                for (var j = 1; j < matches.length; ++j) {
+                    var both = {};
+                    for (var href in results) {
+                        if (matches[j].hasOwnProperty(href)) {
+                            both[href] = results[href];
+                        }
+                    }
+                    results = both;
+                }
+                show(results);
+            });
+        });
+    }
+
+    function start() {
+        element("search_query").oninput = search;
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", start);
+    } else {
+        start();
+    }
+})();
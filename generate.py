@@ -14,66 +14,760 @@ subdirectory.
 
 When you run this script, a 'docs' subdirectory will be created containing
 pages for each army list in 'lists'.
+
+Other commands:
+
+    generate.py analytics       Write statistics over all of the lists, e.g.
+                                the points spent on each role, to
+                                docs/analytics.
+    generate.py check           Check the references in the data tables and
+                                the lists.
+    generate.py diff OLD NEW    Compare two revisions of a list. Each may be a
+                                file or a git revision such as HEAD~1:lists/x.yaml.
+    generate.py impact ...      Find the lists affected by a change to a data
+                                table, and which of them are now over their
+                                points limit.
+    generate.py index           Rebuild the index from the lists' lockfiles,
+                                only loading the data for lists whose
+                                lockfiles are out of date.
+    generate.py merge [DIR...]  Combine the shards of a build made with
+                                'generate.py --shard I/N' into the docs.
+    generate.py pack PATH       Cost and render a pack of lists: a directory,
+                                zip archive or multi-document YAML file.
+    generate.py record ROSTER   Record a game in a kill team's campaign ledger.
+    generate.py validate        Check the lists against the force organisation
+                                rules and the wargear options of their units.
 """
 
-import shutil
+import argparse
+import datetime
+import json
 import os
+import shutil
+import subprocess
+import sys
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
 
-from cogitator.database import read_armies, Database
-from cogitator.writers.army import ArmyWriter
-from cogitator.writers.armyheader import ArmyHeaderWriter
+from cogitator.analytics import Corpus, REPORTS
+from cogitator.cache import PickleCache
+from cogitator.campaign import Ledger, apply_event, ledger_filename, \
+    load_campaign
+from cogitator.database import read_armies, read_army, load_army, \
+    DatabaseRegistry, UnitLibrary, UnknownRecordError, UNITS_DIRNAME
+from cogitator.diff import ArmyComparer
+from cogitator.forceorg import ForceOrgChecker
+from cogitator.integrity import IntegrityChecker
+from cogitator.lockfile import LockFiles
+from cogitator.writers.analytics import AnalyticsWriter, report_csv, \
+    report_filename
+from cogitator.writers.army import ArmyWriter, fragment_dirname
+from cogitator.writers.index import IndexWriter
+from cogitator.writers.library import LibraryWriter, library_filename
+from cogitator.options import OptionsChecker
 from cogitator.output import Outfile
+from cogitator.packs import Pack
+from cogitator.schema import DataError
+from cogitator.shards import ShardError, parse_shard, shard_of, \
+    shard_dirname, write_manifest, read_manifest, merge_manifests
+from cogitator.sqlitedb import SQLiteDatabase
+from cogitator.usage import UsageIndex, ImpactAnalysis
+from cogitator.staging import StagingDirectory, write_file_atomically
+from cogitator.search import SearchIndex
+from cogitator.summary import SummaryIndex, totals_summary
+
+
+# The directory containing this script, and the data and lists.
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Where to keep files which can be regenerated at any time.
+CACHE_DIR = os.path.join(ROOT_DIR, ".cache")
+
+# The game data.
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+
+
+def main(argv=None):
+    """ Run a command, by default 'build'. """
+    if argv is None:
+        argv = sys.argv[1:]
+    command = "build"
+    if len(argv) > 0 and argv[0] in COMMANDS:
+        command = argv[0]
+        argv = argv[1:]
+    try:
+        COMMANDS[command](argv)
+    except DataError as e:
+        print ("Errors in the data:")
+        print (e)
+        sys.exit(1)
+    except UnknownRecordError as e:
+        print (e)
+        sys.exit(1)
+
 
+def add_backend_argument(parser):
+    """ Add the option for choosing a database backend to a parser. """
+    parser.add_argument("--backend", choices=("memory", "sqlite"),
+                        default="memory",
+                        help="Keep the data tables in memory, or in sqlite "
+                             "files in .cache.")
 
-def main():
+
+def build(argv):
+    """ Generate the docs. """
+
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        epilog="Run 'generate.py <command> -h' for help on the other "
+               "commands: %s." % ", ".join(sorted(COMMANDS)))
+    add_backend_argument(parser)
+    parser.add_argument("--library", action="store_true",
+                        help="Write each game's models, weapons, wargear and "
+                             "abilities once, to docs/library, and link to "
+                             "them from the lists' appendices.")
+    parser.add_argument("--lazy", action="store_true",
+                        help="Write the squad cards and appendices of each "
+                             "army's full page to small fragment files, "
+                             "loaded as they scroll into view.")
+    parser.add_argument("--shard", metavar="I/N",
+                        help="Only build the lists in shard I of N, writing "
+                             "their pages and a manifest for 'merge' to "
+                             "--out rather than to docs.")
+    parser.add_argument("--out", metavar="DIR",
+                        help="Where to write a shard. Defaults to "
+                             "shards/I-of-N.")
+    args = parser.parse_args(argv)
+    shard = None
+    if args.shard is not None:
+        try:
+            shard = parse_shard(args.shard)
+        except ShardError as e:
+            parser.error(str(e))
+    elif args.out is not None:
+        parser.error("--out is only used with --shard.")
+    out_dir = None
+    if shard is not None:
+        out_dir = os.path.abspath(args.out) if args.out is not None else \
+            os.path.join(ROOT_DIR, "shards", shard_dirname(*shard))
 
     # Make sure we're in the right place.
-    directory = os.path.dirname(__file__)
-    if len(directory) > 0:
-        os.chdir(directory)
+    os.chdir(ROOT_DIR)
+
+    # The data for each game is read in when the first army using it is.
+    databases = create_registry(args.backend)
+
+    # The army lists, brought up to date with any campaigns they are in.
+    armies = read_sorted_armies("lists")
+    for army in armies:
+        load_campaign(army, "lists", CACHE_DIR)
+    locks = LockFiles(os.path.abspath("lists"), DATA_DIR)
+
+    if shard is not None:
+        build_shard(databases, armies, shard, out_dir, locks, args.library,
+                    args.lazy)
+        return
+
+    # Create the directory structure. The new generation of lists is built in
+    # a staging directory and swapped into place once it is complete, so
+    # docs/lists is never seen half-written.
+    if not os.path.exists("docs"):
+        os.mkdir("docs")
+    os.chdir("docs")
+    staging = StagingDirectory("lists")
+    staging.begin()
+    summary_index = SummaryIndex(os.path.join(CACHE_DIR, "summaries.json"))
+    search_index = SearchIndex(os.path.join(CACHE_DIR, "search.json"))
+    try:
+        staging.copy_tree("../lists/images", "images")
+        entries = write_armies(databases, armies, staging, summary_index,
+                               search_index, locks, args.library, args.lazy)
+
+        # Swap in the library, then the new lists and then the index that
+        # links to them.
+        if args.library:
+            write_library(databases, set(army["Game"] for army in armies))
+        staging.commit()
+    finally:
+        staging.abort()
+    summary_index.save([army["Basename"] for army in armies])
+    write_index([entry["Summary"] for entry in entries], search_index)
+    print ("Wrote %s files, reused %s unchanged files." % (
+        staging.num_written, staging.num_linked))
+
+
+def build_shard(databases, armies, shard, out_dir, locks, library=False,
+                lazy=False):
+    """
+    Build one shard of the lists.
+    :param databases: The registry of game databases.
+    :param armies: All of the armies.
+    :param shard: (index, count) of the shard.
+    :param out_dir: Where to write the shard's pages and manifest.
+    :param locks: LockFiles of the lists.
+    :param library: Whether the pages link to the datasheet library, which
+                    is written by the merge.
+    :param lazy: Whether the full pages load their cards and appendices
+                 lazily.
+    """
+    index, count = shard
+    armies = [army for army in armies
+              if shard_of(army["Basename"], count) == index]
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    staging = StagingDirectory(os.path.join(out_dir, "lists"))
+    staging.begin()
+    summary_index = SummaryIndex(os.path.join(CACHE_DIR, "summaries.json"))
+    search_index = SearchIndex(os.path.join(CACHE_DIR, "search.json"))
+    try:
+        entries = write_armies(databases, armies, staging, summary_index,
+                               search_index, locks, library, lazy)
+        staging.commit()
+    finally:
+        staging.abort()
+
+    # Other shards may share the cache, so keep their armies in it.
+    summary_index.save()
+    search_index.save(prune=False)
+    fingerprints = dict((army["Game"], databases.for_army(army).fingerprint)
+                        for army in armies)
+    write_manifest(out_dir, index, count, fingerprints, entries, library,
+                   lazy)
+    print ("Shard %s of %s: %s lists. Wrote %s files, reused %s unchanged "
+           "files." % (index, count, len(armies), staging.num_written,
+                       staging.num_linked))
+
+
+def write_armies(databases, armies, staging, summary_index, search_index,
+                 locks=None, library=False, lazy=False):
+    """
+    Write the pages of some armies, and summarise and index them.
+    :param databases: The registry of game databases.
+    :param armies: The armies.
+    :param staging: StagingDirectory to write the pages to.
+    :param summary_index: SummaryIndex to summarise the armies with.
+    :param search_index: SearchIndex to add the armies to, or None not to
+                         index them.
+    :param locks: LockFiles to bring up to date, or None not to lock the
+                  armies.
+    :param library: Whether to link to the datasheet library rather than
+                    write the tables of datasheets into each army's pages.
+    :param lazy: Whether to write the squad cards and appendices of each
+                 army's full page to fragments loaded as they are needed.
+    :return: List of manifest entries, one per army, as for write_manifest().
+    """
+    entries = []
+    armywriters = {}
+    for army in armies:
+        database = databases.for_army(army)
+        armywriter = armywriters.get(army["Game"])
+        if armywriter is None or armywriter.database is not database:
+            armywriter = ArmyWriter(database, library_href(army["Game"])
+                                    if library else None)
+            armywriters[army["Game"]] = armywriter
+        variants = get_variants("lists", army)
+        for variant in variants:
+            filename = os.path.relpath(variant["filename"], "lists")
+            sections = variant["sections"]
+            page = StringIO()
+            if lazy and len(sections) == 0:
+                fragments = armywriter.write_lazy_army(
+                    Outfile(page), army,
+                    os.path.basename(variants[1]["filename"]),
+                    os.path.basename(variants[2]["filename"]))
+                for name, text in fragments:
+                    staging.write_file(os.path.join(
+                        fragment_dirname(army["Basename"]), name), text)
+            else:
+                armywriter.write_army(Outfile(page), army, sections)
+            staging.write_file(filename, page.getvalue())
+        entry = {
+            "Basename": army["Basename"],
+            "Summary": summary_index.summarise(database, army, variants)
+        }
+        if search_index is not None:
+            entry["Signature"], entry["Postings"] = search_index.add_army(
+                database, army, variants[0]["filename"].replace("\\", "/"))
+        if locks is not None:
+            locks.update(database, army)
+        entries.append(entry)
+    return entries
+
+
+def library_href(game):
+    """ Get the link to a game's datasheet library from a list's pages. """
+    return "../library/" + library_filename(game)
+
+
+def write_library(databases, games):
+    """
+    Write the datasheet library page of each game into the library directory
+    of the current directory.
+    """
+    staging = StagingDirectory("library")
+    staging.begin()
+    try:
+        for game in sorted(games):
+            page = StringIO()
+            LibraryWriter(databases.get(game)).write_library(Outfile(page))
+            staging.write_file(library_filename(game), page.getvalue())
+        staging.commit()
+    finally:
+        staging.abort()
+
+
+def write_index(summaries, search_index):
+    """
+    Write the index page, the summaries behind it and the search shards into
+    the current directory. The search shards are only written if there is a
+    search_index.
+    """
+    index = StringIO()
+    IndexWriter().write_index(Outfile(index), summaries)
+    write_file_atomically("armies.json", json.dumps(summaries, indent=1,
+                                                    sort_keys=True))
+    write_file_atomically("index.html", index.getvalue())
+    if search_index is not None:
+        search_index.write("search")
+
+
+def merge(argv):
+    """ Merge the shards of a build into the docs. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py merge",
+        description="Combine the shards written by 'generate.py --shard I/N' "
+                    "into the docs, as if they had been built in one go.")
+    parser.add_argument("shards", nargs="*", metavar="DIR",
+                        help="The shards' output directories. By default, "
+                             "those in shards/.")
+    args = parser.parse_args(argv)
+    shard_dirs = [os.path.abspath(dirname) for dirname in args.shards]
+    if len(shard_dirs) == 0:
+        shards_dir = os.path.join(ROOT_DIR, "shards")
+        if os.path.isdir(shards_dir):
+            shard_dirs = [os.path.join(shards_dir, dirname)
+                          for dirname in sorted(os.listdir(shards_dir))]
+    try:
+        manifests = [read_manifest(dirname) for dirname in shard_dirs]
+        entries = merge_manifests(manifests)
+    except ShardError as e:
+        print (e)
+        sys.exit(1)
+
+    os.chdir(ROOT_DIR)
+    if not os.path.exists("docs"):
+        os.mkdir("docs")
+    os.chdir("docs")
+    staging = StagingDirectory("lists")
+    staging.begin()
+    search_index = SearchIndex(os.path.join(CACHE_DIR, "search.json"))
+    try:
+        staging.copy_tree("../lists/images", "images")
+        for dirname in shard_dirs:
+            staging.copy_tree(os.path.join(dirname, "lists"), ".")
+        if manifests[0]["Library"]:
+            write_library(create_registry("memory"),
+                          set(game for manifest in manifests
+                              for game in manifest["Fingerprints"]))
+        staging.commit()
+    finally:
+        staging.abort()
+    for entry in entries:
+        search_index.add_postings(entry["Basename"], entry["Signature"],
+                                  entry["Postings"])
+    write_index([entry["Summary"] for entry in entries], search_index)
+    print ("Merged %s lists from %s shards. Wrote %s files, reused %s "
+           "unchanged files." % (len(entries), len(shard_dirs),
+                                 staging.num_written, staging.num_linked))
 
-    # Read in the data.
-    forty_k = Database("40k", "data")
-    kill_team = Database("Kill Team", "data")
 
-    # The army lists.
-    armies = read_armies("lists")
+def index(argv):
+    """ Rebuild the index from the lists' lockfiles. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py index",
+        description="Rebuild docs/index.html and docs/armies.json from the "
+                    "totals in the lists' lockfiles. The data is only loaded "
+                    "for lists whose lockfiles are missing or out of date, "
+                    "and those lockfiles are brought up to date.")
+    add_backend_argument(parser)
+    args = parser.parse_args(argv)
 
-    # Create / clean the directory structure.
+    os.chdir(ROOT_DIR)
+    databases = create_registry(args.backend)
+    armies = read_sorted_armies("lists")
+    for army in armies:
+        load_campaign(army, "lists", CACHE_DIR)
+    locks = LockFiles(os.path.abspath("lists"), DATA_DIR)
+    summaries = []
+    num_costed = 0
+    for army in armies:
+        lock = locks.read(army)
+        if lock is None:
+            lock = locks.update(databases.for_army(army), army)
+            num_costed += 1
+        summaries.append(totals_summary(army, get_variants("lists", army),
+                                        lock))
     if not os.path.exists("docs"):
         os.mkdir("docs")
-    if os.path.exists("docs/lists"):
-        shutil.rmtree("docs/lists")
-    if os.path.exists("docs/index.html"):
-        os.remove("docs/index.html")
+    os.chdir("docs")
+    write_index(summaries, None)
+    print ("Indexed %s lists, costed %s of them." % (len(armies), num_costed))
+
+
+def analytics(argv):
+    """ Write statistics over all of the lists. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py analytics",
+        description="Write statistics over all of the lists to "
+                    "docs/analytics: the points spent on each battlefield "
+                    "role, the most used items, the points left to spare and "
+                    "the CP of the lists, as .csv files and a page.")
+    add_backend_argument(parser)
+    args = parser.parse_args(argv)
 
-    # Write out each army and list it in the index file.
+    os.chdir(ROOT_DIR)
+    databases = create_registry(args.backend)
+    armies = read_sorted_armies("lists")
+    corpus = Corpus()
+    for army in armies:
+        load_campaign(army, "lists", CACHE_DIR)
+        corpus.add_army(databases.for_army(army), army)
+    reports = [report(corpus) for report in REPORTS]
+
+    if not os.path.exists("docs"):
+        os.mkdir("docs")
     os.chdir("docs")
-    os.mkdir("lists")
-    shutil.copytree("../lists/images", "lists/images")
-    with open("index.html", "w") as f:
-        outfile = Outfile(f)
-        outfile.start_tag("html")
-        outfile.start_tag("head")
-        outfile.content("<link rel='stylesheet' type='text/css' href='./style/style.css'/>")
-        outfile.end_tag()
-        outfile.start_tag("body")
-        outfile.content("<h1> Army Lists </h1>")
-        for army in armies:
-            database = kill_team if army["Game"] == "Kill Team" else forty_k
-            armywriter = ArmyWriter(database)
-            armyheaderwriter = ArmyHeaderWriter(database)
-            variants = get_variants("lists", army)
-            for variant in variants:
-                filename = variant["filename"]
-                sections = variant["sections"]
-                assert not os.path.exists(filename)
-                with open(filename, "w") as f2:
-                    outfile2 = Outfile(f2)
-                    armywriter.write_army(outfile2, army, sections)
-            armyheaderwriter.write_army_header(outfile, army, variants)
-        outfile.end_tag() # body
-        outfile.end_tag() # html
+    staging = StagingDirectory("analytics")
+    staging.begin()
+    try:
+        for report in reports:
+            staging.write_file(report_filename(report), report_csv(report))
+        page = StringIO()
+        AnalyticsWriter().write_analytics(Outfile(page), reports, len(armies))
+        staging.write_file("index.html", page.getvalue())
+        staging.commit()
+    finally:
+        staging.abort()
+    print ("Wrote statistics over %s lists (%s squad items) to "
+           "docs/analytics." % (len(armies), len(corpus.items)))
+
+
+def diff(argv):
+    """ Compare two revisions of an army list. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py diff",
+        description="Compare two revisions of an army list. Each revision is "
+                    "either a file or a git revision and path, e.g. "
+                    "HEAD~1:lists/blood_angels_1000pts.yaml")
+    parser.add_argument("old", help="The old revision.")
+    parser.add_argument("new", help="The new revision.")
+    add_backend_argument(parser)
+    args = parser.parse_args(argv)
+    old = read_revision(args.old)
+    new = read_revision(args.new)
+    database = create_registry(args.backend).for_army(new)
+    for line in ArmyComparer(database).diff_armies(old, new):
+        print (line)
+
+
+def impact(argv):
+    """ Assess the effect of a change to a data table on the lists. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py impact",
+        description="Find the lists affected by a change to a data table. "
+                    "Give either a .csv file of changed rows, or the old and "
+                    "new versions of a table.")
+    parser.add_argument("files", nargs="+", metavar="CSV",
+                        help="Changed rows, or old and new tables.")
+    parser.add_argument("--game", default="40k",
+                        help="The game whose data changed. The lists of games "
+                             "layered on top of it are checked too.")
+    parser.add_argument("--table",
+                        help="The table that changed, e.g. 'weapons'. By "
+                             "default this is taken from the file name.")
+    args = parser.parse_args(argv)
+    if len(args.files) > 2:
+        parser.error("Expected at most two files.")
+    old_filename = args.files[0] if len(args.files) == 2 else None
+    new_filename = args.files[-1]
+    table_name = args.table
+    if table_name is None:
+        table_name = os.path.splitext(os.path.basename(new_filename))[0]
+
+    lists_dir = os.path.join(ROOT_DIR, "lists")
+    index = UsageIndex(os.path.join(CACHE_DIR, "usage.json"))
+    index.update(lists_dir)
+    analysis = ImpactAnalysis(index, args.game, DATA_DIR, lists_dir,
+                              LockFiles(lists_dir, DATA_DIR))
+    results = analysis.analyse(table_name, new_filename, old_filename)
+    if len(results) == 0:
+        print ("No lists are affected.")
+    for basename, name, old_total, new_total, limit, items in results:
+        status = "OVER LIMIT" if new_total > limit else "ok"
+        print ("%s: %s -> %s (%+d) of %s, %s [%s]" % (
+            name, old_total, new_total, new_total - old_total, limit, status,
+            ", ".join(items)))
+
+
+def pack(argv):
+    """ Cost and render a pack of lists, e.g. for a tournament. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py pack",
+        description="Cost and render a pack of lists: a directory of them, a "
+                    "zip archive, or a YAML file with one list per document. "
+                    "The lists are read one at a time, and a summary of each "
+                    "one's total against its points limit is printed.")
+    parser.add_argument("path", help="The pack.")
+    parser.add_argument("--out", metavar="DIR",
+                        help="Where to write the pages. Defaults to "
+                             "packs/NAME.")
+    add_backend_argument(parser)
+    args = parser.parse_args(argv)
+    pack = Pack(os.path.abspath(args.path))
+    out_dir = os.path.abspath(args.out) if args.out is not None else \
+        os.path.join(ROOT_DIR, "packs", pack.name)
+
+    os.chdir(ROOT_DIR)
+    databases = create_registry(args.backend)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    for dirname in ("style", "scripts", "images"):
+        copy_tree(os.path.join("docs", dirname), os.path.join(out_dir, dirname))
+    summary_index = SummaryIndex(os.path.join(CACHE_DIR, "packs",
+                                              pack.name + ".json"))
+    staging = StagingDirectory(os.path.join(out_dir, "lists"))
+    staging.begin()
+    summaries = []
+    try:
+        staging.copy_tree("lists/images", "images")
+        for army in pack:
+            try:
+                # Packs are not searchable: the search index would hold the
+                # postings of every list in memory.
+                entries = write_armies(databases, [army], staging,
+                                       summary_index, None)
+            except UnknownRecordError as e:
+                pack.errors.append("%s: %s" % (army["Basename"], e))
+                continue
+            summaries.append(entries[0]["Summary"])
+        staging.commit()
+    finally:
+        staging.abort()
+    summary_index.save([summary["Basename"] for summary in summaries])
+    os.chdir(out_dir)
+    summaries.sort(key=lambda summary: summary["Basename"])
+    write_index(summaries, None)
+
+    num_over = 0
+    for summary in summaries:
+        status = "ok"
+        if summary["Spare"] < 0:
+            status = "OVER by %s" % -summary["Spare"]
+            num_over += 1
+        if len(summary["Violations"]) > 0:
+            status += ", %s force organisation problems" % len(
+                summary["Violations"])
+        print ("%s: %s / %s pts, %s" % (summary["Name"], summary["Total"],
+                                        summary["Points"], status))
+    for error in pack.errors:
+        print (error)
+    print ("%s lists, %s over their points limit, %s could not be read. "
+           "Wrote %s." % (len(summaries), num_over, len(pack.errors),
+                          os.path.join(out_dir, "index.html")))
+    if len(pack.errors) > 0:
+        sys.exit(1)
+
+
+def record(argv):
+    """ Record the outcome of a kill team campaign game. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py record",
+        description="Record a game in a kill team's campaign ledger, "
+                    "lists/campaigns/ROSTER.jsonl.")
+    parser.add_argument("roster",
+                        help="The kill team's list, e.g. lamenters_kill_team.")
+    parser.add_argument("--result", help="The result, e.g. Win.")
+    parser.add_argument("--date", default=datetime.date.today().isoformat(),
+                        help="When the game was played. Defaults to today.")
+    parser.add_argument("--notes", help="Anything else worth recording.")
+    parser.add_argument("--xp", action="append", default=[],
+                        metavar="SQUAD=N", help="Experience gained by a squad.")
+    parser.add_argument("--specialist", action="append", default=[],
+                        metavar="SQUAD=SPECIALISM",
+                        help="A squad which became a specialist.")
+    parser.add_argument("--convalescence", action="append", default=[],
+                        metavar="SQUAD", help="A squad now convalescing.")
+    parser.add_argument("--recovered", action="append", default=[],
+                        metavar="SQUAD", help="A squad back from convalescence.")
+    parser.add_argument("--dead", action="append", default=[],
+                        metavar="SQUAD", help="A squad which has been killed.")
+    args = parser.parse_args(argv)
+
+    lists_dir = os.path.join(ROOT_DIR, "lists")
+    basename = os.path.splitext(os.path.basename(args.roster))[0]
+    army = read_army(os.path.join(lists_dir, basename + ".yaml"))
+    ledger = Ledger(ledger_filename(lists_dir, basename),
+                    os.path.join(CACHE_DIR, "campaigns", basename + ".json"))
+    state = ledger.replay(army)
+
+    changes = {}
+    def change(name, field, value):
+        if name not in state["Squads"]:
+            parser.error("No squad '%s' in %s." % (name, basename))
+        changes.setdefault(name, {})[field] = value
+    def split(value):
+        if "=" not in value:
+            parser.error("Expected SQUAD=VALUE, not '%s'." % value)
+        return value.rsplit("=", 1)
+    for value in args.xp:
+        name, xp = split(value)
+        change(name, "Experience", int(xp))
+    for value in args.specialist:
+        name, specialism = split(value)
+        change(name, "Specialist", specialism)
+    for name in args.convalescence:
+        change(name, "Convalescence", True)
+    for name in args.recovered:
+        change(name, "Convalescence", False)
+    for name in args.dead:
+        change(name, "Dead", True)
+
+    event = {"Game": state["Games"] + 1, "Date": args.date, "Squads": changes}
+    if args.result is not None:
+        event["Result"] = args.result
+    if args.notes is not None:
+        event["Notes"] = args.notes
+    ledger.append(event)
+    apply_event(state, event)
+    print ("Recorded game %s for %s." % (event["Game"], army["Name"]))
+    for name in sorted(changes):
+        squad = state["Squads"][name]
+        status = "dead" if squad.get("Dead", False) else \
+            "%s XP" % squad.get("Experience", 0)
+        print ("  %s: %s" % (name, status))
+
+
+def validate(argv):
+    """ Check the lists against the rules. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py validate",
+        description="Check that the lists obey the force organisation rules "
+                    "of their detachments, and that their squads only take "
+                    "the wargear their options allow.")
+    parser.add_argument("lists", nargs="*", metavar="LIST",
+                        help="Lists to check. By default, all of them.")
+    add_backend_argument(parser)
+    args = parser.parse_args(argv)
+
+    lists_dir = os.path.join(ROOT_DIR, "lists")
+    if len(args.lists) > 0:
+        armies = [read_army(filename) for filename in args.lists]
+    else:
+        armies = read_sorted_armies(lists_dir)
+    databases = create_registry(args.backend)
+    num_invalid = 0
+    for army in armies:
+        load_campaign(army, lists_dir, CACHE_DIR)
+        database = databases.for_army(army)
+        violations = ForceOrgChecker(database).check_army(army) + \
+            OptionsChecker(database).check_army(army)
+        if len(violations) == 0:
+            print ("%s: ok" % army["Name"])
+            continue
+        num_invalid += 1
+        print ("%s:" % army["Name"])
+        for violation in violations:
+            print ("  %s" % violation)
+    if num_invalid > 0:
+        sys.exit(1)
+
+
+def check(argv):
+    """ Check the references in the data tables and the lists. """
+    parser = argparse.ArgumentParser(
+        prog="generate.py check",
+        description="Check that everything referred to by the data tables "
+                    "and the lists exists, reporting every problem found.")
+    parser.parse_args(argv)
+
+    lists_dir = os.path.join(ROOT_DIR, "lists")
+    checker = IntegrityChecker(DATA_DIR)
+    armies = read_sorted_armies(lists_dir)
+    problems = []
+    for game in sorted(set(army["Game"] for army in armies)):
+        problems += checker.check_data(game)
+    for army in armies:
+        load_campaign(army, lists_dir, CACHE_DIR)
+        filename = os.path.join("lists", army["Basename"] + ".yaml")
+        problems += checker.check_army(army, filename)
+    for problem in problems:
+        print (problem)
+    if len(problems) > 0:
+        print ("%s problems found." % len(problems))
+        sys.exit(1)
+    print ("No problems found.")
+
+
+def read_revision(spec):
+    """
+    Read a revision of an army list. Shared unit definitions are taken from
+    the working copy, even for a git revision.
+    :param spec: A filename, or a git revision and path separated by ':'.
+    :return: The army.
+    """
+    if os.path.exists(spec) or ":" not in spec:
+        path = spec
+        units_dir = os.path.join(os.path.dirname(path), UNITS_DIRNAME)
+        with open(spec, "r") as infile:
+            text = infile.read()
+    else:
+        path = spec.split(":", 1)[1]
+        units_dir = os.path.join(ROOT_DIR, os.path.dirname(path),
+                                 UNITS_DIRNAME)
+        text = subprocess.check_output(["git", "show", spec])
+    return load_army(text, os.path.splitext(os.path.basename(path))[0],
+                     UnitLibrary(units_dir))
+
+
+def read_sorted_armies(lists_dir):
+    """
+    Read the army lists in order of basename, so that builds do not depend on
+    the order the files are listed in. Parsed lists are cached in .cache, so
+    only new and changed lists are parsed.
+    """
+    cache = PickleCache(os.path.join(CACHE_DIR, "armies.pickle"))
+    armies = read_armies(lists_dir, cache)
+    cache.prune([army["TextHash"] for army in armies])
+    cache.save()
+    return sorted(armies, key=lambda army: army["Basename"])
+
+
+def create_registry(backend):
+    """
+    Create the registry of game databases.
+    :param backend: 'memory' or 'sqlite'.
+    :return: The registry.
+    """
+    if backend == "sqlite":
+        def create_database(game, data_dir, record_cache, generation=0):
+            return SQLiteDatabase(game, data_dir, CACHE_DIR,
+                                  generation=generation)
+        return DatabaseRegistry(DATA_DIR, create_database)
+    return DatabaseRegistry(DATA_DIR)
+
+
+def copy_tree(src, dst):
+    """ Copy a directory tree over another, replacing any files in both. """
+    for dirpath, dirnames, filenames in os.walk(src):
+        target = os.path.join(dst, os.path.relpath(dirpath, src))
+        if not os.path.exists(target):
+            os.makedirs(target)
+        for name in filenames:
+            shutil.copy2(os.path.join(dirpath, name),
+                         os.path.join(target, name))
 
 
 def get_variants(out_dir, army):
@@ -105,5 +799,20 @@ def get_variants(out_dir, army):
     return variants
 
 
+# The commands the script understands.
+COMMANDS = {
+    "analytics": analytics,
+    "build": build,
+    "check": check,
+    "diff": diff,
+    "impact": impact,
+    "index": index,
+    "merge": merge,
+    "pack": pack,
+    "record": record,
+    "validate": validate,
+}
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,56 @@
+"""
+Helpers for the tests.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a copy of the repository needs to build the docs.
+BUILD_FILES = ("generate.py", "cogitator", "data", "lists", "docs")
+
+
+class TempRepo(object):
+    """ A copy of the repository in a temporary directory, to build in. """
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp()
+        ignore = shutil.ignore_patterns("__pycache__", "*.pyc", "*.lock")
+        for name in BUILD_FILES:
+            src = os.path.join(ROOT_DIR, name)
+            dst = os.path.join(self.root, name)
+            if os.path.isdir(src):
+                shutil.copytree(src, dst, ignore=ignore)
+            else:
+                shutil.copy2(src, dst)
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def generate(self, *args):
+        """
+        Run generate.py in the copy.
+        :return: Its output.
+        :raises subprocess.CalledProcessError: If it fails.
+        """
+        return subprocess.check_output(
+            [sys.executable, self.path("generate.py")] + list(args),
+            cwd=self.root, stderr=subprocess.STDOUT).decode("utf-8")
+
+    def remove(self):
+        shutil.rmtree(self.root)
+
+
+def read_tree(dirname):
+    """ Read every file under a directory into a map of path to content. """
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(dirname):
+        for name in filenames:
+            filename = os.path.join(dirpath, name)
+            with open(filename, "rb") as f:
+                files[os.path.relpath(filename, dirname)] = f.read()
+    return files
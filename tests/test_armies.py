@@ -0,0 +1,48 @@
+import unittest
+
+from cogitator.cache import PickleCache
+from cogitator.database import read_armies
+from tests.helpers import TempRepo
+
+
+class ArmyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = TempRepo()
+
+    def tearDown(self):
+        self.repo.remove()
+
+    def test_cache_keeps_lists_using_unit_definitions(self):
+        self.repo.generate()
+        armies = read_armies(self.repo.path("lists"))
+        uses_units = [army for army in armies
+                      if army["Hash"] != army["TextHash"]]
+        self.assertTrue(len(uses_units) > 0)
+
+        # A second build must not drop any list from the cache.
+        self.repo.generate()
+        cache = PickleCache(self.repo.path(".cache", "armies.pickle"))
+        self.assertEqual(len(cache), len(armies))
+        for army in armies:
+            self.assertIsNotNone(cache.get(army["TextHash"]),
+                                 army["Basename"])
+
+    def test_changed_definition_changes_hash(self):
+        before = dict((army["Basename"], army["Hash"])
+                      for army in read_armies(self.repo.path("lists")))
+        filename = self.repo.path("lists", "units", "blood_angels.yaml")
+        with open(filename, "r") as f:
+            text = f.read()
+        with open(filename, "w") as f:
+            f.write(text.replace("Bolter: 7", "Bolter: 6"))
+        changed = 0
+        for army in read_armies(self.repo.path("lists")):
+            if army["Hash"] != army["TextHash"]:
+                self.assertNotEqual(before[army["Basename"]], army["Hash"])
+                changed += 1
+        self.assertTrue(changed > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cogitator.database import Database, UnknownRecordError, \
+    dataset_dirs, load_army, read_army
+from cogitator.schema import DataError
+from tests.helpers import ROOT_DIR
+
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+LIST = os.path.join(ROOT_DIR, "lists", "lamenters_kill_team.yaml")
+
+
+class CompiledSquadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.database = Database("Kill Team", DATA_DIR)
+
+    def test_revisions_share_compiled_squads(self):
+        old = read_army(LIST)
+        new = read_army(LIST)
+        new["Detachments"][0]["Units"][1]["Items"]["Bolt Rifle"] = 2
+        for old_squad, new_squad in zip(old["Detachments"][0]["Units"],
+                                        new["Detachments"][0]["Units"]):
+            same = old_squad["Items"] == new_squad["Items"]
+            self.assertEqual(same,
+                             self.database.compile_squad(old_squad) is
+                             self.database.compile_squad(new_squad))
+
+    def test_item_order_is_kept(self):
+        army = read_army(LIST)
+        squad = army["Detachments"][0]["Units"][0]
+        reordered = dict(squad)
+        reordered["Items"] = dict(reversed(list(squad["Items"].items())))
+        weapons = self.database.get_squad_items(squad)[0]
+        reordered_weapons = self.database.get_squad_items(reordered)[0]
+        self.assertTrue(len(weapons) > 1)
+        self.assertEqual(weapons, list(reversed(reordered_weapons)))
+
+    def test_costs(self):
+        army = read_army(LIST)
+        self.assertEqual(98, self.database.army_points_cost(army))
+
+    def test_bad_quantity(self):
+        with open(LIST, "r") as f:
+            text = f.read().replace("Chainsword: 1", "Chainsword: one", 1)
+        with self.assertRaises(DataError) as caught:
+            load_army(text, "lamenters")
+        self.assertIn("lamenters: squad 'Brother Sergeant Raffaelo': "
+                      "quantity 'one' of 'Chainsword'", str(caught.exception))
+
+
+class DatasetTest(unittest.TestCase):
+
+    def test_layers(self):
+        self.assertEqual([os.path.join(DATA_DIR, "40k"),
+                          os.path.join(DATA_DIR, "kill-team")],
+                         dataset_dirs(DATA_DIR, "kill-team"))
+
+    def test_unknown_dataset(self):
+        with self.assertRaises(UnknownRecordError) as caught:
+            dataset_dirs(DATA_DIR, "necromunda")
+        self.assertIn("No dataset", str(caught.exception))
+
+    def test_dataset_inheriting_itself(self):
+        dirname = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(dirname, "test"))
+            with open(os.path.join(dirname, "test", "dataset.yaml"),
+                      "w") as f:
+                f.write("Base: test\n")
+            with self.assertRaises(DataError) as caught:
+                dataset_dirs(dirname, "test")
+        finally:
+            shutil.rmtree(dirname)
+        self.assertIn("dataset 'test' inherits itself", str(caught.exception))
+
+
+MODELS = """\
+Name,Cost,M,WS,BS,S,T,W,A,Ld,Sv
+Robot (5W), 0, 4, 5, 5, 6, 7, 5, 3, 8, 3
+Robot, 100, 8, 3, 3, 6, 7, 10, 3, 8, 3
+Drone (2W), 0, 4, 5, 5, 3, 3, 2, 1, 6, 5
+"""
+
+
+class DamageVariantTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.data_dir, "test"))
+        self.filename = os.path.join(self.data_dir, "test", "models.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def load(self, models):
+        with open(self.filename, "w") as f:
+            f.write(models)
+        return Database("Test", self.data_dir)
+
+    def test_variants_after_their_model(self):
+        lines = MODELS.splitlines(True)
+        database = self.load(lines[0] + lines[2] + lines[1])
+        robot = database.lookup_item("Robot")
+        self.assertEqual([5], [threshold for threshold, variant
+                               in robot.damage_variants])
+
+    def test_misplaced_variants_are_rejected(self):
+        with self.assertRaises(DataError) as caught:
+            self.load(MODELS)
+        self.assertEqual(
+            ["%s:2: damage variant 'Robot (5W)' comes before its model "
+             "'Robot'" % self.filename,
+             "%s:4: damage variant 'Drone (2W)' of unknown model 'Drone'" %
+             self.filename], caught.exception.errors)
+
+
+if __name__ == "__main__":
+    unittest.main()
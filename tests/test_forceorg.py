@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cogitator.database import Database
+from cogitator.forceorg import ForceOrgChecker
+from cogitator.schema import DataError
+
+FORMATIONS = """\
+Name,CP,HQ,Troops,Transports
+Patrol,0,1-2,1-3,1:2
+"""
+
+
+def squads(**slots):
+    """ Make the units of a detachment, with a number of squads per slot. """
+    units = []
+    for slot, count in sorted(slots.items()):
+        for index in range(count):
+            units.append({"Name": "%s %s" % (slot, index), "Slot": slot,
+                          "Items": {}})
+    return units
+
+
+class RatioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.data_dir, "test"))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def load(self, formations):
+        with open(os.path.join(self.data_dir, "test", "formations.csv"),
+                  "w") as f:
+            f.write(formations)
+        return Database("Test", self.data_dir)
+
+    def check(self, **slots):
+        checker = ForceOrgChecker(self.load(FORMATIONS))
+        return checker.check_detachment({"Name": "Patrol", "Type": "Patrol",
+                                         "Units": squads(**slots)})
+
+    def test_ratio_counts_other_units(self):
+        # One transport for every two units in the other slots.
+        self.assertEqual([], self.check(HQ=1, Troops=1, Transports=1))
+        self.assertEqual([], self.check(HQ=1, Troops=3, Transports=2))
+        violations = self.check(HQ=1, Troops=2, Transports=2)
+        self.assertEqual(["Patrol: 2 Transports units, at most 1 allowed."],
+                         [str(violation) for violation in violations])
+
+    def test_ratio_with_no_other_units(self):
+        violations = self.check(Transports=1)
+        self.assertEqual(["Patrol: 0 HQ units, at least 1 needed.",
+                          "Patrol: 0 Troops units, at least 1 needed.",
+                          "Patrol: 1 Transports units, at most 0 allowed."],
+                         [str(violation) for violation in violations])
+
+    def test_ratio_per_zero_units_is_rejected(self):
+        with self.assertRaises(DataError) as caught:
+            self.load(FORMATIONS.replace("1:2", "1:0"))
+        self.assertEqual(
+            ["%s:2: slot 'Transports' of 'Patrol': ratio '1:0' must be per a "
+             "positive number of units" % os.path.join(
+                 self.data_dir, "test", "formations.csv")],
+            caught.exception.errors)
+
+    def test_malformed_rule_is_rejected(self):
+        with self.assertRaises(DataError) as caught:
+            self.load(FORMATIONS.replace("1:2", "lots"))
+        self.assertIn("'lots' is neither a range", str(caught.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
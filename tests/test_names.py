@@ -0,0 +1,100 @@
+import os
+import random
+import unittest
+
+from cogitator.database import Database, UnknownRecordError, Weapon
+from cogitator.names import NameIndex, edit_distance, normalise
+from tests.helpers import ROOT_DIR
+
+NAMES = ["Bolt Pistol", "Bolt Rifle", "Bolter", "Storm Bolter",
+         "Heavy Bolter", "Plasma Pistol", "Plasma Gun", "Chainsword",
+         "Power Sword", "Frag Grenade", "Krak Grenade"]
+
+
+class NameIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = NameIndex(NAMES, Weapon().group_key)
+
+    def test_find_ignores_case_and_spacing(self):
+        self.assertEqual("Bolt Pistol", self.index.find("bolt  PISTOL "))
+        self.assertIsNone(self.index.find("Bolt Pistal"))
+
+    def test_find_weapon_mode(self):
+        self.assertEqual("Storm Bolter",
+                         self.index.find("Storm Bolter [Rapid]"))
+
+    def test_suggest_typo(self):
+        self.assertEqual(["Bolt Pistol"], self.index.suggest("Bolt Pistal"))
+        self.assertEqual(["Chainsword"], self.index.suggest("Chainsowrd"))
+
+    def test_suggest_nearest_only(self):
+        # 'Bolter' is one edit away; 'Bolt Rifle' and the rest further.
+        self.assertEqual(["Bolter"], self.index.suggest("Boltr"))
+        self.assertEqual(["Frag Grenade"], self.index.suggest("Drag Grenade"))
+        self.assertEqual(["Frag Grenade", "Krak Grenade"],
+                         self.index.suggest("Frak Grenade"))
+
+    def test_suggest_normalised_match_first(self):
+        self.assertEqual(["Plasma Pistol"],
+                         self.index.suggest("plasma  PISTOL"))
+        self.assertEqual("Storm Bolter",
+                         self.index.suggest("Storm Bolter [Rapid]")[0])
+
+    def test_suggest_limit(self):
+        self.assertEqual(1, len(self.index.suggest("Frak Grenade", limit=1)))
+
+    def test_suggest_nothing_near(self):
+        self.assertEqual([], self.index.suggest("Thunder Hammer"))
+        self.assertEqual([], self.index.suggest(""))
+
+    def test_suggest_matches_brute_force(self):
+        rng = random.Random(1)
+        words = ["bolt", "plasma", "heavy", "storm", "power", "las", "melta",
+                 "combi", "grav", "assault", "claw", "hammer"]
+        names = sorted(set(" ".join(rng.choice(words) for _ in range(3)) +
+                           " %s" % rng.randint(0, 99) for _ in range(2000)))
+        index = NameIndex(names)
+        for name in rng.sample(names, 50):
+            typo = list(name)
+            typo[rng.randrange(len(typo))] = rng.choice("xyz")
+            typo = "".join(typo)
+            if typo in names:
+                continue
+            limit = max(1, len(typo) // 4)
+            distances = [(edit_distance(typo, other, limit), other)
+                         for other in names]
+            nearest = min(distance for distance, _ in distances)
+            expected = sorted(other for distance, other in distances
+                              if distance == nearest <= limit)
+            self.assertEqual(expected[:3], index.suggest(typo), typo)
+
+
+class EditDistanceTest(unittest.TestCase):
+
+    def test_distances(self):
+        self.assertEqual(0, edit_distance("bolter", "bolter", 3))
+        self.assertEqual(1, edit_distance("bolter", "boltr", 3))
+        self.assertEqual(2, edit_distance("chainsword", "chainsowrd", 3))
+        self.assertEqual(3, edit_distance("kitten", "sitting", 3))
+
+    def test_limit(self):
+        self.assertEqual(2, edit_distance("kitten", "sitting", 1))
+        self.assertEqual(3, edit_distance("a", "abcd", 2))
+
+
+class DatabaseSuggestionTest(unittest.TestCase):
+
+    def test_unknown_item_suggests(self):
+        database = Database("40k", os.path.join(ROOT_DIR, "data"))
+        with self.assertRaises(UnknownRecordError) as caught:
+            database.lookup_item("Bolt Pistal")
+        self.assertEqual("No item 'Bolt Pistal' in item table. Did you mean "
+                         "'Bolt Pistol'?", str(caught.exception))
+        with self.assertRaises(UnknownRecordError) as caught:
+            database.lookup_formation("patrol")
+        self.assertIn("Did you mean 'Patrol'?", str(caught.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+import zipfile
+
+from cogitator.packs import Pack
+from tests.helpers import ROOT_DIR, TempRepo
+
+LIST = os.path.join(ROOT_DIR, "lists", "lamenters_kill_team.yaml")
+
+# A list missing each of the fields which used to stop the whole pack.
+NO_DETACHMENTS = """\
+Name: No Detachments
+Game: 40k
+Warlord: Nobody
+Points: 500
+"""
+
+NO_POINTS = """\
+Name: No Points
+Game: 40k
+Warlord: Nobody
+Detachments:
+  - Name: Patrol
+    Type: Patrol
+    Units:
+      - Name: Rhino
+        Slot: Dedicated Transport
+        Items:
+          Rhino: 1
+"""
+
+UNKNOWN_GAME = NO_POINTS.replace("Game: 40k", "Game: Necromunda").replace(
+    "Name: No Points", "Name: Unknown Game\nPoints: 500")
+
+# Has lines which look like the ends of documents in a block scalar.
+BLOCK_SCALAR = NO_POINTS.replace("Name: No Points", """\
+Name: Notes
+Points: 500
+Notes: |
+  ---
+  Not a new document.
+  ...""")
+
+
+class PackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        with open(LIST, "r") as f:
+            self.good = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, name, text):
+        filename = os.path.join(self.dirname, name)
+        with open(filename, "w") as f:
+            f.write(text)
+        return filename
+
+    def test_stream_collects_errors(self):
+        stream = self.write("round.yaml", "\n---\n".join(
+            ["%YAML 1.1\n---\n" + NO_DETACHMENTS, NO_POINTS, self.good,
+             "# Nothing but a comment.\n", "- not a list", BLOCK_SCALAR]))
+        pack = Pack(stream)
+        armies = list(pack)
+        self.assertEqual(["round_3", "round_5"],
+                         [army["Basename"] for army in armies])
+        self.assertEqual("Notes", armies[1]["Name"])
+        self.assertIn("---\nNot a new document.\n...", armies[1]["Notes"])
+        self.assertEqual(["round_1: no 'Detachments'", "round_2: no 'Points'",
+                          "round_4: not a map of fields"], pack.errors)
+
+    def test_syntax_error_ends_stream(self):
+        stream = self.write("round.yaml", "\n---\n".join(
+            [self.good, "Name: [unclosed", self.good]))
+        pack = Pack(stream)
+        self.assertEqual(["round_1"], [army["Basename"] for army in pack])
+        self.assertEqual(1, len(pack.errors))
+        self.assertTrue(pack.errors[0].startswith(
+            "round: not a YAML stream from here on"))
+
+    def test_archive_collects_errors(self):
+        archive = os.path.join(self.dirname, "round.zip")
+        with zipfile.ZipFile(archive, "w") as f:
+            f.writestr("team_a/good.yaml", self.good)
+            f.writestr("team_b/bad.yaml", NO_DETACHMENTS)
+            f.writestr("team_c/broken.yaml", "Name: [unclosed")
+        pack = Pack(archive)
+        self.assertEqual(["team_a_good"],
+                         [army["Basename"] for army in pack])
+        self.assertEqual("team_b_bad: no 'Detachments'", pack.errors[0])
+        self.assertTrue(pack.errors[1].startswith(
+            "team_c_broken: not an army list"))
+
+    def test_pack_command_reports_each_list(self):
+        stream = self.write("round.yaml", "\n---\n".join(
+            [NO_DETACHMENTS, UNKNOWN_GAME, self.good, NO_POINTS]))
+        repo = TempRepo()
+        try:
+            with self.assertRaises(subprocess.CalledProcessError) as caught:
+                repo.generate("pack", stream, "--out", repo.path("out"))
+            output = caught.exception.output.decode("utf-8")
+        finally:
+            repo.remove()
+        self.assertIn("Lamenters Kill Team: 98 / 100 pts, ok", output)
+        self.assertIn("round_1: no 'Detachments'", output)
+        self.assertIn("round_2: No dataset", output)
+        self.assertIn("round_4: no 'Points'", output)
+        self.assertIn("1 lists, 0 over their points limit, 3 could not be "
+                      "read.", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
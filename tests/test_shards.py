@@ -0,0 +1,40 @@
+import subprocess
+import unittest
+
+from tests.helpers import TempRepo, read_tree
+
+
+class ShardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.whole = TempRepo()
+        self.sharded = TempRepo()
+
+    def tearDown(self):
+        self.whole.remove()
+        self.sharded.remove()
+
+    def test_merged_shards_match_one_build(self):
+        self.whole.generate()
+        for shard in ("1/3", "2/3", "3/3"):
+            self.sharded.generate("--shard", shard)
+        self.sharded.generate("merge", self.sharded.path("shards", "1-of-3"),
+                              self.sharded.path("shards", "2-of-3"),
+                              self.sharded.path("shards", "3-of-3"))
+        whole = read_tree(self.whole.path("docs"))
+        merged = read_tree(self.sharded.path("docs"))
+        self.assertEqual(sorted(whole), sorted(merged))
+        for name in whole:
+            self.assertEqual(whole[name], merged[name], name)
+
+    def test_merge_refuses_missing_shards(self):
+        self.sharded.generate("--shard", "1/2")
+        with self.assertRaises(subprocess.CalledProcessError) as caught:
+            self.sharded.generate("merge",
+                                  self.sharded.path("shards", "1-of-2"))
+        self.assertIn("Expected shards 1 to 2 of 2",
+                      caught.exception.output.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
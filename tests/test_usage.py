@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from cogitator.database import UnknownRecordError
+from cogitator.usage import ImpactAnalysis, UsageIndex
+from tests.helpers import ROOT_DIR
+
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+LISTS_DIR = os.path.join(ROOT_DIR, "lists")
+HEADER = "Name,Cost,Range,Type,S,AP,D,Abilities\n"
+
+
+class ImpactAnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.index = UsageIndex(os.path.join(self.dirname, "usage.json"))
+        self.index.update(LISTS_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def analyse(self, game, table_name, rows):
+        filename = os.path.join(self.dirname, "changed.csv")
+        with open(filename, "w") as f:
+            f.write(HEADER + rows)
+        analysis = ImpactAnalysis(self.index, game, DATA_DIR, LISTS_DIR)
+        return dict((result[0], result[2:4])
+                    for result in analysis.analyse(table_name, filename))
+
+    def test_change_reaches_layered_games(self):
+        results = self.analyse("40k", "weapons",
+                               "Bolt Pistol, 5, 12, Pistol 1, 4, 0, 1,\n")
+        self.assertEqual((98, 118), results["lamenters_kill_team"])
+        self.assertIn("blood_angels_1000pts", results)
+
+    def test_overridden_rows_stay_overridden(self):
+        # Kill team defines its own Stalker Bolt Rifle.
+        results = self.analyse("40k", "weapons",
+                               "Stalker Bolt Rifle, 50, 36, Heavy 1, 4, -2, "
+                               "1,\n")
+        self.assertEqual({"lamenters_kill_team": (98, 98)}, results)
+
+    def test_change_to_layered_game(self):
+        results = self.analyse("Kill Team", "weapons",
+                               "Bolt Pistol, 5, 12, Pistol 1, 4, 0, 1,\n")
+        self.assertEqual({"lamenters_kill_team": (98, 118)}, results)
+
+    def test_table_not_inherited(self):
+        analysis = ImpactAnalysis(self.index, "40k", DATA_DIR, LISTS_DIR)
+        self.assertEqual(["40k"], list(analysis.layered_games("models")))
+        self.assertEqual(["40k", "Kill Team"],
+                         sorted(analysis.layered_games("weapons")))
+
+    def test_unknown_game(self):
+        with self.assertRaises(UnknownRecordError):
+            self.analyse("Necromunda", "weapons",
+                         "Bolt Pistol, 5, 12, Pistol 1, 4, 0, 1,\n")
+
+
+if __name__ == "__main__":
+    unittest.main()